@@ -19,6 +19,15 @@ from dx7utils.common import (
 from dx7utils.common import (
     load_config as load_config,
 )
+from dx7utils.index import (
+    PatchIndex as PatchIndex,
+)
+from dx7utils.index import (
+    load_index as load_index,
+)
+from dx7utils.sysex import (
+    VoiceBank as VoiceBank,
+)
 from dx7utils.sysex import (
     extract_patch_names as extract_patch_names,
 )
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import tarfile
+import tempfile
+import threading
+import zipfile
+
+from dx7utils.common import ARCHIVE_SUFFIXES, debug_print
+
+MEMBER_SEPARATOR = '!'
+MATERIALIZE_DIRECTORY = os.path.join(tempfile.gettempdir(), 'dx7utils')
+
+# SysEx-Einträge des zuletzt gelesenen tar-Archivs, damit nicht jeder Eintrag das Archiv neu entpackt;
+# größere Archive werden nur bis TAR_CACHE_BYTES gepuffert
+TAR_CACHE_BYTES = 32 * 1024 * 1024
+_tar_cache = {}
+_tar_cache_lock = threading.Lock()
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_sysex_member(name):
+    return name.lower().endswith('.syx')
+
+
+def member_path(archive_path, member):
+    return f"{archive_path}{MEMBER_SEPARATOR}{member}"
+
+
+def split_member_path(path):
+    position = path.find(MEMBER_SEPARATOR)
+    while position >= 0:
+        if is_archive(path[:position]):
+            return path[:position], path[position + 1:]
+        position = path.find(MEMBER_SEPARATOR, position + 1)
+    return path, None
+
+
+def iter_archive_members(archive_path):
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and is_sysex_member(info.filename):
+                    yield info.filename, archive.read(info)
+    else:
+        with tarfile.open(archive_path, 'r|*') as archive:
+            for info in archive:
+                if info.isfile() and is_sysex_member(info.name):
+                    yield info.name, archive.extractfile(info).read()
+
+
+def read_members(archive_path, members):
+    members = set(members)
+    found = {}
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in members:
+                try:
+                    found[member] = archive.read(member)
+                except KeyError:
+                    continue
+        return found
+    with tarfile.open(archive_path, 'r|*') as archive:
+        for info in archive:
+            if info.name in members and info.isfile():
+                found[info.name] = archive.extractfile(info).read()
+                if len(found) == len(members):
+                    break
+    return found
+
+
+def _read_tar_member(archive_path, member):
+    st = os.stat(archive_path)
+    stamp = (archive_path, st.st_size, st.st_mtime_ns)
+    with _tar_cache_lock:
+        if _tar_cache.get('stamp') == stamp:
+            data = _tar_cache['members'].get(member)
+            if data is not None or _tar_cache['complete']:
+                return data
+        _tar_cache.clear()
+        members, total, found, complete = {}, 0, None, True
+        with tarfile.open(archive_path, 'r|*') as archive:
+            for info in archive:
+                if not info.isfile() or not is_sysex_member(info.name):
+                    continue
+                if complete and total + info.size <= TAR_CACHE_BYTES:
+                    members[info.name] = data = archive.extractfile(info).read()
+                    total += info.size
+                else:
+                    complete = False
+                    data = archive.extractfile(info).read() if info.name == member else None
+                if info.name == member:
+                    found = data
+                    if not complete:
+                        break
+        _tar_cache.update(stamp=stamp, members=members, complete=complete)
+        return found
+
+
+def read_member(archive_path, member):
+    if archive_path.lower().endswith('.zip') or not is_sysex_member(member):
+        data = read_members(archive_path, [member]).get(member)
+    else:
+        data = _read_tar_member(archive_path, member)
+    if data is None:
+        raise FileNotFoundError(f"{member} nicht in {archive_path} gefunden")
+    return data
+
+
+def read_sysex_bytes(path):
+    archive_path, member = split_member_path(path)
+    if member is not None:
+        return read_member(archive_path, member)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def materialize(path):
+    archive_path, member = split_member_path(path)
+    if member is None:
+        return path
+    # Ein fester Ordner je Eintrag, so bleibt pro Eintrag höchstens eine Kopie liegen
+    key = hashlib.blake2b(path.encode('utf-8'), digest_size=8).hexdigest()
+    directory = os.path.join(MATERIALIZE_DIRECTORY, key)
+    target = os.path.join(directory, os.path.basename(member))
+    archive_mtime = os.stat(archive_path).st_mtime_ns
+    try:
+        if os.stat(target).st_mtime_ns == archive_mtime:
+            return target
+    except FileNotFoundError:
+        pass
+    os.makedirs(directory, exist_ok=True)
+    tmp_file = target + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(read_member(archive_path, member))
+    os.utime(tmp_file, ns=(archive_mtime, archive_mtime))
+    os.replace(tmp_file, target)
+    debug_print(f"Archiv-Eintrag entpackt nach {target}")
+    return target
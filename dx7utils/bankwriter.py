@@ -0,0 +1,103 @@
+import os
+import re
+
+import numpy as np
+
+from dx7utils.archive import split_member_path
+from dx7utils.common import debug_print
+from dx7utils.matrix import load_voice_records
+from dx7utils.sysex import VOICE_SIZE, pack_voice, vmem_dump
+
+BANK_VOICES = 32
+BANK_FILE_SIZE = 4104
+
+
+def _init_voice():
+    operator = [99, 99, 99, 99, 99, 99, 99, 0, 39, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 7]
+    params = bytearray()
+    for op in range(6):
+        operator[16] = 99 if op == 5 else 0
+        params += bytes(operator)
+    params += bytes([99, 99, 99, 99, 50, 50, 50, 50, 0, 0, 1, 35, 0, 0, 0, 1, 0, 3, 24])
+    params += b'INIT VOICE'
+    return bytes(pack_voice(params))
+
+
+INIT_VOICE = _init_voice()
+
+
+def bank_dump(records, channel=0):
+    records = np.asarray(records, dtype=np.uint8).reshape(-1, VOICE_SIZE)
+    padding = -len(records) % BANK_VOICES
+    if padding or not len(records):
+        fill = np.frombuffer(INIT_VOICE, dtype=np.uint8)
+        records = np.vstack([records, np.tile(fill, (padding or BANK_VOICES, 1))])
+    return vmem_dump(records.tobytes(), channel)
+
+
+def write_bank(file_path, records, channel=0):
+    if len(records) > BANK_VOICES:
+        raise ValueError(f"Eine Bank fasst höchstens {BANK_VOICES} Stimmen, nicht {len(records)}.")
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_file = file_path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(bank_dump(records, channel))
+    os.replace(tmp_file, file_path)
+
+
+def collect_records(index, voices):
+    records = np.tile(np.frombuffer(INIT_VOICE, dtype=np.uint8), (len(voices), 1))
+    by_file = {}
+    for i, (file_path, voice_number) in enumerate(voices):
+        by_file.setdefault(file_path, []).append((i, voice_number - 1))
+    archive_cache = {}
+    for file_path in sorted(by_file, key=split_member_path):
+        source = None
+        entry = index.entries.get(file_path)
+        if index.pack is not None and entry is not None:
+            source = index.pack.records(file_path, entry['size'], entry['mtime'])
+        if source is None:
+            source = load_voice_records(file_path, archive_cache)
+        source = np.asarray(source, dtype=np.uint8).reshape(-1, VOICE_SIZE)
+        for row, voice in by_file[file_path]:
+            if voice < len(source):
+                records[row] = source[voice]
+            else:
+                debug_print(f"Stimme {voice + 1} fehlt in {file_path}, wird durch INIT VOICE ersetzt")
+    return records
+
+
+def bank_file_name(name):
+    return re.sub(r'[^\w\-. ]+', '_', name).strip(' ._') or 'bank'
+
+
+def _unique_path(base, used, overwrite=False):
+    # Gruppennamen können nach dem Bereinigen gleich sein, auch nur in Groß-/Kleinschreibung;
+    # vorhandene Dateien bleiben ohne overwrite erhalten (os.path.exists folgt der Schreibweise des Dateisystems)
+    file_path, number = f"{base}.syx", 1
+    while file_path.casefold() in used or (not overwrite and os.path.exists(file_path)):
+        number += 1
+        file_path = f"{base}_{number}.syx"
+    used.add(file_path.casefold())
+    return file_path
+
+
+def write_banks(index, groups, target, channel=0, overwrite=False):
+    names = list(groups)
+    voices = [voice for name in names for voice in groups[name]]
+    records = collect_records(index, voices)
+    written = []
+    used = set()
+    position = 0
+    for name in names:
+        count = len(groups[name])
+        base = os.path.join(target, bank_file_name(name))
+        for start in range(0, count, BANK_VOICES):
+            file_path = _unique_path(base, used, overwrite)
+            write_bank(file_path, records[position + start:position + min(start + BANK_VOICES, count)], channel)
+            written.append(file_path)
+        position += count
+    debug_print(f"{len(written)} Bänke mit {len(voices)} Stimmen nach {target} geschrieben")
+    return written
@@ -0,0 +1,241 @@
+import json
+import os
+import shlex
+import sqlite3
+import threading
+
+from dx7utils.archive import split_member_path
+from dx7utils.common import debug_print
+from dx7utils.nameindex import normalize_name
+from dx7utils.sysex import HASH_SIZE
+
+CATALOGUE_VERSION = 1
+DEFAULT_CATALOGUE_FILE = 'data/catalogue.sqlite'
+FAVOURITE_TAG = 'favorit'
+FILTER_KEYS = {'instrument': 'instrument', 'ordner': 'folder', 'folder': 'folder', 'tag': 'tag'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    folder TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    instrument TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files(folder);
+CREATE INDEX IF NOT EXISTS files_instrument ON files(instrument);
+CREATE TABLE IF NOT EXISTS voices (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    voice_number INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash TEXT,
+    sound_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS voices_file ON voices(file_id);
+CREATE INDEX IF NOT EXISTS voices_key ON voices(key);
+CREATE INDEX IF NOT EXISTS voices_hash ON voices(hash);
+CREATE TABLE IF NOT EXISTS tags (
+    hash TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (hash, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tags_tag ON tags(tag);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS voice_names USING fts5(
+    key, content='voices', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS voices_insert AFTER INSERT ON voices BEGIN
+    INSERT INTO voice_names(rowid, key) VALUES (new.id, new.key);
+END;
+CREATE TRIGGER IF NOT EXISTS voices_delete AFTER DELETE ON voices BEGIN
+    INSERT INTO voice_names(voice_names, rowid, key) VALUES ('delete', old.id, old.key);
+END;
+"""
+
+
+def parse_query(text):
+    try:
+        tokens = shlex.split(text)
+    except ValueError:
+        tokens = text.split()
+    words, filters = [], {}
+    for token in tokens:
+        key, separator, value = token.partition(':')
+        if separator and key.lower() in FILTER_KEYS and value:
+            filters[FILTER_KEYS[key.lower()]] = value
+        else:
+            words.append(token)
+    return ' '.join(words), filters
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def file_folder(file_path, directory):
+    folder = os.path.relpath(os.path.dirname(split_member_path(file_path)[0]), directory)
+    return '' if folder == os.curdir else folder.replace(os.sep, '/')
+
+
+class Catalogue:
+    def __init__(self, catalogue_file=DEFAULT_CATALOGUE_FILE):
+        directory = os.path.dirname(catalogue_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.catalogue_file = catalogue_file
+        self.connection = sqlite3.connect(catalogue_file, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.synced = None
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != CATALOGUE_VERSION:
+            self._drop_catalogue()
+        self.connection.executescript(SCHEMA)
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            debug_print(f"FTS5 nicht verfügbar, Namenssuche ohne Volltextindex: {e}")
+            self.fts = False
+        self.connection.execute(f'PRAGMA user_version={CATALOGUE_VERSION}')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _drop_catalogue(self):
+        for table in ('voice_names', 'voices', 'files'):
+            self.connection.execute(f'DROP TABLE IF EXISTS {table}')
+
+    def sync(self, index):
+        state = (index.token, index.generation)
+        if self.synced == state:
+            return 0, 0
+        with self.lock, self.connection:
+            known = {path: (file_id, size, mtime) for file_id, path, size, mtime in
+                     self.connection.execute('SELECT id, path, size, mtime FROM files')}
+            removed = [known[path][0] for path in known if path not in index.entries]
+            changed = []
+            for file_path, entry in index.entries.items():
+                old = known.get(file_path)
+                if old is None or old[1] != entry['size'] or old[2] != entry['mtime']:
+                    changed.append(file_path)
+            self._delete_files(removed + [known[path][0] for path in changed if path in known])
+            for file_path in changed:
+                self._insert_file(file_path, index.entries[file_path], index.directory,
+                                  index.hashes.get(file_path, (b'', b'')))
+        self.synced = state
+        if changed or removed:
+            debug_print(f"Katalog aktualisiert: {len(changed)} Dateien eingetragen, {len(removed)} entfernt")
+        return len(changed), len(removed)
+
+    def _delete_files(self, file_ids):
+        rows = [(file_id,) for file_id in file_ids]
+        self.connection.executemany('DELETE FROM voices WHERE file_id = ?', rows)
+        self.connection.executemany('DELETE FROM files WHERE id = ?', rows)
+
+    def _insert_file(self, file_path, entry, directory, hashes):
+        cursor = self.connection.execute(
+            'INSERT INTO files (path, folder, size, mtime, instrument) VALUES (?, ?, ?, ?, ?)',
+            (file_path, file_folder(file_path, directory), entry['size'], entry['mtime'], entry['instrument']),
+        )
+        file_id = cursor.lastrowid
+        full, sound = hashes
+        self.connection.executemany(
+            'INSERT INTO voices (file_id, voice_number, name, key, hash, sound_hash) VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (file_id, i, name, normalize_name(name),
+                 full[(i - 1) * HASH_SIZE:i * HASH_SIZE].hex() or None,
+                 sound[(i - 1) * HASH_SIZE:i * HASH_SIZE].hex() or None)
+                for i, name in enumerate(entry['names'], 1)
+            ],
+        )
+
+    def query(self, term='', mode='substring', keys=None, instrument=None, folder=None, tag=None, limit=None):
+        term = normalize_name(term)
+        joins, clauses, params, order_params = [], [], [], []
+        order = 'files.path, voices.voice_number'
+        if keys is not None:
+            joins.append('JOIN json_each(?) AS ranked ON ranked.value = voices.key')
+            params.append(json.dumps(list(keys)))
+            order = 'ranked.key, files.path, voices.voice_number'
+        elif term:
+            pattern = f'{term}%' if mode == 'prefix' else f'%{term}%'
+            if self.fts:
+                clauses.append('voices.id IN (SELECT rowid FROM voice_names WHERE key LIKE ?)')
+            else:
+                clauses.append('voices.key LIKE ?')
+            params.append(pattern)
+            order = ('(voices.key = ?) DESC, (substr(voices.key, 1, ?) = ?) DESC, '
+                     'voices.key, files.path, voices.voice_number')
+            order_params = [term, len(term), term]
+        if instrument:
+            clauses.append("files.instrument LIKE ? ESCAPE '\\'")
+            params.append(f'%{_escape_like(instrument)}%')
+        if folder:
+            folder = folder.strip('/')
+            clauses.append("(files.folder = ? OR files.folder LIKE ? ESCAPE '\\')")
+            params += [folder, f'{_escape_like(folder)}/%']
+        if tag:
+            clauses.append('voices.hash IN (SELECT hash FROM tags WHERE tag = ?)')
+            params.append(tag)
+        sql = ('SELECT files.path, voices.voice_number, voices.name, files.instrument FROM voices '
+               'JOIN files ON files.id = voices.file_id ' + ' '.join(joins))
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ' + order
+        if limit is not None:
+            sql += ' LIMIT ?'
+            order_params.append(limit)
+        with self.lock:
+            return [tuple(row) for row in self.connection.execute(sql, params + order_params)]
+
+    def search(self, index, term='', mode='substring', **filters):
+        self.sync(index)
+        keys = None
+        if mode == 'fuzzy' and normalize_name(term):
+            keys = [key for key, _ in index.name_index().query(term, 'fuzzy')]
+        return self.query(term, mode, keys=keys, **filters)
+
+    def instruments(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute('SELECT DISTINCT instrument FROM files ORDER BY 1')]
+
+    def folders(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute('SELECT DISTINCT folder FROM files ORDER BY 1')]
+
+    def all_tags(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute('SELECT DISTINCT tag FROM tags ORDER BY 1')]
+
+    def tags(self, voice_hash):
+        with self.lock:
+            return [row[0] for row in
+                    self.connection.execute('SELECT tag FROM tags WHERE hash = ? ORDER BY tag', (voice_hash,))]
+
+    def add_tag(self, voice_hash, tag):
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO tags (hash, tag) VALUES (?, ?)', (voice_hash, tag))
+
+    def remove_tag(self, voice_hash, tag):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM tags WHERE hash = ? AND tag = ?', (voice_hash, tag))
+
+    def toggle_tag(self, voice_hash, tag=FAVOURITE_TAG):
+        if tag in self.tags(voice_hash):
+            self.remove_tag(voice_hash, tag)
+            return False
+        self.add_tag(voice_hash, tag)
+        return True
@@ -41,16 +41,55 @@ def load_config_simple():
         sys.exit(1)
 
 
+def load_scan_workers():
+    try:
+        with open('data/config.json', 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return config.get('scan_workers') or None
+
+
+def load_library_pack():
+    try:
+        with open('data/config.json', 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return config.get('library_pack') or None
+
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def iter_sysex_entries(directory, archives=False):
+    pending = [directory]
+    while pending:
+        path = pending.pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.name.endswith('.syx') and entry.is_file():
+                            yield entry
+                        elif archives and entry.name.lower().endswith(ARCHIVE_SUFFIXES) and entry.is_file():
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError as e:
+            debug_print(f"Verzeichnis nicht lesbar: {path}: {e}")
+
+
+def iter_sysex_files(directory, archives=False):
+    for entry in iter_sysex_entries(directory, archives):
+        yield entry.path
+
+
 def find_sysex_files(directory):
-    sysex_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.syx'):
-                full_path = os.path.join(root, file)
-                sysex_files.append(full_path)
+    sysex_files = list(iter_sysex_files(directory))
     debug_print(f"Gefundene SysEx-Dateien: {len(sysex_files)}")
-    for file in sysex_files:
-        debug_print(f"  {file}")
     return sysex_files
 
 
@@ -0,0 +1,48 @@
+import json
+import os
+import socket
+
+DEFAULT_SOCKET_FILE = 'data/dx7d.sock'
+CONNECT_TIMEOUT = 0.5
+
+
+def encode_message(message):
+    return (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def connect(socket_file=DEFAULT_SOCKET_FILE):
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_file):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(socket_file)
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def _iter_responses(sock):
+    with sock, sock.makefile('r', encoding='utf-8') as stream:
+        for line in stream:
+            message = json.loads(line)
+            if 'error' in message:
+                raise RuntimeError(message['error'])
+            if message.get('done'):
+                return
+            yield message['result']
+    raise ConnectionError("Verbindung zum DX7-Dienst unterbrochen.")
+
+
+def query_daemon(command, socket_file=DEFAULT_SOCKET_FILE, **arguments):
+    sock = connect(socket_file)
+    if sock is None:
+        return None
+    try:
+        sock.sendall(encode_message({'command': command, **arguments}))
+    except OSError:
+        sock.close()
+        return None
+    return _iter_responses(sock)
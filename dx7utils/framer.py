@@ -0,0 +1,49 @@
+from collections import namedtuple
+
+SYSEX_START = b'\xF0'
+SYSEX_END = b'\xF7'
+YAMAHA_ID = 0x43
+HEADER_SIZE = 6
+FORMAT_VCED = 0
+FORMAT_VMEM = 9
+
+Frame = namedtuple('Frame', 'start end format byte_count data_offset length checksum_ok')
+
+
+def iter_messages(data):
+    start = data.find(SYSEX_START)
+    while start >= 0:
+        end = data.find(SYSEX_END, start + 1)
+        if end < 0:
+            yield start, len(data)
+            return
+        restart = data.find(SYSEX_START, start + 1, end)
+        if restart >= 0:
+            yield start, restart
+            start = restart
+            continue
+        yield start, end + 1
+        start = data.find(SYSEX_START, end + 1)
+
+
+def checksum(payload):
+    return -sum(payload) & 0x7F
+
+
+def decode_message(data, start, end):
+    if end - start < HEADER_SIZE or data[start + 1] != YAMAHA_ID or data[start + 2] & 0xF0:
+        return None
+    data_offset = start + HEADER_SIZE
+    byte_count = (data[start + 4] << 7) | data[start + 5]
+    length = min(byte_count, end - data_offset)
+    checksum_ok = False
+    if data_offset + byte_count < end:
+        checksum_ok = checksum(data[data_offset:data_offset + byte_count]) == data[data_offset + byte_count]
+    return Frame(start, end, data[start + 3], byte_count, data_offset, length, checksum_ok)
+
+
+def iter_frames(data):
+    for start, end in iter_messages(data):
+        frame = decode_message(data, start, end)
+        if frame is not None:
+            yield frame
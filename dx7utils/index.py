@@ -0,0 +1,452 @@
+import json
+import os
+import uuid
+from collections import deque
+
+from dx7utils.archive import is_archive, split_member_path
+from dx7utils.common import debug_print, iter_sysex_entries
+from dx7utils.scanner import parse_files
+from dx7utils.sysex import HASH_SIZE
+
+INDEX_VERSION = 4
+DEFAULT_INDEX_FILE = 'data/patch_index.json'
+MATRIX_FILE_NAME = 'voice_matrix.npz'
+NAMES_FILE_NAME = 'name_index.npz'
+HASHES_FILE_NAME = 'voice_hashes.npz'
+
+
+def _entry_patches(file_path, entry):
+    for i, name in enumerate(entry['names'], 1):
+        yield file_path, i, name, entry['instrument']
+
+
+class PatchIndex:
+    def __init__(self, directory, index_file=DEFAULT_INDEX_FILE):
+        self.directory = directory
+        self.index_file = index_file
+        self.matrix_file = os.path.join(os.path.dirname(index_file), MATRIX_FILE_NAME)
+        self.names_file = os.path.join(os.path.dirname(index_file), NAMES_FILE_NAME)
+        self.hashes_file = os.path.join(os.path.dirname(index_file), HASHES_FILE_NAME)
+        self.entries = {}
+        self.hashes = {}
+        self.archives = {}
+        self.pack = None
+        self.dirty = False
+        self.token = uuid.uuid4().hex
+        self.generation = 0
+        self._matrix = None
+        self._matrix_generation = None
+        self.fresh_params = {}
+        self.collect_params = False
+        self._similarity = None
+        self._names = None
+        self._similarity_generation = None
+        self.last_refresh = (0, 0)
+
+    def load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            debug_print(f"{self.index_file} nicht gefunden, Index wird neu aufgebaut.")
+            return
+        except (OSError, ValueError) as e:
+            debug_print(f"Index {self.index_file} unlesbar, wird neu aufgebaut: {e}")
+            return
+        if data.get('version') != INDEX_VERSION or data.get('directory') != self.directory:
+            debug_print(f"Index {self.index_file} passt nicht zum Verzeichnis, wird neu aufgebaut.")
+            return
+        entries = data.get('files', {})
+        self.hashes = self._load_hashes(entries)
+        # Dateien ohne passende Hashes werden beim nächsten Nachführen neu eingelesen
+        self.entries = {path: entry for path, entry in entries.items() if path in self.hashes}
+        self.archives = {path: archive for path, archive in data.get('archives', {}).items()
+                         if all(member in self.entries for member in archive['members'])}
+        self._names = None
+        self.generation += 1
+        debug_print(f"Index geladen: {len(self.entries)} Dateien")
+
+    def _load_hashes(self, entries):
+        import numpy as np
+
+        try:
+            with np.load(self.hashes_file, allow_pickle=False) as data:
+                files, sizes, mtimes, counts = (data['files'].tolist(), data['sizes'].tolist(),
+                                                data['mtimes'].tolist(), data['counts'].tolist())
+                full, sound = data['hashes'].tobytes(), data['sound_hashes'].tobytes()
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError) as e:
+            debug_print(f"Hashes {self.hashes_file} unlesbar, Dateien werden neu eingelesen: {e}")
+            return {}
+        hashes = {}
+        start = 0
+        for file_path, size, mtime, count in zip(files, sizes, mtimes, counts):
+            end = start + count * HASH_SIZE
+            entry = entries.get(file_path)
+            if entry and entry['size'] == size and entry['mtime'] == mtime and len(entry['names']) == count:
+                hashes[file_path] = (full[start:end], sound[start:end])
+            start = end
+        return hashes
+
+    def _save_hashes(self):
+        import numpy as np
+
+        files = sorted(self.entries)
+        tmp_file = self.hashes_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(
+                f,
+                files=np.array(files, dtype=str),
+                sizes=np.array([self.entries[path]['size'] for path in files], dtype=np.int64),
+                mtimes=np.array([self.entries[path]['mtime'] for path in files], dtype=np.int64),
+                counts=np.array([len(self.entries[path]['names']) for path in files], dtype=np.int64),
+                hashes=np.frombuffer(b''.join(self.hashes[path][0] for path in files), dtype=np.uint8),
+                sound_hashes=np.frombuffer(b''.join(self.hashes[path][1] for path in files), dtype=np.uint8),
+            )
+        os.replace(tmp_file, self.hashes_file)
+
+    def load_pack(self, pack_file):
+        from dx7utils.pack import LibraryPack
+
+        try:
+            pack = LibraryPack(pack_file)
+        except (OSError, ValueError) as e:
+            debug_print(f"Bibliothek {pack_file} unlesbar: {e}")
+            return False
+        if pack.directory != self.directory:
+            debug_print(f"Bibliothek {pack_file} passt nicht zum Verzeichnis.")
+            pack.close()
+            return False
+        if self.pack is not None:
+            self.pack.close()
+        self.pack = pack
+        self.entries = pack.entries()
+        self.hashes = pack.voice_hashes()
+        self.archives = pack.archives
+        self._names = None
+        self.generation += 1
+        debug_print(f"Bibliothek geladen: {len(self.entries)} Dateien, {len(pack)} Stimmen")
+        return True
+
+    def save(self):
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.index_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Hashes zuerst schreiben: ein Index, der neuer ist als seine Hashes, darf nicht entstehen
+        self._save_hashes()
+        data = {'version': INDEX_VERSION, 'directory': self.directory, 'files': self.entries, 'archives': self.archives}
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_file, self.index_file)
+        self.dirty = False
+        debug_print(f"Index gespeichert: {self.index_file}")
+
+    def _set_entry(self, path, entry):
+        old = self.entries.get(path)
+        if self._names is not None:
+            if old is not None:
+                self._names.remove_file(path, old['names'])
+            if entry is not None:
+                self._names.add_file(path, entry['names'])
+        if entry is None:
+            del self.entries[path]
+            self.hashes.pop(path, None)
+            self.fresh_params.pop(path, None)
+        else:
+            self.entries[path] = entry
+
+    def _unchanged_members(self, path, st):
+        if is_archive(path):
+            entry = self.archives.get(path)
+            members = entry['members'] if entry else ()
+        else:
+            entry = self.entries.get(path)
+            members = (path,)
+        if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns:
+            return members
+        return None
+
+    def _store(self, path, size, mtime, info):
+        if 'members' in info:
+            old = self.archives.get(path)
+            self.archives[path] = {'size': size, 'mtime': mtime, 'members': sorted(info['members'])}
+            for member in old['members'] if old else ():
+                if member not in info['members'] and member in self.entries:
+                    self._set_entry(member, None)
+            banks = info['members'].items()
+        else:
+            banks = ((path, info),)
+        stored = []
+        for bank_path, bank_info in banks:
+            entry = {'size': size, 'mtime': mtime, **bank_info}
+            # Beim Einlesen dekodierte Parameter gehen in die Matrix, nicht in die JSON-Datei;
+            # aufbewahrt werden sie nur, wenn die Matrix geladen ist oder gebraucht wird
+            params = entry.pop('params', None)
+            if params is not None and (self.collect_params or self._matrix is not None):
+                self.fresh_params[bank_path] = params
+            self.hashes[bank_path] = (entry.pop('hashes', b''), entry.pop('sound_hashes', b''))
+            self._set_entry(bank_path, entry)
+            stored.append((bank_path, entry))
+        self.dirty = True
+        self.generation += 1
+        return stored
+
+    def iter_refresh(self, workers=None, processes=False, include_cached=True):
+        seen = set()
+        stats = {}
+        cached = deque()
+
+        def changed_files():
+            for dir_entry in iter_sysex_entries(self.directory, archives=True):
+                try:
+                    st = dir_entry.stat()
+                except OSError:
+                    continue
+                path = dir_entry.path
+                seen.add(path)
+                members = self._unchanged_members(path, st)
+                if members is not None:
+                    seen.update(members)
+                    if include_cached:
+                        cached.extend(members)
+                    continue
+                stats[path] = (st.st_size, st.st_mtime_ns)
+                yield path
+
+        parsed = 0
+        for path, info in parse_files(changed_files(), workers, processes):
+            size, mtime = stats.pop(path)
+            while cached:
+                cached_path = cached.popleft()
+                yield from _entry_patches(cached_path, self.entries[cached_path])
+            for bank_path, entry in self._store(path, size, mtime, info):
+                seen.add(bank_path)
+                parsed += 1
+                yield from _entry_patches(bank_path, entry)
+        while cached:
+            cached_path = cached.popleft()
+            yield from _entry_patches(cached_path, self.entries[cached_path])
+
+        removed = [path for path in self.entries if path not in seen]
+        for path in removed:
+            self._set_entry(path, None)
+        for path in [path for path in self.archives if path not in seen]:
+            del self.archives[path]
+            self.dirty = True
+        if removed:
+            self.dirty = True
+            self.generation += 1
+        self.last_refresh = (parsed, len(removed))
+        debug_print(f"Index aktualisiert: {parsed} neu eingelesen, {len(removed)} entfernt, {len(self.entries)} gesamt")
+
+    def update_paths(self, paths, workers=None):
+        paths = set(paths)
+        prefixes = tuple(path + os.sep for path in paths)
+        present = set()
+        stats = {}
+        for path in paths:
+            if os.path.isdir(path):
+                dir_entries = iter_sysex_entries(path, archives=True)
+            elif os.path.isfile(path) and (path.endswith('.syx') or is_archive(path)):
+                dir_entries = (path,)
+            else:
+                continue
+            for dir_entry in dir_entries:
+                try:
+                    st = os.stat(dir_entry) if isinstance(dir_entry, str) else dir_entry.stat()
+                except OSError:
+                    continue
+                file_path = dir_entry if isinstance(dir_entry, str) else dir_entry.path
+                present.add(file_path)
+                if self._unchanged_members(file_path, st) is None:
+                    stats[file_path] = (st.st_size, st.st_mtime_ns)
+
+        def affected(key):
+            source = split_member_path(key)[0]
+            return (source in paths or source.startswith(prefixes)) and source not in present
+
+        removed = [key for key in self.entries if affected(key)]
+        for key in removed:
+            self._set_entry(key, None)
+        removed_archives = [key for key in self.archives if affected(key)]
+        for key in removed_archives:
+            del self.archives[key]
+        if removed or removed_archives:
+            self.dirty = True
+            self.generation += 1
+
+        parsed = 0
+        for path, info in parse_files(list(stats), workers):
+            size, mtime = stats[path]
+            parsed += len(self._store(path, size, mtime, info))
+        if parsed or removed:
+            debug_print(f"Index nachgeführt: {parsed} neu eingelesen, {len(removed)} entfernt")
+        return parsed, len(removed)
+
+    def stale_paths(self, snapshot):
+        known = {split_member_path(path)[0] for path in self.entries}
+        known.update(self.archives)
+        stale = [path for path in known if path not in snapshot]
+        for path, (size, mtime) in snapshot.items():
+            entry = self.archives.get(path) if is_archive(path) else self.entries.get(path)
+            if not entry or entry['size'] != size or entry['mtime'] != mtime:
+                stale.append(path)
+        return sorted(stale)
+
+    def refresh(self, workers=None, processes=False):
+        for _ in self.iter_refresh(workers, processes):
+            pass
+        return self.last_refresh
+
+    def name_index(self):
+        from dx7utils.nameindex import build_name_index, load_name_index
+
+        if self._names is not None and self._names.needs_rebuild():
+            self._names = None
+        if self._names is None:
+            names = load_name_index(self.names_file, self.entries)
+            if names is None:
+                names = build_name_index(self.entries)
+                debug_print(f"Namensindex aufgebaut: {len(names)} verschiedene Namen")
+                try:
+                    names.save(self.names_file)
+                except OSError as e:
+                    debug_print(f"Namensindex {self.names_file} nicht gespeichert: {e}")
+            self._names = names
+        return self._names
+
+    def iter_search(self, search_term, workers=None, processes=False, mode='substring'):
+        from dx7utils.nameindex import normalize_name, score_name
+
+        self.name_index()
+        term = normalize_name(search_term)
+        fresh = set()
+        for patch in self.iter_refresh(workers, processes, include_cached=False):
+            fresh.add(patch[0])
+            if score_name(term, normalize_name(patch[2]), mode) is not None:
+                yield patch
+        for patch in self.search(search_term, mode):
+            if patch[0] not in fresh:
+                yield patch
+
+    def voice_matrix(self):
+        from dx7utils.matrix import VoiceMatrix, build_voice_matrix
+
+        if self._matrix is not None and self._matrix_generation == self.generation:
+            return self._matrix
+        previous = self._matrix
+        if previous is None and os.path.isfile(self.matrix_file):
+            try:
+                previous = VoiceMatrix.load(self.matrix_file)
+            except (OSError, ValueError, KeyError) as e:
+                debug_print(f"Parameter-Matrix {self.matrix_file} unlesbar, wird neu aufgebaut: {e}")
+        matrix, parsed = build_voice_matrix(self, previous)
+        self.fresh_params.clear()
+        if previous is None or parsed or matrix.files != previous.files:
+            matrix.save(self.matrix_file)
+        self._matrix = matrix
+        self._matrix_generation = self.generation
+        return matrix
+
+    def similarity_index(self):
+        from dx7utils.similar import SimilarityIndex
+
+        matrix = self.voice_matrix()
+        if self._similarity is None or self._similarity_generation != self.generation:
+            self._similarity = SimilarityIndex(matrix.params)
+            self._similarity_generation = self.generation
+        return self._similarity
+
+    def similar(self, file_path, voice_number, k=10, distinct=True):
+        matrix = self.voice_matrix()
+        row = matrix.rows(file_path).start + voice_number - 1
+        similarity = self.similarity_index()
+        candidates = similarity.iter_nearest(similarity.features[row], exclude=row, batch=k * 4)
+        seen = {self.voice_hash(file_path, voice_number, include_name=False)}
+        results = []
+        for candidate, distance in candidates:
+            patch = next(self.matrix_patches([candidate]))
+            if distinct:
+                key = self.voice_hash(patch[0], patch[1], include_name=False)
+                if key in seen:
+                    continue
+                seen.add(key)
+            results.append((*patch, distance))
+            if len(results) == k:
+                break
+        return results
+
+    def files(self):
+        return sorted(self.entries)
+
+    def patch_names(self, file_path):
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return [], "Unknown"
+        return entry['names'], entry['instrument']
+
+    def patches(self):
+        for file_path in self.files():
+            entry = self.entries[file_path]
+            yield from _entry_patches(file_path, entry)
+
+    def voice_hash(self, file_path, voice_number, include_name=True):
+        hashes = self.hashes[file_path][0 if include_name else 1]
+        return hashes[(voice_number - 1) * HASH_SIZE:voice_number * HASH_SIZE].hex()
+
+    def iter_collapsed(self, patches, include_name=True):
+        # (patch, key, 1) für die erste Fundstelle eines Klangs,
+        # (None, key, n) sobald er in einer weiteren Datei auftaucht
+        files_by_key = {}
+        for patch in patches:
+            key = self.voice_hash(patch[0], patch[1], include_name)
+            files = files_by_key.get(key)
+            if files is None:
+                files_by_key[key] = {patch[0]}
+                yield patch, key, 1
+            elif patch[0] not in files:
+                files.add(patch[0])
+                yield None, key, len(files)
+
+    def collapse_duplicates(self, patches, include_name=True):
+        rows, counts = {}, {}
+        for patch, key, count in self.iter_collapsed(patches, include_name):
+            if patch is not None:
+                rows[key] = patch
+            counts[key] = count
+        return [(*patch, counts[key]) for key, patch in rows.items()]
+
+    def matrix_patches(self, rows):
+        matrix = self.voice_matrix()
+        for row in rows:
+            file_path, voice_number = matrix.locate(row)
+            entry = self.entries[file_path]
+            yield file_path, voice_number, entry['names'][voice_number - 1], entry['instrument']
+
+    def search(self, search_term, mode='substring', **criteria):
+        allowed = None
+        if criteria:
+            matrix = self.voice_matrix()
+            allowed = set(matrix.select(**criteria).tolist())
+        results = []
+        for file_path, voice_number, _ in self.name_index().matches(search_term, mode):
+            if allowed is not None:
+                matrix_row = int(matrix.offsets[matrix.file_numbers[file_path]]) + voice_number - 1
+                if matrix_row not in allowed:
+                    continue
+            entry = self.entries[file_path]
+            results.append((file_path, voice_number, entry['names'][voice_number - 1], entry['instrument']))
+        return results
+
+
+def load_index(directory, index_file=DEFAULT_INDEX_FILE, workers=None, collect_params=False):
+    index = PatchIndex(directory, index_file)
+    index.collect_params = collect_params
+    index.load()
+    index.refresh(workers)
+    index.save()
+    return index
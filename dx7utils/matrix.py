@@ -0,0 +1,234 @@
+import os
+
+import numpy as np
+
+from dx7utils.archive import iter_archive_members, member_path, split_member_path
+from dx7utils.common import debug_print, identify_instrument
+from dx7utils.framer import FORMAT_VCED
+from dx7utils.sysex import (
+    HEADER_SIZE,
+    NAME_OFFSET,
+    NAME_SIZE,
+    PARAMETER_OFFSETS,
+    VCED_SIZE,
+    VOICE_SIZE,
+    VoiceBank,
+)
+
+MATRIX_VERSION = 2
+
+OPERATOR_MAXIMA = [99, 99, 99, 99, 99, 99, 99, 99, 99, 99, 99, 3, 3, 7, 3, 7, 99, 1, 31, 99, 14]
+VOICE_MAXIMA = [99, 99, 99, 99, 99, 99, 99, 99, 31, 7, 1, 99, 99, 99, 99, 1, 5, 7, 48]
+PARAMETER_MAXIMA = np.array(OPERATOR_MAXIMA * 6 + VOICE_MAXIMA + [127] * NAME_SIZE, dtype=np.uint8)
+
+
+def unpack_voices(records):
+    records = np.asarray(records, dtype=np.uint8).reshape(-1, VOICE_SIZE)
+    n = len(records)
+    ops = records[:, :102].reshape(n, 6, 17)
+    out_ops = np.empty((n, 6, 21), dtype=np.uint8)
+    out_ops[..., 0:11] = ops[..., 0:11]
+    out_ops[..., 11] = ops[..., 11] & 0x03
+    out_ops[..., 12] = (ops[..., 11] >> 2) & 0x03
+    out_ops[..., 13] = ops[..., 12] & 0x07
+    out_ops[..., 14] = ops[..., 13] & 0x03
+    out_ops[..., 15] = (ops[..., 13] >> 2) & 0x07
+    out_ops[..., 16] = ops[..., 14]
+    out_ops[..., 17] = ops[..., 15] & 0x01
+    out_ops[..., 18] = (ops[..., 15] >> 1) & 0x1F
+    out_ops[..., 19] = ops[..., 16]
+    out_ops[..., 20] = (ops[..., 12] >> 3) & 0x0F
+
+    params = np.empty((n, VCED_SIZE), dtype=np.uint8)
+    params[:, :126] = out_ops.reshape(n, 126)
+    params[:, 126:134] = records[:, 102:110]
+    params[:, 134] = records[:, 110] & 0x1F
+    params[:, 135] = records[:, 111] & 0x07
+    params[:, 136] = (records[:, 111] >> 3) & 0x01
+    params[:, 137:141] = records[:, 112:116]
+    params[:, 141] = records[:, 116] & 0x01
+    params[:, 142] = (records[:, 116] >> 1) & 0x07
+    params[:, 143] = (records[:, 116] >> 4) & 0x07
+    params[:, 144] = records[:, 117]
+    params[:, 145:155] = records[:, NAME_OFFSET:NAME_OFFSET + NAME_SIZE]
+    return params
+
+
+def pack_voices(params):
+    params = np.asarray(params, dtype=np.uint8).reshape(-1, VCED_SIZE)
+    n = len(params)
+    ops = params[:, :126].reshape(n, 6, 21)
+    out_ops = np.empty((n, 6, 17), dtype=np.uint8)
+    out_ops[..., 0:11] = ops[..., 0:11]
+    out_ops[..., 11] = (ops[..., 11] & 0x03) | ((ops[..., 12] & 0x03) << 2)
+    out_ops[..., 12] = (ops[..., 13] & 0x07) | ((ops[..., 20] & 0x0F) << 3)
+    out_ops[..., 13] = (ops[..., 14] & 0x03) | ((ops[..., 15] & 0x07) << 2)
+    out_ops[..., 14] = ops[..., 16]
+    out_ops[..., 15] = (ops[..., 17] & 0x01) | ((ops[..., 18] & 0x1F) << 1)
+    out_ops[..., 16] = ops[..., 19]
+
+    records = np.empty((n, VOICE_SIZE), dtype=np.uint8)
+    records[:, :102] = out_ops.reshape(n, 102)
+    records[:, 102:110] = params[:, 126:134]
+    records[:, 110] = params[:, 134] & 0x1F
+    records[:, 111] = (params[:, 135] & 0x07) | ((params[:, 136] & 0x01) << 3)
+    records[:, 112:116] = params[:, 137:141]
+    records[:, 116] = (params[:, 141] & 0x01) | ((params[:, 142] & 0x07) << 1) | ((params[:, 143] & 0x07) << 4)
+    records[:, 117] = params[:, 144]
+    records[:, NAME_OFFSET:NAME_OFFSET + NAME_SIZE] = params[:, 145:155]
+    return records
+
+
+def vced_messages(params, channel=0):
+    params = np.asarray(params, dtype=np.uint8).reshape(-1, VCED_SIZE)
+    messages = np.empty((len(params), HEADER_SIZE + VCED_SIZE + 2), dtype=np.uint8)
+    messages[:, :HEADER_SIZE] = (0xF0, 0x43, channel & 0x0F, FORMAT_VCED, VCED_SIZE >> 7, VCED_SIZE & 0x7F)
+    messages[:, HEADER_SIZE:-2] = params
+    messages[:, -2] = -params.sum(axis=1, dtype=np.int64) & 0x7F
+    messages[:, -1] = 0xF7
+    return messages
+
+
+def bank_records(bank):
+    records = np.zeros(bank.num_voices * VOICE_SIZE, dtype=np.uint8)
+    position = 0
+    for segment, count in zip(bank.segments, bank.counts):
+        raw = np.frombuffer(segment, dtype=np.uint8)
+        records[position:position + len(raw)] = raw
+        del raw
+        position += count * VOICE_SIZE
+    return records.reshape(-1, VOICE_SIZE)
+
+
+def read_voice_records(file_path):
+    try:
+        with VoiceBank.from_file(file_path) as bank:
+            return bank_records(bank)
+    except Exception as e:
+        debug_print(f"Fehler beim Lesen der Datei {file_path}: {e}")
+        return np.zeros((0, VOICE_SIZE), dtype=np.uint8)
+
+
+def read_archive_records(archive_path):
+    records = {}
+    try:
+        for member, data in iter_archive_members(archive_path):
+            with VoiceBank.from_buffer(data, identify_instrument(len(data))) as bank:
+                records[member_path(archive_path, member)] = bank_records(bank)
+    except Exception as e:
+        debug_print(f"Fehler beim Lesen des Archivs {archive_path}: {e}")
+    return records
+
+
+def load_voice_records(file_path, archive_cache):
+    archive_path, member = split_member_path(file_path)
+    if member is None:
+        return read_voice_records(file_path)
+    if archive_path not in archive_cache:
+        archive_cache.clear()
+        archive_cache[archive_path] = read_archive_records(archive_path)
+    return archive_cache[archive_path].get(file_path, np.zeros((0, VOICE_SIZE), dtype=np.uint8))
+
+
+class VoiceMatrix:
+    def __init__(self, files, sizes, mtimes, counts, params):
+        self.files = list(files)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.mtimes = np.asarray(mtimes, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.params = params
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts))).astype(np.int64)
+        self.row_file = np.repeat(np.arange(len(self.files)), self.counts)
+        self.row_voice = np.arange(len(self.params)) - self.offsets[self.row_file] + 1
+        self.file_numbers = {file_path: i for i, file_path in enumerate(self.files)}
+
+    def __len__(self):
+        return len(self.params)
+
+    @classmethod
+    def load(cls, matrix_file):
+        with np.load(matrix_file, allow_pickle=False) as data:
+            if int(data['version']) != MATRIX_VERSION:
+                raise ValueError(f"Unbekannte Matrix-Version in {matrix_file}")
+            return cls(data['files'].tolist(), data['sizes'], data['mtimes'], data['counts'], data['params'])
+
+    def save(self, matrix_file):
+        directory = os.path.dirname(matrix_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = matrix_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(
+                f,
+                version=np.int64(MATRIX_VERSION),
+                files=np.array(self.files, dtype=str),
+                sizes=self.sizes,
+                mtimes=self.mtimes,
+                counts=self.counts,
+                params=self.params,
+            )
+        os.replace(tmp_file, matrix_file)
+        debug_print(f"Parameter-Matrix gespeichert: {matrix_file} ({len(self)} Stimmen)")
+
+    def rows(self, file_path):
+        i = self.file_numbers[file_path]
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def locate(self, row):
+        return self.files[self.row_file[row]], int(self.row_voice[row])
+
+    def column(self, parameter):
+        return self.params[:, PARAMETER_OFFSETS[parameter]]
+
+    def records(self, rows=None):
+        return pack_voices(self.params if rows is None else self.params[rows])
+
+    def names(self, rows=None):
+        raw = self.params[:, 145:155] if rows is None else self.params[rows, 145:155]
+        return [bytes(name).decode('ascii', 'ignore') for name in raw]
+
+    def select(self, **criteria):
+        mask = np.ones(len(self), dtype=bool)
+        for parameter, value in criteria.items():
+            mask &= self.column(parameter) == value
+        return np.flatnonzero(mask)
+
+    def histogram(self, parameter):
+        return np.bincount(self.column(parameter), minlength=128)
+
+
+def build_voice_matrix(index, previous=None):
+    reusable = {}
+    if previous is not None:
+        for i, file_path in enumerate(previous.files):
+            reusable[file_path] = (int(previous.sizes[i]), int(previous.mtimes[i]), i)
+
+    files, sizes, mtimes, counts, blocks = [], [], [], [], []
+    archive_cache = {}
+    parsed = 0
+    for file_path in index.files():
+        entry = index.entries[file_path]
+        old = reusable.get(file_path)
+        if old and old[0] == entry['size'] and old[1] == entry['mtime']:
+            i = old[2]
+            block = previous.params[previous.offsets[i]:previous.offsets[i + 1]]
+        else:
+            # Beim Nachführen des Index schon dekodiert, die Datei muss nicht noch einmal gelesen werden
+            block = index.fresh_params.get(file_path)
+            if block is None:
+                records = None
+                if index.pack is not None:
+                    records = index.pack.records(file_path, entry['size'], entry['mtime'])
+                if records is None:
+                    records = load_voice_records(file_path, archive_cache)
+                block = unpack_voices(records)
+            parsed += 1
+        files.append(file_path)
+        sizes.append(entry['size'])
+        mtimes.append(entry['mtime'])
+        counts.append(len(block))
+        blocks.append(block)
+
+    params = np.concatenate(blocks) if blocks else np.zeros((0, VCED_SIZE), dtype=np.uint8)
+    debug_print(f"Parameter-Matrix aufgebaut: {len(params)} Stimmen, {parsed} Dateien neu dekodiert")
+    return VoiceMatrix(files, sizes, mtimes, counts, params), parsed
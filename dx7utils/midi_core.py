@@ -1,44 +1,285 @@
 import json
 import os
+import threading
+from collections import namedtuple
 
 import mido
 
 from dx7utils.common import clear_console_line, debug_print
 
-fader_values = {f'program_{i}': {'fader_value': 0, 'cc_value': 0} for i in range(32)}
+PROGRAM_COUNT = 32
+FADER_CONTROL = 6
+NOTE_ON = 0x90
+CONTROL_CHANGE = 0xB0
+PROGRAM_CHANGE = 0xC0
+PITCH_WHEEL = 0xE0
+FORWARD_STATUS = (NOTE_ON, PITCH_WHEEL)
+WAIT_INTERVAL = 0.5
 
-current_program = None
+DEFAULT_FADER_FILE = 'data/fader_values.json'
+JOURNAL_FADER = 0
+JOURNAL_CC = 1
+JOURNAL_RECORD_SIZE = 3
+JOURNAL_FLUSH_INTERVAL = 0.25
+JOURNAL_COMPACT_SIZE = 3 * 4096
 
+FaderSnapshot = namedtuple('FaderSnapshot', 'version fader cc')
 
-def load_from_json(file_name='data/fader_values.json'):
+
+def _midi_value(value):
+    return min(max(int(value), 0), 127)
+
+
+def snapshot_dict(snapshot):
+    return {
+        f'program_{i}': {'fader_value': fader, 'cc_value': cc}
+        for i, (fader, cc) in enumerate(zip(snapshot.fader, snapshot.cc))
+    }
+
+
+class FaderState:
+    def __init__(self, size=PROGRAM_COUNT):
+        self.fader = bytearray(size)
+        self.cc = bytearray(size)
+        self.version = 0
+        self.lock = threading.Lock()
+        # Ein Event je Beobachter, damit clear() des einen dem anderen kein Signal wegnimmt
+        self.listeners = ()
+
+    def add_listener(self):
+        event = threading.Event()
+        with self.lock:
+            self.listeners += (event,)
+        return event
+
+    def remove_listener(self, event):
+        with self.lock:
+            self.listeners = tuple(listener for listener in self.listeners if listener is not event)
+
+    def _notify(self):
+        for event in self.listeners:
+            if not event.is_set():
+                event.set()
+
+    def set_fader(self, program, value):
+        with self.lock:
+            previous = self.fader[program]
+            if previous != value:
+                self.fader[program] = value
+                self.version += 1
+                self._notify()
+        return previous
+
+    def set_cc(self, program, value):
+        with self.lock:
+            previous = self.cc[program]
+            if previous != value:
+                self.cc[program] = value
+                self.version += 1
+                self._notify()
+        return previous
+
+    def snapshot(self):
+        with self.lock:
+            return FaderSnapshot(self.version, bytes(self.fader), bytes(self.cc))
+
+    def to_dict(self):
+        return snapshot_dict(self.snapshot())
+
+    def load_dict(self, data):
+        fader, cc = bytearray(self.fader), bytearray(self.cc)
+        for key, value in data.items():
+            program = key[8:] if key.startswith('program_') else ''
+            if not program.isdigit() or int(program) >= len(fader):
+                continue
+            program = int(program)
+            if isinstance(value, dict):
+                fader[program] = _midi_value(value.get('fader_value', 0))
+                cc[program] = _midi_value(value.get('cc_value', 0))
+            else:
+                fader[program] = _midi_value(value)
+        with self.lock:
+            self.fader[:] = fader
+            self.cc[:] = cc
+            self.version += 1
+            self._notify()
+
+    def apply_records(self, data):
+        count = len(data) // JOURNAL_RECORD_SIZE
+        with self.lock:
+            arrays = (self.fader, self.cc)
+            size = len(self.fader)
+            for i in range(0, count * JOURNAL_RECORD_SIZE, JOURNAL_RECORD_SIZE):
+                kind, program, value = data[i], data[i + 1], data[i + 2]
+                if kind < len(arrays) and program < size and value < 128:
+                    arrays[kind][program] = value
+            self.version += 1
+            self._notify()
+        return count
+
+
+fader_state = FaderState()
+
+
+def journal_file_name(file_name):
+    return os.path.splitext(file_name)[0] + '.journal'
+
+
+def replay_journal(journal_file, state):
+    try:
+        with open(journal_file, 'rb') as file:
+            data = file.read()
+    except FileNotFoundError:
+        return 0
+    count = state.apply_records(data)
+    debug_print(f"{count} Fader-Änderungen aus {journal_file} nachgespielt.")
+    return count
+
+
+def retired_journal_name(file_name):
+    return journal_file_name(file_name) + '.old'
+
+
+def recover_fader_file(file_name):
+    # Abgebrochenes write_fader_file zu Ende führen: das Journal war schon beiseitegelegt,
+    # die fertige temporäre Datei ist also der neueste Stand
+    retired = retired_journal_name(file_name)
+    if os.path.exists(retired):
+        tmp_file = file_name + '.tmp'
+        if os.path.exists(tmp_file):
+            os.replace(tmp_file, file_name)
+        os.remove(retired)
+
+
+def load_from_json(file_name=DEFAULT_FADER_FILE, state=None):
+    state = state or fader_state
+    try:
+        recover_fader_file(file_name)
+    except OSError as e:
+        print(f"Fehler beim Wiederherstellen der Fader-Werte: {e}")
     try:
         with open(file_name, 'r') as file:
             data = json.load(file)
-        for key, value in data.items():
-            if key in fader_values:
-                if isinstance(value, dict):
-                    fader_values[key]['fader_value'] = value.get('fader_value', 0)
-                    fader_values[key]['cc_value'] = value.get('cc_value', 0)
-                else:
-                    fader_values[key]['fader_value'] = value
+        state.load_dict(data)
         debug_print(f"Fader-Werte aus {file_name} geladen.")
     except FileNotFoundError:
         debug_print(f"{file_name} nicht gefunden, verwende Standardwerte.")
     except Exception as e:
         print(f"Fehler beim Laden der Fader-Werte: {e}")
+    try:
+        replay_journal(journal_file_name(file_name), state)
+    except OSError as e:
+        print(f"Fehler beim Lesen des Fader-Journals: {e}")
+
 
+def write_fader_file(file_name, snapshot):
+    directory = os.path.dirname(file_name)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_file = file_name + '.tmp'
+    with open(tmp_file, 'w') as file:
+        json.dump(snapshot_dict(snapshot), file, indent=4)
+    # Journal vor dem Ersetzen beiseitelegen, sonst überschreiben alte Einträge nach einem Absturz neuere Werte
+    journal_file = journal_file_name(file_name)
+    retired = retired_journal_name(file_name)
+    if os.path.exists(journal_file):
+        os.replace(journal_file, retired)
+    os.replace(tmp_file, file_name)
+    if os.path.exists(retired):
+        os.remove(retired)
 
-def save_to_json(file_name='data/fader_values.json'):
+
+def save_to_json(file_name=DEFAULT_FADER_FILE, state=None):
+    state = state or fader_state
     debug_print("Speichere Fader-Werte in JSON-Datei")
     try:
-        os.makedirs(os.path.dirname(file_name), exist_ok=True)
-        with open(file_name, 'w') as file:
-            json.dump(fader_values, file, indent=4)
+        write_fader_file(file_name, state.snapshot())
         print(f"\nDaten wurden in {file_name} gespeichert.")
     except Exception as e:
         print(f"Fehler beim Speichern der Fader-Werte: {e}")
 
 
+class FaderJournal:
+    def __init__(self, state=None, file_name=DEFAULT_FADER_FILE, flush_interval=JOURNAL_FLUSH_INTERVAL,
+                 compact_size=JOURNAL_COMPACT_SIZE):
+        self.state = state or fader_state
+        self.file_name = file_name
+        self.journal_file = journal_file_name(file_name)
+        self.flush_interval = flush_interval
+        self.compact_size = compact_size
+        self.written = self.state.snapshot()
+        self.lock = threading.Lock()
+        self.changed = self.state.add_listener()
+        self.thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._stop.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        changed = self.changed
+        while True:
+            changed.wait()
+            if self._stop.wait(self.flush_interval):
+                return
+            changed.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                debug_print(f"Fehler beim Schreiben des Fader-Journals: {e}")
+
+    def flush(self):
+        with self.lock:
+            snapshot = self.state.snapshot()
+            if snapshot.version == self.written.version:
+                return
+            records = bytearray()
+            for kind, old, new in ((JOURNAL_FADER, self.written.fader, snapshot.fader),
+                                   (JOURNAL_CC, self.written.cc, snapshot.cc)):
+                for program, value in enumerate(new):
+                    if value != old[program]:
+                        records += bytes((kind, program, value))
+            if records:
+                directory = os.path.dirname(self.journal_file)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.journal_file, 'ab') as file:
+                    file.write(records)
+                    size = file.tell()
+            else:
+                size = 0
+            self.written = snapshot
+            if size >= self.compact_size:
+                self._compact(snapshot)
+
+    def _compact(self, snapshot):
+        write_fader_file(self.file_name, snapshot)
+        debug_print(f"Fader-Journal in {self.file_name} zusammengeführt")
+
+    def compact(self):
+        with self.lock:
+            snapshot = self.state.snapshot()
+            self._compact(snapshot)
+            self.written = snapshot
+
+    def close(self):
+        self._stop.set()
+        self.changed.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.state.remove_listener(self.changed)
+        debug_print("Speichere Fader-Werte in JSON-Datei")
+        try:
+            self.compact()
+            print(f"\nDaten wurden in {self.file_name} gespeichert.")
+        except Exception as e:
+            print(f"Fehler beim Speichern der Fader-Werte: {e}")
+
+
 def send_midi_cc(virtual_output, program, value):
     cc_number = program
     msg = mido.Message('control_change', control=cc_number, value=value)
@@ -52,3 +293,153 @@ def send_midi_cc(virtual_output, program, value):
 def display_fader_value(program, fader_value, cc_value):
     clear_console_line()
     print(f"Aktuelles Programm: {program} | Fader-Wert (CC {program}): {fader_value}, CC Wert: {cc_value}", end='\r')
+
+
+class RawOutput:
+    def __init__(self, port):
+        self.port = port
+        # Interna des rtmidi-Backends von mido; fehlen sie, bleibt es beim normalen send()
+        rt = getattr(port, '_rt', None)
+        lock = getattr(port, '_send_lock', None)
+        if lock is not None and callable(getattr(rt, 'send_message', None)):
+            # python-rtmidi: vorbereitete 3-Byte-Puffer direkt senden, ohne mido.Message
+            self.rt = rt
+            self.lock = lock
+            self.cc_buffers = [bytearray((CONTROL_CHANGE, control, 0)) for control in range(128)]
+            self.send_cc = self._send_cc_raw
+            self.send_bytes = self._send_bytes_raw
+        else:
+            self.send_cc = self._send_cc_mido
+            self.send_bytes = self._send_bytes_mido
+
+    def _send_cc_raw(self, control, value):
+        buffer = self.cc_buffers[control]
+        with self.lock:
+            buffer[2] = value
+            self.rt.send_message(buffer)
+
+    def _send_bytes_raw(self, data, msg=None):
+        with self.lock:
+            self.rt.send_message(data)
+
+    def _send_cc_mido(self, control, value):
+        self.port.send(mido.Message('control_change', control=control, value=value))
+
+    def _send_bytes_mido(self, data, msg=None):
+        self.port.send(msg if msg is not None else mido.Message.from_bytes(data))
+
+
+def format_message(data):
+    try:
+        return str(mido.Message.from_bytes(data))
+    except ValueError:
+        return ' '.join(f'{byte:02X}' for byte in data)
+
+
+def _ignore_event(event, *args):
+    pass
+
+
+class MidiRelay:
+    def __init__(self, input_name, output=None, on_event=None, state=None):
+        self.input_name = input_name
+        self.output = output
+        self.sender = RawOutput(output) if output is not None else None
+        self.on_event = on_event or _ignore_event
+        self.state = state or fader_state
+        self.current_program = None
+        self.inport = None
+        self.stopped = threading.Event()
+        self.compile_rules()
+
+    def start(self):
+        self.stopped.clear()
+        self.inport = mido.open_input(self.input_name, callback=self.handle)
+        # Interna des rtmidi-Backends von mido; fehlen sie, bleibt es beim normalen mido-Callback
+        rt = getattr(self.inport, '_rt', None)
+        lock = getattr(self.inport, '_callback_lock', None)
+        if lock is not None and hasattr(rt, 'cancel_callback') and hasattr(rt, 'set_callback'):
+            # python-rtmidi liefert Rohbytes; so entfällt das Parsen zu mido.Message
+            try:
+                with lock:
+                    rt.cancel_callback()
+                    rt.set_callback(self._raw_callback)
+            except Exception as e:
+                debug_print(f"Roh-Callback nicht möglich, verwende mido-Callback: {e}")
+                self.inport.callback = self.handle
+        return self
+
+    def stop(self):
+        inport, self.inport = self.inport, None
+        if inport is not None:
+            inport.close()
+        self.stopped.set()
+
+    def wait(self):
+        # Kurze Wartezeiten statt wait() ohne Timeout, damit Strg+C auch unter Windows durchkommt
+        while not self.stopped.wait(WAIT_INTERVAL):
+            pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def compile_rules(self):
+        status_rules = [None] * 256
+        channel_rules = {PROGRAM_CHANGE: self._program_change, CONTROL_CHANGE: self._control_change}
+        if self.output is not None:
+            channel_rules.update(dict.fromkeys(FORWARD_STATUS, self._forward))
+        for status, rule in channel_rules.items():
+            status_rules[status:status + 16] = [rule] * 16
+        self.status_rules = status_rules
+        if self.output is None:
+            self.control_rules = [None] * 128
+        else:
+            self.control_rules = [self._capture_cc] * 128
+        self.control_rules[FADER_CONTROL] = self._fader
+
+    def _raw_callback(self, event, data=None):
+        self.handle_bytes(event[0])
+
+    def handle(self, msg):
+        self.handle_bytes(msg.bytes(), msg)
+
+    def handle_bytes(self, data, msg=None):
+        try:
+            self.on_event('receive', data)
+            rule = self.status_rules[data[0]]
+            if rule is not None:
+                rule(data, msg)
+        except Exception as e:
+            self.on_event('error', e)
+
+    def _forward(self, data, msg):
+        self.sender.send_bytes(data, msg)
+        self.on_event('forward', data)
+
+    def _program_change(self, data, msg):
+        if data[1] < PROGRAM_COUNT:
+            self.current_program = data[1]
+            self.on_event('program', data[1])
+
+    def _control_change(self, data, msg):
+        rule = self.control_rules[data[1]]
+        program = self.current_program
+        if rule is not None and program is not None:
+            rule(program, data[2])
+
+    def _capture_cc(self, program, value):
+        self.state.set_cc(program, value)
+        self.on_event('cc', program, self.state.fader[program], value)
+        self.sender.send_cc(program, value)
+
+    def _fader(self, program, value):
+        state = self.state
+        previous = state.set_fader(program, value)
+        if self.sender is not None:
+            if previous == value:
+                return
+            self.sender.send_cc(program, value)
+        self.on_event('fader', program, value, state.cc[program])
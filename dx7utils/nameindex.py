@@ -0,0 +1,394 @@
+import bisect
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from dx7utils.common import debug_print
+
+EXACT, PREFIX, SUBSTRING, FUZZY = range(4)
+MODES = ('prefix', 'substring', 'fuzzy')
+
+NAME_INDEX_VERSION = 1
+# Suchbegriffe mit höchstens so vielen Zeichen liefern nur die besten Treffer
+SHORT_TERM_LENGTH = 2
+SHORT_TERM_LIMIT = 1000
+# Nur so viele Namen mit den meisten gemeinsamen Bigrammen gehen in die Editierdistanz
+FUZZY_CANDIDATE_LIMIT = 2000
+# Ab so vielen nachgetragenen oder entfernten Dateien wird der Index neu aufgebaut
+DELTA_REBUILD_FILES = 1000
+
+_NOT_ALNUM = re.compile(r'[^\w\n]|_')
+_ASCII_NOT_ALNUM = bytes(c for c in range(128) if not chr(c).isalnum() and c != 10)
+
+
+def normalize_name(name):
+    return _NOT_ALNUM.sub('', name.lower()).replace('\n', '')
+
+
+def normalize_names(names):
+    text = '\n'.join(names).lower()
+    if text.isascii():
+        text = text.encode('ascii').translate(None, _ASCII_NOT_ALNUM).decode('ascii')
+    else:
+        text = _NOT_ALNUM.sub('', text)
+    keys = text.split('\n')
+    if len(keys) != len(names):
+        return [normalize_name(name) for name in names]
+    return keys
+
+
+def bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def gram_code(gram):
+    return (ord(gram[0]) << 21) | ord(gram[1])
+
+
+def default_max_typos(term):
+    if len(term) <= 3:
+        return 0
+    if len(term) <= 7:
+        return 1
+    return 2
+
+
+def substring_distance(pattern, text, limit):
+    previous = [0] * (len(text) + 1)
+    for i, pc in enumerate(pattern, 1):
+        current = [i] + [0] * len(text)
+        for j, tc in enumerate(text, 1):
+            current[j] = min(previous[j - 1] + (pc != tc), previous[j] + 1, current[j - 1] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous)
+
+
+def score_name(term, key, mode='substring', max_typos=None):
+    if key.startswith(term):
+        return (EXACT if key == term else PREFIX, 0, 0)
+    if mode == 'prefix':
+        return None
+    position = key.find(term)
+    if position >= 0:
+        return (SUBSTRING, 0, position)
+    if mode == 'fuzzy':
+        if max_typos is None:
+            max_typos = default_max_typos(term)
+        if max_typos > 0:
+            distance = substring_distance(term, key, max_typos)
+            if distance <= max_typos:
+                return (FUZZY, distance, 0)
+    return None
+
+
+class _NameTable:
+    # Kleiner veränderlicher Index für Dateien, die seit dem Aufbau dazugekommen sind
+    def __init__(self):
+        self.refs = {}
+        self.sorted_names = []
+        self.grams = {}
+
+    def add(self, name, file_path, voice_number):
+        key = normalize_name(name)
+        files = self.refs.get(key)
+        if files is None:
+            files = self.refs[key] = {}
+            bisect.insort(self.sorted_names, key)
+            for gram in bigrams(key):
+                self.grams.setdefault(gram, set()).add(key)
+        files.setdefault(file_path, []).append(voice_number)
+
+    def add_file(self, file_path, names):
+        for i, name in enumerate(names, 1):
+            self.add(name, file_path, i)
+
+    def remove_file(self, file_path, names):
+        for key in {normalize_name(name) for name in names}:
+            files = self.refs.get(key)
+            if files is None:
+                continue
+            files.pop(file_path, None)
+            if not files:
+                del self.refs[key]
+                del self.sorted_names[bisect.bisect_left(self.sorted_names, key)]
+                for gram in bigrams(key):
+                    keys = self.grams[gram]
+                    keys.discard(key)
+                    if not keys:
+                        del self.grams[gram]
+
+    def prefix_matches(self, term):
+        start = bisect.bisect_left(self.sorted_names, term)
+        for key in self.sorted_names[start:]:
+            if not key.startswith(term):
+                break
+            yield key
+
+    def substring_candidates(self, term):
+        grams = bigrams(term)
+        if not grams:
+            return self.refs.keys()
+        sets = sorted((self.grams.get(gram, set()) for gram in grams), key=len)
+        return set.intersection(*sets)
+
+    def fuzzy_candidates(self, term, max_typos):
+        needed = len(term) - 1 - 2 * max_typos
+        if needed <= 0:
+            return self.refs.keys()
+        counts = Counter()
+        for gram in bigrams(term):
+            counts.update(self.grams.get(gram, ()))
+        return [key for key, count in counts.items() if count >= needed]
+
+
+class NameIndex:
+    def __init__(self, files, sizes, mtimes, counts, keys, voice_key, gram_codes, gram_offsets, gram_keys):
+        self.files = files
+        self.file_numbers = {file_path: i for i, file_path in enumerate(files)}
+        self.sizes = sizes
+        self.mtimes = mtimes
+        self.counts = counts
+        self.keys = keys
+        self.voice_key = voice_key
+        self.gram_codes = gram_codes
+        self.gram_offsets = gram_offsets
+        self.gram_keys = gram_keys
+        self.file_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.voice_file = np.repeat(np.arange(len(files), dtype=np.int32), counts)
+        self.voice_number = np.arange(len(voice_key), dtype=np.int32) - self.file_offsets[self.voice_file] + 1
+        self.key_rows = np.argsort(voice_key, kind='stable')
+        key_counts = np.bincount(voice_key, minlength=len(keys))
+        self.key_offsets = np.concatenate(([0], np.cumsum(key_counts))).astype(np.int64)
+        self.live = key_counts.astype(np.int32)
+        self.removed = np.zeros(len(files), dtype=bool)
+        self.delta = _NameTable()
+        self.delta_files = set()
+
+    def __len__(self):
+        return int(np.count_nonzero(self.live)) + sum(1 for key in self.delta.refs if self._base_id(key) < 0)
+
+    @classmethod
+    def load(cls, names_file):
+        with np.load(names_file, allow_pickle=False) as data:
+            if int(data['version']) != NAME_INDEX_VERSION:
+                raise ValueError(f"Unbekannte Namensindex-Version in {names_file}")
+            return cls(data['files'].tolist(), data['sizes'], data['mtimes'], data['counts'], data['keys'],
+                       data['voice_key'], data['gram_codes'], data['gram_offsets'], data['gram_keys'])
+
+    def save(self, names_file):
+        directory = os.path.dirname(names_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = names_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(
+                f,
+                version=np.int64(NAME_INDEX_VERSION),
+                files=np.array(self.files, dtype=str),
+                sizes=self.sizes,
+                mtimes=self.mtimes,
+                counts=self.counts,
+                keys=self.keys,
+                voice_key=self.voice_key,
+                gram_codes=self.gram_codes,
+                gram_offsets=self.gram_offsets,
+                gram_keys=self.gram_keys,
+            )
+        os.replace(tmp_file, names_file)
+        debug_print(f"Namensindex gespeichert: {names_file} ({len(self.keys)} Namen)")
+
+    def is_current(self, file_path, entry):
+        i = self.file_numbers.get(file_path)
+        return (i is not None and not self.removed[i] and file_path not in self.delta_files
+                and self.sizes[i] == entry.get('size', 0) and self.mtimes[i] == entry.get('mtime', 0))
+
+    def needs_rebuild(self):
+        return len(self.delta_files) + int(np.count_nonzero(self.removed)) > max(DELTA_REBUILD_FILES,
+                                                                                 len(self.files) // 4)
+
+    def add_file(self, file_path, names):
+        self._remove_base(file_path)
+        self.delta_files.add(file_path)
+        self.delta.add_file(file_path, names)
+
+    def remove_file(self, file_path, names):
+        if file_path in self.delta_files:
+            self.delta_files.discard(file_path)
+            self.delta.remove_file(file_path, names)
+        else:
+            self._remove_base(file_path)
+
+    def _remove_base(self, file_path):
+        i = self.file_numbers.get(file_path)
+        if i is not None and not self.removed[i]:
+            self.removed[i] = True
+            np.subtract.at(self.live, self.voice_key[self.file_offsets[i]:self.file_offsets[i + 1]], 1)
+
+    def _base_id(self, key):
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key and self.live[i]:
+            return i
+        return -1
+
+    def _live_keys(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        return self.keys[ids[self.live[ids] > 0]].tolist()
+
+    def _prefix_ids(self, term):
+        start = np.searchsorted(self.keys, term)
+        end = np.searchsorted(self.keys, term + '\U0010ffff') if term else len(self.keys)
+        return np.arange(start, end)
+
+    def _posting(self, gram):
+        i = int(np.searchsorted(self.gram_codes, gram_code(gram)))
+        if i < len(self.gram_codes) and self.gram_codes[i] == gram_code(gram):
+            return self.gram_keys[self.gram_offsets[i]:self.gram_offsets[i + 1]]
+        return self.gram_keys[:0]
+
+    def _substring_ids(self, term):
+        postings = sorted((self._posting(gram) for gram in bigrams(term)), key=len)
+        ids = postings[0]
+        for posting in postings[1:]:
+            ids = np.intersect1d(ids, posting, assume_unique=True)
+        return ids
+
+    def _fuzzy_ids(self, term, max_typos):
+        postings = [self._posting(gram) for gram in bigrams(term)]
+        counts = np.bincount(np.concatenate(postings), minlength=len(self.keys))
+        needed = max(len(term) - 1 - 2 * max_typos, 1)
+        ids = np.flatnonzero((counts >= needed) & (self.live > 0))
+        if len(ids) > FUZZY_CANDIDATE_LIMIT:
+            ids = ids[np.argsort(-counts[ids], kind='stable')[:FUZZY_CANDIDATE_LIMIT]]
+        return ids
+
+    def _short_query(self, term, mode):
+        # Ein- und Zweizeichen-Begriffe: Präfixtreffer aus der sortierten Liste, bei zwei Zeichen
+        # aufgefüllt mit Teilstring-Treffern aus dem Bigramm, höchstens SHORT_TERM_LIMIT Namen
+        prefix = self._live_keys(self._prefix_ids(term)[:SHORT_TERM_LIMIT])
+        prefix = sorted(set(prefix).union(self.delta.prefix_matches(term)))[:SHORT_TERM_LIMIT]
+        scores = [(key, score_name(term, key)) for key in prefix]
+        scores.sort(key=lambda item: (item[1], item[0]))
+        if mode == 'prefix' or len(term) < 2 or len(scores) >= SHORT_TERM_LIMIT:
+            return scores
+        candidates = set(self._live_keys(self._posting(term)))
+        candidates.update(self.delta.substring_candidates(term))
+        inner = [(key, (SUBSTRING, 0, key.find(term))) for key in candidates if not key.startswith(term)]
+        inner.sort(key=lambda item: (item[1], item[0]))
+        return scores + inner[:SHORT_TERM_LIMIT - len(scores)]
+
+    def query(self, term, mode='substring', max_typos=None):
+        if mode not in MODES:
+            raise ValueError(f"Unbekannter Suchmodus: {mode}")
+        term = normalize_name(term)
+        if not term:
+            keys = self._live_keys(np.arange(len(self.keys)))
+            if self.delta.refs:
+                keys = sorted(set(keys).union(self.delta.refs))
+            return [(key, (EXACT if not key else PREFIX, 0, 0)) for key in keys]
+        if len(term) <= SHORT_TERM_LENGTH:
+            return self._short_query(term, mode)
+        if max_typos is None:
+            max_typos = default_max_typos(term)
+        if mode == 'prefix':
+            candidates = set(self._live_keys(self._prefix_ids(term)))
+            candidates.update(self.delta.prefix_matches(term))
+        else:
+            candidates = set(self._live_keys(self._substring_ids(term)))
+            candidates.update(self.delta.substring_candidates(term))
+            if mode == 'fuzzy' and max_typos > 0:
+                candidates.update(self._live_keys(self._fuzzy_ids(term, max_typos)))
+                candidates.update(self.delta.fuzzy_candidates(term, max_typos))
+        scores = []
+        for key in candidates:
+            score = score_name(term, key, mode, max_typos)
+            if score is not None:
+                scores.append((key, score))
+        scores.sort(key=lambda item: (item[1], item[0]))
+        return scores
+
+    def _key_rows(self, keys):
+        keys = np.array(keys, dtype=str)
+        starts = np.zeros(len(keys), dtype=np.int64)
+        lengths = np.zeros(len(keys), dtype=np.int64)
+        if len(self.keys):
+            ids = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            found = self.keys[ids] == keys
+            starts[found] = self.key_offsets[ids[found]]
+            lengths[found] = self.key_offsets[ids[found] + 1] - starts[found]
+        ends = np.cumsum(lengths)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + lengths, lengths)
+        return self.key_rows[positions], ends
+
+    def matches(self, term, mode='substring', max_typos=None):
+        scores = self.query(term, mode, max_typos)
+        # Stimmen aller gefundenen Namen auf einmal einsammeln
+        rows, ends = self._key_rows([key for key, _ in scores])
+        files = self.voice_file[rows].tolist()
+        voices = self.voice_number[rows].tolist()
+        live = (~self.removed[self.voice_file[rows]]).tolist()
+        start = 0
+        for (key, score), end in zip(scores, ends.tolist()):
+            patches = [(self.files[files[j]], voices[j]) for j in range(start, end) if live[j]]
+            start = end
+            extra = self.delta.refs.get(key)
+            if extra:
+                patches += [(file_path, voice) for file_path, numbers in extra.items() for voice in numbers]
+                patches.sort()
+            for file_path, voice_number in patches:
+                yield file_path, voice_number, score
+
+
+def build_name_index(entries):
+    files = sorted(entries)
+    counts = np.array([len(entries[file_path]['names']) for file_path in files], dtype=np.int64)
+    sizes = np.array([entries[file_path].get('size', 0) for file_path in files], dtype=np.int64)
+    mtimes = np.array([entries[file_path].get('mtime', 0) for file_path in files], dtype=np.int64)
+    names = [name for file_path in files for name in entries[file_path]['names']]
+    keys, voice_key = np.unique(np.array(normalize_names(names), dtype=str), return_inverse=True)
+    voice_key = voice_key.astype(np.int32).reshape(-1)
+    if len(keys) == 0:
+        keys = np.array([], dtype='<U1')
+    # Bigramme aller Namen als (Code, Namensnummer), nach Code sortiert und ohne Doppelte
+    lengths = np.char.str_len(keys).astype(np.int64)
+    chars = np.frombuffer(''.join(keys.tolist()).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    owner = np.repeat(np.arange(len(keys), dtype=np.int32), lengths)
+    pairs = np.flatnonzero(owner[:-1] == owner[1:]) if len(owner) > 1 else np.array([], dtype=np.int64)
+    # Zeichen auf ein kleines Alphabet abbilden, damit die Bigramme als uint16 per Radix sortiert werden
+    alphabet = np.flatnonzero(np.bincount(chars)) if len(chars) else np.array([], dtype=np.int64)
+    letters = np.zeros(alphabet[-1] + 1 if len(alphabet) else 0, dtype=np.int64)
+    letters[alphabet] = np.arange(len(alphabet))
+    dense = letters[chars[pairs]] * len(alphabet) + letters[chars[pairs + 1]]
+    order = np.argsort(dense.astype(np.uint16 if len(alphabet) <= 256 else np.int64), kind='stable')
+    codes = (chars[pairs] << 21 | chars[pairs + 1])[order]
+    owners = owner[pairs][order]
+    keep = np.ones(len(codes), dtype=bool)
+    keep[1:] = (codes[1:] != codes[:-1]) | (owners[1:] != owners[:-1])
+    codes, owners = codes[keep], owners[keep]
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1]))) if len(codes) else \
+        np.array([], dtype=np.int64)
+    gram_offsets = np.concatenate((starts, [len(codes)])).astype(np.int64)
+    return NameIndex(files, sizes, mtimes, counts, keys, voice_key, codes[starts], gram_offsets, owners)
+
+
+def load_name_index(names_file, entries):
+    try:
+        names = NameIndex.load(names_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        debug_print(f"Namensindex {names_file} unlesbar, wird neu aufgebaut: {e}")
+        return None
+    # Seit dem Speichern geänderte Dateien als Nachtrag einpflegen
+    for file_path in names.files:
+        if file_path not in entries:
+            names.remove_file(file_path, ())
+    for file_path, entry in entries.items():
+        if not names.is_current(file_path, entry):
+            names.add_file(file_path, entry['names'])
+    if names.needs_rebuild():
+        return None
+    return names
@@ -0,0 +1,205 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from dx7utils.archive import split_member_path
+from dx7utils.common import debug_print
+from dx7utils.matrix import load_voice_records
+from dx7utils.sysex import HASH_SIZE, NAME_SIZE, VOICE_SIZE, vmem_dump
+
+PACK_MAGIC = b'DX7PACK\x00'
+PACK_VERSION = 1
+DEFAULT_PACK_FILE = 'data/library.dx7pack'
+
+HEADER = struct.Struct('<8sIIIIQQQQQQ')
+HEADER_SIZE = 128
+BANK_DTYPE = np.dtype([
+    ('path_offset', '<u4'), ('path_length', '<u4'),
+    ('instrument_offset', '<u4'), ('instrument_length', '<u4'),
+    ('first_voice', '<u4'), ('voice_count', '<u4'),
+    ('size', '<i8'), ('mtime', '<i8'),
+])
+
+
+def _pad_names(names, count):
+    names = list(names[:count]) + [''] * (count - len(names))
+    return b''.join(name.encode('ascii', 'ignore')[:NAME_SIZE].ljust(NAME_SIZE, b'\x00') for name in names)
+
+
+def _pad_hashes(hashes, count):
+    return hashes[:count * HASH_SIZE].ljust(count * HASH_SIZE, b'\x00')
+
+
+def write_pack(index, pack_file=DEFAULT_PACK_FILE):
+    directory = os.path.dirname(pack_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    banks, strings, names, hashes, sound_hashes = [], bytearray(), bytearray(), bytearray(), bytearray()
+    string_offsets = {}
+
+    def add_string(text):
+        if text not in string_offsets:
+            data = text.encode('utf-8')
+            string_offsets[text] = (len(strings), len(data))
+            strings.extend(data)
+        return string_offsets[text]
+
+    tmp_file = pack_file + '.tmp'
+    voice_count = 0
+    archive_cache = {}
+    with open(tmp_file, 'wb') as f:
+        f.write(b'\x00' * HEADER_SIZE)
+        for file_path in index.files():
+            entry = index.entries[file_path]
+            records = load_voice_records(file_path, archive_cache)
+            count = len(records)
+            f.write(records.tobytes())
+            banks.append(add_string(file_path) + add_string(entry['instrument']) +
+                         (voice_count, count, entry['size'], entry['mtime']))
+            names += _pad_names(entry['names'], count)
+            full, sound = index.hashes.get(file_path, (b'', b''))
+            hashes += _pad_hashes(full, count)
+            sound_hashes += _pad_hashes(sound, count)
+            voice_count += count
+
+        table = np.array(banks, dtype=BANK_DTYPE)
+        metadata = json.dumps({'directory': index.directory, 'archives': index.archives}).encode('utf-8')
+        sections = []
+        for data in (table.tobytes(), bytes(strings), bytes(names), bytes(hashes) + bytes(sound_hashes), metadata):
+            sections.append(f.tell())
+            f.write(data)
+        f.seek(0)
+        f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, len(banks), voice_count, len(metadata),
+                            HEADER_SIZE, *sections))
+    os.replace(tmp_file, pack_file)
+    debug_print(f"Bibliothek gepackt: {pack_file} ({len(banks)} Bänke, {voice_count} Stimmen)")
+    return len(banks), voice_count
+
+
+class LibraryPack:
+    def __init__(self, pack_file):
+        self.pack_file = pack_file
+        with open(pack_file, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            try:
+                (magic, version, bank_count, voice_count, metadata_size, voices_offset, banks_offset,
+                 strings_offset, names_offset, hashes_offset, metadata_offset) = HEADER.unpack_from(self._buffer)
+            except struct.error as e:
+                raise ValueError(f"{pack_file} ist unvollständig: {e}") from e
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"{pack_file} ist keine DX7-Bibliothek der Version {PACK_VERSION}")
+            # die Metadaten stehen am Ende, eine teilweise kopierte Datei ist daran zu erkennen
+            if metadata_offset + metadata_size != len(self._buffer):
+                raise ValueError(f"{pack_file} ist unvollständig ({len(self._buffer)} Bytes)")
+            self.voice_count = voice_count
+            self.banks = np.frombuffer(self._buffer, BANK_DTYPE, bank_count, banks_offset)
+            self.voices = np.frombuffer(self._buffer, np.uint8, voice_count * VOICE_SIZE, voices_offset)
+            self.voices = self.voices.reshape(-1, VOICE_SIZE)
+            self.names = np.frombuffer(self._buffer, f'S{NAME_SIZE}', voice_count, names_offset)
+            self.hashes = np.frombuffer(self._buffer, np.uint8, voice_count * 2 * HASH_SIZE, hashes_offset)
+            self._strings = (strings_offset, names_offset)
+            metadata = json.loads(self._buffer[metadata_offset:metadata_offset + metadata_size])
+            self.directory = metadata['directory']
+            self.archives = metadata['archives']
+        except ValueError:
+            self.close()
+            raise
+        except (KeyError, TypeError) as e:
+            self.close()
+            raise ValueError(f"{pack_file} hat ungültige Metadaten: {e}") from e
+        self._bank_numbers = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.voice_count
+
+    def close(self):
+        self.banks = self.voices = self.names = self.hashes = None
+        try:
+            self._buffer.close()
+        except BufferError:
+            debug_print("Bibliothek wird noch referenziert, Freigabe erfolgt später.")
+
+    def _string(self, offset, length):
+        start = self._strings[0] + int(offset)
+        return self._buffer[start:start + int(length)].decode('utf-8')
+
+    def file(self, bank):
+        record = self.banks[bank]
+        return self._string(record['path_offset'], record['path_length'])
+
+    def files(self):
+        return [self.file(i) for i in range(len(self.banks))]
+
+    def bank_number(self, file_path):
+        if self._bank_numbers is None:
+            self._bank_numbers = {file_path: i for i, file_path in enumerate(self.files())}
+        return self._bank_numbers.get(file_path)
+
+    def voice(self, voice_index):
+        return self.voices[voice_index]
+
+    def records(self, file_path, size=None, mtime=None):
+        bank = self.bank_number(file_path)
+        if bank is None:
+            return None
+        record = self.banks[bank]
+        if size is not None and (record['size'] != size or record['mtime'] != mtime):
+            return None
+        first = int(record['first_voice'])
+        return self.voices[first:first + int(record['voice_count'])]
+
+    def entries(self):
+        names = [name.decode('ascii', 'ignore') for name in self.names.tolist()]
+        entries = {}
+        for record in self.banks.tolist():
+            path_offset, path_length, instrument_offset, instrument_length, first, count, size, mtime = record
+            rows = slice(first, first + count)
+            entries[self._string(path_offset, path_length)] = {
+                'size': size,
+                'mtime': mtime,
+                'instrument': self._string(instrument_offset, instrument_length),
+                'names': names[rows],
+                'checksum_errors': 0,
+            }
+        return entries
+
+    def voice_hashes(self):
+        data = self.hashes.tobytes()
+        sound = self.voice_count * HASH_SIZE
+        hashes = {}
+        for bank, record in enumerate(self.banks.tolist()):
+            start, end = record[4] * HASH_SIZE, (record[4] + record[5]) * HASH_SIZE
+            hashes[self.file(bank)] = (data[start:end], data[sound + start:sound + end])
+        return hashes
+
+
+def extract_pack(pack_file, target_directory):
+    written = 0
+    root = os.path.abspath(target_directory)
+    with LibraryPack(pack_file) as pack:
+        for bank in range(len(pack.banks)):
+            file_path = pack.file(bank)
+            archive_path, member = split_member_path(file_path)
+            relative = os.path.relpath(archive_path, pack.directory)
+            if member is not None:
+                relative = os.path.join(relative, *member.split('/'))
+            # Pfade, die aus dem Zielordner herausführen (auch über '..' im Archivmember), werden flach abgelegt
+            target = os.path.normpath(os.path.join(root, relative))
+            if os.path.commonpath([root, target]) != root or target == root:
+                target = os.path.join(root, os.path.basename(target) or 'bank.syx')
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(vmem_dump(pack.records(file_path)))
+            written += 1
+    debug_print(f"{written} Bänke nach {target_directory} entpackt")
+    return written
@@ -0,0 +1,59 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from dx7utils.archive import is_archive
+from dx7utils.common import iter_sysex_files
+from dx7utils.sysex import extract_archive_info, extract_bank_info
+
+
+def default_workers():
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def _parse_file(file_path):
+    if is_archive(file_path):
+        return file_path, extract_archive_info(file_path)
+    return file_path, extract_bank_info(file_path)
+
+
+def iter_banks(results):
+    for file_path, info in results:
+        if 'members' in info:
+            yield from info['members'].items()
+        else:
+            yield file_path, info
+
+
+def parse_files(files, workers=None, processes=False):
+    workers = workers or default_workers()
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    executor = executor_class(max_workers=workers)
+    pending = set()
+    try:
+        for file_path in files:
+            pending.add(executor.submit(_parse_file, file_path))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def scan_library(directory, workers=None, processes=False):
+    for file_path, info in iter_banks(parse_files(iter_sysex_files(directory, archives=True), workers, processes)):
+        for i, name in enumerate(info['names'], 1):
+            yield file_path, i, name, info['instrument']
+
+
+def scan_search(directory, search_term, workers=None, processes=False):
+    term = search_term.lower()
+    for patch in scan_library(directory, workers, processes):
+        if term in patch[2].lower():
+            yield patch
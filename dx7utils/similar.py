@@ -0,0 +1,93 @@
+import numpy as np
+
+from dx7utils.matrix import PARAMETER_MAXIMA, PARAMETER_OFFSETS
+
+SOUND_PARAMETERS = 145
+ALGORITHMS = 32
+ALGORITHM_WEIGHT = 6.0
+CHUNK_ROWS = 65536
+
+
+def default_weights():
+    weights = np.ones(SOUND_PARAMETERS, dtype=np.float32)
+    for op in range(1, 7):
+        weights[PARAMETER_OFFSETS[f'op{op}_output_level']] = 3.0
+        weights[PARAMETER_OFFSETS[f'op{op}_freq_coarse']] = 2.0
+        weights[PARAMETER_OFFSETS[f'op{op}_freq_fine']] = 0.5
+        weights[PARAMETER_OFFSETS[f'op{op}_detune']] = 0.5
+    weights[PARAMETER_OFFSETS['algorithm']] = 0.0
+    weights[PARAMETER_OFFSETS['feedback']] = 2.0
+    weights[PARAMETER_OFFSETS['transpose']] = 0.5
+    return weights
+
+
+def encode_features(params):
+    params = np.asarray(params, dtype=np.uint8)
+    if params.ndim == 1:
+        params = params.reshape(1, -1)
+    scale = 255.0 / PARAMETER_MAXIMA[:SOUND_PARAMETERS].astype(np.float32)
+    features = np.zeros((len(params), SOUND_PARAMETERS + ALGORITHMS), dtype=np.uint8)
+    for start in range(0, len(params), CHUNK_ROWS):
+        block = params[start:start + CHUNK_ROWS]
+        scaled = block[:, :SOUND_PARAMETERS] * scale
+        np.clip(scaled, 0, 255, out=scaled)
+        features[start:start + CHUNK_ROWS, :SOUND_PARAMETERS] = np.rint(scaled)
+        algorithms = np.minimum(block[:, PARAMETER_OFFSETS['algorithm']], ALGORITHMS - 1)
+        features[np.arange(start, start + len(block)), SOUND_PARAMETERS + algorithms] = 255
+    return features
+
+
+class SimilarityIndex:
+    def __init__(self, params, weights=None, algorithm_weight=ALGORITHM_WEIGHT):
+        if weights is None:
+            weights = default_weights()
+        self.features = encode_features(params)
+        self.weights = np.concatenate(
+            (weights, np.full(ALGORITHMS, algorithm_weight / 2, dtype=np.float32))
+        ).astype(np.float32) / 255.0
+
+    def __len__(self):
+        return len(self.features)
+
+    def distances(self, query):
+        query = np.asarray(query, dtype=np.float32)
+        result = np.empty(len(self.features), dtype=np.float32)
+        for start in range(0, len(self.features), CHUNK_ROWS):
+            block = self.features[start:start + CHUNK_ROWS].astype(np.float32)
+            block -= query
+            np.abs(block, out=block)
+            result[start:start + len(block)] = block @ self.weights
+        return result
+
+    def iter_nearest(self, query, exclude=None, batch=32):
+        distances = self.distances(query)
+        if exclude is not None:
+            distances[exclude] = np.inf
+        order = np.arange(len(distances))
+        while len(order):
+            k = min(batch, len(order))
+            part = np.argpartition(distances[order], k - 1)
+            head = order[part[:k]]
+            head = head[np.argsort(distances[head], kind='stable')]
+            for row in head:
+                if not np.isfinite(distances[row]):
+                    return
+                yield int(row), float(distances[row])
+            order = order[part[k:]]
+            batch *= 4
+
+    def nearest(self, query, k=10, exclude=None):
+        results = []
+        if k <= 0:
+            return results
+        for result in self.iter_nearest(query, exclude, k):
+            results.append(result)
+            if len(results) == k:
+                break
+        return results
+
+    def nearest_to_row(self, row, k=10):
+        return self.nearest(self.features[row], k, exclude=row)
+
+    def nearest_to_params(self, params, k=10):
+        return self.nearest(encode_features(params)[0], k)
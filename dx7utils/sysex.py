@@ -1,35 +1,333 @@
+import bisect
+import hashlib
+import mmap
 import os
 
+from dx7utils.archive import iter_archive_members, member_path, read_member, split_member_path
 from dx7utils.common import debug_print, identify_instrument
+from dx7utils.framer import FORMAT_VCED, FORMAT_VMEM, checksum, iter_frames
+
+HEADER_SIZE = 6
+VOICE_SIZE = 128
+VCED_SIZE = 155
+NAME_OFFSET = 118
+NAME_SIZE = 10
+HASH_SIZE = 8
+
+OPERATOR_PARAMETERS = [
+    'eg_rate_1', 'eg_rate_2', 'eg_rate_3', 'eg_rate_4',
+    'eg_level_1', 'eg_level_2', 'eg_level_3', 'eg_level_4',
+    'break_point', 'left_depth', 'right_depth', 'left_curve', 'right_curve',
+    'rate_scaling', 'amp_mod_sens', 'velocity_sens', 'output_level',
+    'osc_mode', 'freq_coarse', 'freq_fine', 'detune',
+]
+
+VOICE_PARAMETERS = [
+    'pitch_eg_rate_1', 'pitch_eg_rate_2', 'pitch_eg_rate_3', 'pitch_eg_rate_4',
+    'pitch_eg_level_1', 'pitch_eg_level_2', 'pitch_eg_level_3', 'pitch_eg_level_4',
+    'algorithm', 'feedback', 'osc_key_sync',
+    'lfo_speed', 'lfo_delay', 'lfo_pitch_mod_depth', 'lfo_amp_mod_depth',
+    'lfo_key_sync', 'lfo_waveform', 'pitch_mod_sens', 'transpose',
+]
+
+
+def _parameter_offsets():
+    offsets = {}
+    for op in range(6):
+        for i, name in enumerate(OPERATOR_PARAMETERS):
+            offsets[f'op{6 - op}_{name}'] = op * 21 + i
+    for i, name in enumerate(VOICE_PARAMETERS):
+        offsets[name] = 126 + i
+    offsets['name'] = 145
+    return offsets
+
+
+PARAMETER_OFFSETS = _parameter_offsets()
 
 
 def format_name(name):
     return ''.join(c for c in name.decode('ascii', 'ignore') if c.isalnum())
 
 
-def extract_patch_names(file_path):
-    patch_names = []
-    instrument_type = "Unknown"
-    try:
+def voice_count(instrument_type):
+    if instrument_type in ["Yamaha DX1 or DX5", "Yamaha DX7IIFD"]:
+        return 64
+    elif instrument_type == "Yamaha TX816":
+        return 256
+    else:
+        return 32
+
+
+def unpack_voice(record, params=None, offset=0):
+    if len(record) < VOICE_SIZE:
+        record = bytes(record).ljust(VOICE_SIZE, b'\x00')
+    if params is None:
+        params = bytearray(VCED_SIZE)
+    for op in range(6):
+        src = op * 17
+        dst = offset + op * 21
+        params[dst:dst + 11] = record[src:src + 11]
+        params[dst + 11] = record[src + 11] & 0x03
+        params[dst + 12] = (record[src + 11] >> 2) & 0x03
+        params[dst + 13] = record[src + 12] & 0x07
+        params[dst + 14] = record[src + 13] & 0x03
+        params[dst + 15] = (record[src + 13] >> 2) & 0x07
+        params[dst + 16] = record[src + 14]
+        params[dst + 17] = record[src + 15] & 0x01
+        params[dst + 18] = (record[src + 15] >> 1) & 0x1F
+        params[dst + 19] = record[src + 16]
+        params[dst + 20] = (record[src + 12] >> 3) & 0x0F
+    params[offset + 126:offset + 134] = record[102:110]
+    params[offset + 134] = record[110] & 0x1F
+    params[offset + 135] = record[111] & 0x07
+    params[offset + 136] = (record[111] >> 3) & 0x01
+    params[offset + 137:offset + 141] = record[112:116]
+    params[offset + 141] = record[116] & 0x01
+    params[offset + 142] = (record[116] >> 1) & 0x07
+    params[offset + 143] = (record[116] >> 4) & 0x07
+    params[offset + 144] = record[117]
+    params[offset + 145:offset + 155] = record[NAME_OFFSET:NAME_OFFSET + NAME_SIZE]
+    return params
+
+
+def pack_voice(params, record=None):
+    if len(params) < VCED_SIZE:
+        params = bytes(params).ljust(VCED_SIZE, b'\x00')
+    if record is None:
+        record = bytearray(VOICE_SIZE)
+    for op in range(6):
+        src = op * 21
+        dst = op * 17
+        record[dst:dst + 11] = params[src:src + 11]
+        record[dst + 11] = (params[src + 11] & 0x03) | ((params[src + 12] & 0x03) << 2)
+        record[dst + 12] = (params[src + 13] & 0x07) | ((params[src + 20] & 0x0F) << 3)
+        record[dst + 13] = (params[src + 14] & 0x03) | ((params[src + 15] & 0x07) << 2)
+        record[dst + 14] = params[src + 16]
+        record[dst + 15] = (params[src + 17] & 0x01) | ((params[src + 18] & 0x1F) << 1)
+        record[dst + 16] = params[src + 19]
+    record[102:110] = params[126:134]
+    record[110] = params[134] & 0x1F
+    record[111] = (params[135] & 0x07) | ((params[136] & 0x01) << 3)
+    record[112:116] = params[137:141]
+    record[116] = (params[141] & 0x01) | ((params[142] & 0x07) << 1) | ((params[143] & 0x07) << 4)
+    record[117] = params[144]
+    record[NAME_OFFSET:NAME_OFFSET + NAME_SIZE] = params[145:155]
+    return record
+
+
+def vmem_dump(records, channel=0):
+    records = bytes(records)
+    dump = bytearray()
+    bank_size = 32 * VOICE_SIZE
+    for start in range(0, max(len(records), 1), bank_size):
+        payload = records[start:start + bank_size].ljust(bank_size, b'\x00')
+        dump += bytes([0xF0, 0x43, channel & 0x0F, FORMAT_VMEM, 0x20, 0x00])
+        dump += payload
+        dump += bytes([checksum(payload), 0xF7])
+    return bytes(dump)
+
+
+def frame_segments(data):
+    segments = []
+    checksum_errors = 0
+    for frame in iter_frames(data):
+        if frame.format == FORMAT_VMEM and frame.length >= VOICE_SIZE:
+            segments.append((frame.data_offset, frame.length // VOICE_SIZE))
+        elif frame.format == FORMAT_VCED and frame.length == VCED_SIZE:
+            segments.append(bytes(pack_voice(data[frame.data_offset:frame.data_offset + VCED_SIZE])))
+        else:
+            continue
+        if not frame.checksum_ok:
+            checksum_errors += 1
+    return segments, checksum_errors
+
+
+class Voice:
+    __slots__ = ('_buffer', '_offset', '_params')
+
+    def __init__(self, buffer, offset=0):
+        self._buffer = buffer
+        self._offset = offset
+        self._params = None
+
+    def __getattr__(self, name):
+        offset = PARAMETER_OFFSETS.get(name)
+        if offset is None:
+            raise AttributeError(f"{type(self).__name__} hat kein Attribut '{name}'")
+        return self.params[offset]
+
+    @property
+    def record(self):
+        return self._buffer[self._offset:self._offset + VOICE_SIZE]
+
+    @property
+    def params(self):
+        if self._params is None:
+            self._params = unpack_voice(self.record)
+        return self._params
+
+    @property
+    def name(self):
+        start = self._offset + NAME_OFFSET
+        return bytes(self._buffer[start:start + NAME_SIZE]).decode('ascii', 'replace').rstrip()
+
+    def operator(self, number):
+        start = (6 - number) * 21
+        return dict(zip(OPERATOR_PARAMETERS, self.params[start:start + 21]))
+
+    def envelope(self, number=None):
+        start = 126 if number is None else (6 - number) * 21
+        return tuple(self.params[start:start + 4]), tuple(self.params[start + 4:start + 8])
+
+    def lfo(self):
+        return {name[4:]: self.params[PARAMETER_OFFSETS[name]] for name in VOICE_PARAMETERS if name.startswith('lfo_')}
+
+
+class VoiceBank:
+    def __init__(self, data, instrument_type="Unknown", num_voices=32, offset=HEADER_SIZE, segments=None,
+                 checksum_errors=0):
+        self.instrument_type = instrument_type
+        self.checksum_errors = checksum_errors
+        self._buffer = data
+        if segments is None:
+            segments = [(offset, num_voices)]
+        view = memoryview(data)
+        self.segments = []
+        self.counts = []
+        self._starts = []
+        self.num_voices = 0
+        for segment in segments:
+            if isinstance(segment, tuple):
+                start, count = segment
+                self.segments.append(view[start:start + count * VOICE_SIZE])
+            else:
+                count = len(segment) // VOICE_SIZE
+                self.segments.append(memoryview(segment))
+            self.counts.append(count)
+            self._starts.append(self.num_voices)
+            self.num_voices += count
+        view.release()
+        self._params = None
+
+    @classmethod
+    def from_file(cls, file_path):
+        archive_path, member = split_member_path(file_path)
+        if member is not None:
+            data = read_member(archive_path, member)
+            return cls.from_buffer(data, identify_instrument(len(data)))
         file_size = os.path.getsize(file_path)
         instrument_type = identify_instrument(file_size)
-
+        if file_size == 0:
+            return cls(b'', instrument_type, voice_count(instrument_type))
         with open(file_path, 'rb') as f:
-            f.read(6)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(data, instrument_type)
 
-            if instrument_type in ["Yamaha DX1 or DX5", "Yamaha DX7IIFD"]:
-                num_voices = 64
-            elif instrument_type == "Yamaha TX816":
-                num_voices = 256
-            else:
-                num_voices = 32
-
-            for voice_number in range(num_voices):
-                f.read(6 * 17)
-                f.read(16)
-                name_data = f.read(10)
-                patch_name = format_name(name_data)
-                patch_names.append(patch_name.strip())
+    @classmethod
+    def from_buffer(cls, data, instrument_type="Unknown"):
+        segments, checksum_errors = frame_segments(data)
+        if not segments:
+            return cls(data, instrument_type, voice_count(instrument_type))
+        if checksum_errors:
+            debug_print(f"{checksum_errors} SysEx-Blöcke mit fehlerhafter Prüfsumme")
+        if instrument_type == "Unknown":
+            instrument_type = "Yamaha DX7"
+        return cls(data, instrument_type, segments=segments, checksum_errors=checksum_errors)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.num_voices
+
+    def close(self):
+        for segment in self.segments:
+            segment.release()
+        if isinstance(self._buffer, mmap.mmap):
+            try:
+                self._buffer.close()
+            except BufferError:
+                debug_print("Bank-Puffer wird noch referenziert, Freigabe erfolgt später.")
+
+    def voice(self, voice_number):
+        segment = bisect.bisect_right(self._starts, voice_number) - 1
+        start = (voice_number - self._starts[segment]) * VOICE_SIZE
+        return self.segments[segment][start:start + VOICE_SIZE]
+
+    def voices(self):
+        for segment, count in zip(self.segments, self.counts):
+            for start in range(0, count * VOICE_SIZE, VOICE_SIZE):
+                yield Voice(segment, start)
+
+    def names(self):
+        names = []
+        for segment, count in zip(self.segments, self.counts):
+            for start in range(0, count * VOICE_SIZE, VOICE_SIZE):
+                names.append(bytes(segment[start + NAME_OFFSET:start + NAME_OFFSET + NAME_SIZE]))
+        return names
+
+    def unpack(self):
+        if self._params is None:
+            from dx7utils.matrix import bank_records, unpack_voices
+
+            self._params = unpack_voices(bank_records(self))
+        return self._params
+
+    def params(self, voice_number):
+        return memoryview(self.unpack()[voice_number])
+
+
+def voice_digest(record, include_name=True):
+    data = bytes(record) if include_name else bytes(record[:NAME_OFFSET])
+    return hashlib.blake2b(data, digest_size=HASH_SIZE).digest()
+
+
+def voice_hash(record, include_name=True):
+    return voice_digest(record, include_name).hex()
+
+
+def _bank_info(bank):
+    return {
+        'instrument': bank.instrument_type,
+        'names': [format_name(name).strip() for name in bank.names()],
+        'hashes': b''.join(voice_digest(bank.voice(i)) for i in range(len(bank))),
+        'sound_hashes': b''.join(voice_digest(bank.voice(i), include_name=False) for i in range(len(bank))),
+        'checksum_errors': bank.checksum_errors,
+        'params': bank.unpack(),
+    }
+
+
+def extract_bank_info(file_path):
+    info = {'instrument': "Unknown", 'names': [], 'hashes': b'', 'sound_hashes': b'', 'checksum_errors': 0}
+    try:
+        with VoiceBank.from_file(file_path) as bank:
+            info = _bank_info(bank)
+    except Exception as e:
+        debug_print(f"Fehler beim Lesen der Datei {file_path}: {e}")
+    return info
+
+
+def extract_archive_info(archive_path):
+    members = {}
+    try:
+        for member, data in iter_archive_members(archive_path):
+            with VoiceBank.from_buffer(data, identify_instrument(len(data))) as bank:
+                members[member_path(archive_path, member)] = _bank_info(bank)
+    except Exception as e:
+        debug_print(f"Fehler beim Lesen des Archivs {archive_path}: {e}")
+    return {'members': members}
+
+
+def extract_patch_names(file_path):
+    patch_names = []
+    instrument_type = "Unknown"
+    try:
+        with VoiceBank.from_file(file_path) as bank:
+            instrument_type = bank.instrument_type
+            patch_names = [format_name(name).strip() for name in bank.names()]
 
         debug_print(f"Extrahierte Patch-Namen aus {file_path}: {patch_names}")
     except Exception as e:
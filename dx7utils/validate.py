@@ -0,0 +1,158 @@
+import os
+import shutil
+
+import numpy as np
+
+from dx7utils.archive import iter_archive_members, member_path, read_sysex_bytes, split_member_path
+from dx7utils.common import debug_print
+from dx7utils.framer import FORMAT_VCED, FORMAT_VMEM, iter_frames
+from dx7utils.matrix import PARAMETER_MAXIMA, PARAMETER_OFFSETS, bank_records, unpack_voices
+from dx7utils.sysex import NAME_SIZE, VoiceBank
+
+DEFAULT_REPORT_FILE = 'data/validation_report.txt'
+DEFAULT_QUARANTINE_DIRECTORY = 'data/quarantine'
+
+PARAMETER_NAMES = sorted(PARAMETER_OFFSETS, key=PARAMETER_OFFSETS.get)[:-1] + [
+    f'name[{i + 1}]' for i in range(NAME_SIZE)
+]
+
+
+class InvalidSysexError(ValueError):
+    pass
+
+
+def voice_frames(data):
+    return [frame for frame in iter_frames(data) if frame.format in (FORMAT_VMEM, FORMAT_VCED)]
+
+
+def frame_issues(data, frames=None):
+    if frames is None:
+        frames = voice_frames(data)
+    if not frames:
+        return []
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    sums = np.concatenate(([0], np.cumsum(buffer, dtype=np.int64)))
+    starts = np.array([frame.data_offset for frame in frames], dtype=np.int64)
+    ends = starts + np.array([frame.byte_count for frame in frames], dtype=np.int64)
+    # Blöcke, deren Prüfsummenbyte hinter dem Block oder dem Puffer läge, sind abgeschnitten
+    complete = (ends < np.array([frame.end for frame in frames], dtype=np.int64)) & (ends < len(buffer))
+    ends = np.where(complete, ends, starts)
+    expected = -(sums[ends] - sums[starts]) & 0x7F
+    found = np.zeros(len(frames), dtype=np.uint8)
+    found[complete] = buffer[ends[complete]]
+    issues = []
+    for i in np.flatnonzero(~complete | (expected != found)):
+        frame = frames[i]
+        if not complete[i]:
+            issues.append(f"Block {i + 1} bei Byte {frame.start}: abgeschnitten "
+                          f"({frame.length} von {frame.byte_count} Bytes)")
+        else:
+            issues.append(f"Block {i + 1} bei Byte {frame.start}: Prüfsumme {found[i]:02X}, "
+                          f"erwartet {expected[i]:02X}")
+    return issues
+
+
+def parameter_issues(params):
+    invalid = params > PARAMETER_MAXIMA
+    issues = {}
+    for row in np.flatnonzero(invalid.any(axis=1)):
+        columns = np.flatnonzero(invalid[row])
+        issues[int(row)] = ', '.join(
+            f"{PARAMETER_NAMES[column]}={params[row, column]} (max. {PARAMETER_MAXIMA[column]})"
+            for column in columns
+        )
+    return issues
+
+
+def check_data(data):
+    frames = voice_frames(data)
+    if not frames:
+        return []
+    issues = frame_issues(data, frames)
+    with VoiceBank.from_buffer(data) as bank:
+        params = unpack_voices(bank_records(bank))
+    for row, text in parameter_issues(params).items():
+        issues.append(f"Voice {row + 1}: {text}")
+    return issues
+
+
+def iter_library_data(index):
+    archives = {}
+    for file_path in index.files():
+        archive_path, member = split_member_path(file_path)
+        if member is not None:
+            archives.setdefault(archive_path, set()).add(file_path)
+            continue
+        try:
+            yield file_path, read_sysex_bytes(file_path), None
+        except OSError as e:
+            yield file_path, None, e
+    for archive_path, paths in archives.items():
+        try:
+            for member, data in iter_archive_members(archive_path):
+                file_path = member_path(archive_path, member)
+                if file_path in paths:
+                    yield file_path, data, None
+        except Exception as e:
+            for file_path in paths:
+                yield file_path, None, e
+
+
+def validate_library(index):
+    report = {}
+    framed = set()
+    for file_path, data, error in iter_library_data(index):
+        if error is not None:
+            report[file_path] = [f"nicht lesbar: {error}"]
+            continue
+        frames = voice_frames(data)
+        if not frames:
+            continue
+        framed.add(file_path)
+        issues = frame_issues(data, frames)
+        if issues:
+            report[file_path] = issues
+
+    matrix = index.voice_matrix()
+    for row, text in parameter_issues(matrix.params).items():
+        file_path, voice_number = matrix.locate(row)
+        if file_path in framed:
+            report.setdefault(file_path, []).append(f"Voice {voice_number}: {text}")
+
+    debug_print(f"Bibliothek geprüft: {len(report)} von {len(index.entries)} Dateien fehlerhaft")
+    return {file_path: report[file_path] for file_path in sorted(report)}
+
+
+def write_report(report, report_file, checked):
+    directory = os.path.dirname(report_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write(f"DX7-Bibliotheksprüfung: {len(report)} von {checked} Dateien fehlerhaft\n")
+        for file_path, issues in report.items():
+            f.write(f"\n{file_path}\n")
+            for issue in issues:
+                f.write(f"  {issue}\n")
+
+
+def _free_path(path):
+    candidate = path
+    number = 1
+    while os.path.exists(candidate):
+        candidate = f"{path}.{number}"
+        number += 1
+    return candidate
+
+
+def quarantine(report, directory, target=DEFAULT_QUARANTINE_DIRECTORY):
+    moved = []
+    for file_path in report:
+        source = split_member_path(file_path)[0]
+        if source in moved or not os.path.exists(source):
+            continue
+        destination = _free_path(os.path.join(target, os.path.relpath(source, directory)))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.move(source, destination)
+        debug_print(f"In Quarantäne verschoben: {source} -> {destination}")
+        moved.append(source)
+    return moved
@@ -0,0 +1,177 @@
+import tkinter as tk
+from tkinter import ttk
+
+DEFAULT_ROW_HEIGHT = 20
+
+
+def _sort_key(value):
+    if isinstance(value, str):
+        return (1, value.lower())
+    return (0, value)
+
+
+class VirtualListModel:
+    def __init__(self, rows=None):
+        self.rows = list(rows) if rows else []
+        self.sort_column = None
+        self.sort_reverse = False
+
+    def __len__(self):
+        return len(self.rows)
+
+    def clear(self):
+        self.rows = []
+        self.sort_column = None
+        self.sort_reverse = False
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+
+    def row(self, index):
+        return self.rows[index]
+
+    def slice(self, start, count):
+        return self.rows[start:start + count]
+
+    def sort(self, column, reverse=None):
+        if reverse is None:
+            reverse = self.sort_column == column and not self.sort_reverse
+        self.rows.sort(key=lambda row: _sort_key(row[column]), reverse=reverse)
+        self.sort_column = column
+        self.sort_reverse = reverse
+
+    def order_by(self, keys, key_function):
+        rank = {key: i for i, key in enumerate(keys)}
+        last = len(rank)
+        self.rows.sort(key=lambda row: rank.get(key_function(row), last))
+
+
+class VirtualTreeview(ttk.Frame):
+    def __init__(self, master, columns, headings, widths, anchors=None):
+        super().__init__(master)
+        self.columns = columns
+        self.model = VirtualListModel()
+        self.offset = 0
+        self.visible_rows = 1
+        self.selected = None
+        self.items = []
+        self.row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or DEFAULT_ROW_HEIGHT)
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', selectmode='browse')
+        for i, column in enumerate(columns):
+            self.tree.heading(column, text=headings[i], command=lambda c=i: self.sort_by(c))
+            anchor = anchors.get(column, 'w') if anchors else 'w'
+            self.tree.column(column, width=widths[i], anchor=anchor)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky=tk.NSEW)
+        self.scrollbar.grid(row=0, column=1, sticky=tk.NS)
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3))
+        self.tree.bind('<Up>', lambda event: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda event: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda event: self._move_selection(-self.visible_rows))
+        self.tree.bind('<Next>', lambda event: self._move_selection(self.visible_rows))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+
+    def bind_rows(self, sequence, handler):
+        self.tree.bind(sequence, handler)
+
+    def clear(self):
+        self.model.clear()
+        self.offset = 0
+        self.selected = None
+        self.refresh()
+
+    def extend(self, rows):
+        self.model.extend(rows)
+        self.refresh()
+
+    def sort_by(self, column):
+        self.model.sort(column)
+        self.selected = None
+        self.refresh()
+
+    def scroll(self, delta):
+        self.offset = max(0, min(self.offset + delta, len(self.model) - self.visible_rows))
+        self.refresh()
+        return 'break'
+
+    def refresh(self):
+        rows = self.model.slice(self.offset, self.visible_rows)
+        while len(self.items) < len(rows):
+            self.items.append(self.tree.insert('', 'end'))
+        while len(self.items) > len(rows):
+            self.tree.delete(self.items.pop())
+        for item, row in zip(self.items, rows):
+            self.tree.item(item, values=row[:len(self.columns)])
+        selected_item = None
+        if self.selected is not None and self.offset <= self.selected < self.offset + len(rows):
+            selected_item = self.items[self.selected - self.offset]
+        if selected_item is not None:
+            self.tree.selection_set(selected_item)
+        elif self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+        self._update_scrollbar()
+
+    def row_at(self, y):
+        item = self.tree.identify_row(y)
+        if not item:
+            return None
+        return self.offset + self.items.index(item)
+
+    def select(self, index):
+        self.selected = index
+        self.refresh()
+
+    def selected_row(self):
+        if self.selected is None or self.selected >= len(self.model):
+            return None
+        return self.model.row(self.selected)
+
+    def _update_scrollbar(self):
+        total = len(self.model)
+        if total <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + self.visible_rows) / total)
+
+    def _on_configure(self, event):
+        visible_rows = max(1, event.height // self.row_height - 1)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.offset = max(0, min(self.offset, len(self.model) - visible_rows))
+            self.refresh()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self.offset = int(float(value) * len(self.model))
+            self.scroll(0)
+        elif unit == 'pages':
+            self.scroll(int(value) * self.visible_rows)
+        else:
+            self.scroll(int(value))
+
+    def _on_mousewheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0] in self.items:
+            self.selected = self.offset + self.items.index(selection[0])
+
+    def _move_selection(self, delta):
+        if not len(self.model):
+            return 'break'
+        index = 0 if self.selected is None else max(0, min(self.selected + delta, len(self.model) - 1))
+        self.selected = index
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.visible_rows:
+            self.offset = index - self.visible_rows + 1
+        self.refresh()
+        return 'break'
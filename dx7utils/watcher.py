@@ -0,0 +1,331 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from dx7utils.archive import is_archive
+from dx7utils.common import debug_print, iter_sysex_entries
+
+POLL_INTERVAL = 2.0
+SETTLE_DELAY = 0.3
+# Jede so vielte Abfrage prüft alle Dateien, auch in Verzeichnissen mit unveränderter mtime
+FULL_SCAN_POLLS = 30
+# Verzeichnisse, deren mtime jünger ist, werden immer neu gelesen (grobe Zeitstempel)
+RECENT_WINDOW_NS = 2 * 10 ** 9
+REFRESH_BATCH_SIZE = 200
+RESTART_DELAY = 5.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT = struct.Struct('iIII')
+
+
+def is_library_file(path):
+    return path.endswith('.syx') or is_archive(path)
+
+
+def snapshot_directory(directory):
+    snapshot = {}
+    for entry in iter_sysex_entries(directory, archives=True):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+    return snapshot
+
+
+class PollingBackend:
+    def __init__(self, directory, full_scan_polls=FULL_SCAN_POLLS):
+        self.directory = directory
+        self.full_scan_polls = full_scan_polls
+        self.polls = 0
+        self.directories = {}
+        self.files = {}
+        self.subdirs = {}
+        self._closed = threading.Event()
+        self.poll(full=True)
+
+    def _scan_directory(self, path):
+        files, subdirs = {}, []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif is_library_file(entry.name) and entry.is_file():
+                            st = entry.stat()
+                            files[entry.path] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            debug_print(f"Verzeichnis nicht lesbar: {path}: {e}")
+        return files, subdirs
+
+    def poll(self, full=False):
+        self.polls += 1
+        full = full or self.polls % self.full_scan_polls == 0
+        recent = time.time_ns() - RECENT_WINDOW_NS
+        changed = set()
+        directories = {}
+        pending = [self.directory]
+        while pending:
+            path = pending.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            directories[path] = mtime
+            # Unveränderte Verzeichnisse nicht auflisten, nur ihre Unterverzeichnisse prüfen
+            if not full and self.directories.get(path) == mtime and mtime < recent:
+                pending.extend(self.subdirs[path])
+                continue
+            files, subdirs = self._scan_directory(path)
+            old = self.files.get(path, {})
+            changed.update(file_path for file_path, stat in files.items() if old.get(file_path) != stat)
+            changed.update(file_path for file_path in old if file_path not in files)
+            self.files[path] = files
+            self.subdirs[path] = subdirs
+            pending.extend(subdirs)
+        for path in self.directories.keys() - directories.keys():
+            changed.update(self.files.pop(path, ()))
+            self.subdirs.pop(path, None)
+        self.directories = directories
+        return changed
+
+    def wait(self, timeout):
+        if self._closed.wait(timeout):
+            return set()
+        return self.poll()
+
+    def wake(self):
+        self._closed.set()
+
+    def close(self):
+        self._closed.set()
+
+
+class InotifyBackend:
+    def __init__(self, directory):
+        self.directory = directory
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fehlgeschlagen")
+        self.watches = {}
+        # Weckpipe: ein select auf einem von einem anderen Thread geschlossenen fd wacht nicht zuverlässig auf
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_write, False)
+        self._close_lock = threading.Lock()
+        try:
+            self._watch_tree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, directory):
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch fehlgeschlagen: {path}")
+            self.watches[wd] = path
+            try:
+                with os.scandir(path) as entries:
+                    pending.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError as e:
+                debug_print(f"Verzeichnis nicht lesbar: {path}: {e}")
+
+    def _forget_tree(self, directory):
+        prefix = directory + os.sep
+        for wd, path in list(self.watches.items()):
+            if path == directory or path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def _read_events(self):
+        data = b''
+        while True:
+            try:
+                chunk = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return data
+            if not chunk:
+                return data
+            data += chunk
+
+    def wait(self, timeout):
+        if self.fd < 0:
+            return set()
+        try:
+            ready, _, _ = select.select([self.fd, self._wake_read], [], [], timeout)
+        except (OSError, ValueError):
+            return set()
+        if self.fd not in ready:
+            return set()
+        data = self._read_events()
+        changed = set()
+        offset = 0
+        while offset + EVENT.size <= len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b'\x00'))
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(self.directory)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            parent = self.watches.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._watch_tree(path)
+                    except OSError as e:
+                        debug_print(f"Verzeichnis kann nicht überwacht werden: {e}")
+                    changed.add(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget_tree(path)
+                    changed.add(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE) and is_library_file(path):
+                changed.add(path)
+        return changed
+
+    def wake(self):
+        with self._close_lock:
+            if self.fd < 0:
+                return
+            try:
+                os.write(self._wake_write, b'\x00')
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        with self._close_lock:
+            if self.fd >= 0:
+                for fd in (self.fd, self._wake_read, self._wake_write):
+                    os.close(fd)
+                self.fd = -1
+
+
+def create_backend(directory):
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyBackend(directory)
+        except (OSError, AttributeError) as e:
+            debug_print(f"inotify nicht verfügbar, Verzeichnis wird abgefragt: {e}")
+    return PollingBackend(directory)
+
+
+class IndexWatcher:
+    def __init__(self, index, lock=None, backend=None, interval=POLL_INTERVAL, on_change=None, workers=None,
+                 initial_refresh=True):
+        self.index = index
+        self.lock = lock or threading.Lock()
+        self.backend = backend
+        self.interval = interval
+        self.on_change = on_change
+        self.workers = workers
+        self.initial_refresh = initial_refresh
+        self.thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        backend = self.backend
+        if backend is not None:
+            backend.wake()
+        if self.thread is not None:
+            self.thread.join()
+        # Erst schließen, wenn der Thread nicht mehr im select steckt
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self):
+        refresh = self.initial_refresh
+        while not self._stop.is_set():
+            try:
+                self._watch(refresh)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                debug_print(f"Fehler in der Verzeichnisüberwachung, Neustart in {RESTART_DELAY:g} s: {e!r}")
+                if self.backend is not None:
+                    self.backend.close()
+                    self.backend = None
+                # Nach dem Neustart alles abgleichen, was in der Zwischenzeit verpasst wurde
+                refresh = True
+                self._stop.wait(RESTART_DELAY)
+
+    def _watch(self, refresh):
+        if self.backend is None:
+            self.backend = create_backend(self.index.directory)
+        if refresh:
+            self.refresh()
+        debug_print(f"Überwache {self.index.directory} ({type(self.backend).__name__})")
+        while not self._stop.is_set():
+            changed = self.backend.wait(self.interval)
+            if not changed:
+                continue
+            while True:
+                more = self.backend.wait(SETTLE_DELAY)
+                if not more:
+                    break
+                changed |= more
+            if not self._stop.is_set():
+                self.apply(changed)
+
+    def refresh(self):
+        # Verzeichnis ohne Sperre lesen, dann in kleinen Portionen nachführen, damit Suchen dazwischen laufen
+        snapshot = snapshot_directory(self.index.directory)
+        with self.lock:
+            stale = self.index.stale_paths(snapshot)
+        parsed = removed = 0
+        for start in range(0, len(stale), REFRESH_BATCH_SIZE):
+            if self._stop.is_set():
+                break
+            with self.lock:
+                batch_parsed, batch_removed = self.index.update_paths(stale[start:start + REFRESH_BATCH_SIZE],
+                                                                      self.workers)
+            parsed += batch_parsed
+            removed += batch_removed
+        with self.lock:
+            self.index.save()
+        self._notify(parsed, removed)
+        return parsed, removed
+
+    def apply(self, paths):
+        with self.lock:
+            parsed, removed = self.index.update_paths(paths, self.workers)
+            self.index.save()
+        self._notify(parsed, removed)
+        return parsed, removed
+
+    def _notify(self, parsed, removed):
+        if (parsed or removed) and self.on_change is not None:
+            self.on_change(parsed, removed)
@@ -3,32 +3,59 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import queue
 import subprocess
 import threading
+import time
 import tkinter as tk
-from tkinter import Menu, messagebox, ttk
+from tkinter import Menu, filedialog, messagebox, ttk
 
 import src.sendsysex as send
-from dx7utils.common import debug_print, find_sysex_files, load_config
-from dx7utils.sysex import extract_patch_names
-
-
-def search_patch_names(files, search_term):
-    results = []
-    for file in files:
-        patch_names, instrument_type = extract_patch_names(file)
-        matching_patches = [
-            (file, i+1, name, instrument_type)
-            for i, name in enumerate(patch_names)
-            if search_term.lower() in name.lower()
-        ]
-        results.extend(matching_patches)
-    results.sort(key=lambda x: (x[2].lower(), x[0]))
-    debug_print(f"Sortierte Suchergebnisse: {results}")
-    return results
+from dx7utils.archive import materialize, split_member_path
+from dx7utils.bankwriter import write_banks
+from dx7utils.catalogue import FAVOURITE_TAG, Catalogue, parse_query
+from dx7utils.common import debug_print, load_config, load_library_pack, load_scan_workers
+from dx7utils.index import PatchIndex
+from dx7utils.validate import InvalidSysexError
+from dx7utils.virtuallist import VirtualTreeview
+from dx7utils.watcher import IndexWatcher
+
+RESULT_BATCH_SIZE = 100
+SIMILAR_RESULTS = 20
+SEARCH_DELAY_MS = 250
+FRAME_MS = 16
+FRAME_BUDGET = 0.010
+
+
+def search_patch_names(index, search_term, workers=None, dedupe=False, mode='fuzzy', refresh=True,
+                       catalogue=None, filters=None):
+    batch, updates = [], {}
+    if filters:
+        if refresh:
+            index.refresh(workers)
+        patches = catalogue.search(index, search_term, mode, **filters)
+    elif refresh:
+        patches = index.iter_search(search_term, workers, mode=mode)
+    else:
+        patches = index.search(search_term, mode)
+    if dedupe:
+        patches = index.iter_collapsed(patches, include_name=False)
+    else:
+        patches = ((patch, None, 1) for patch in patches)
+    for patch, key, count in patches:
+        if patch is None:
+            updates[key] = count
+            continue
+        batch.append((patch, key))
+        if len(batch) >= RESULT_BATCH_SIZE:
+            yield batch, updates
+            batch, updates = [], {}
+    if batch or updates:
+        yield batch, updates
 
 
 def open_file_in_explorer(file_path):
+    file_path = split_member_path(file_path)[0]
     try:
         if sys.platform == 'win32':
             os.startfile(file_path)
@@ -42,6 +69,7 @@ def open_file_in_explorer(file_path):
 
 def open_with_dexed(file_path, dexed_path, patch_number):
     try:
+        file_path = materialize(file_path)
         hex_patch = format(patch_number - 1, '02X')
         subprocess.Popen([dexed_path, file_path, f"-p{hex_patch}"])
         debug_print(f"Datei mit Dexed geöffnet: {file_path}, Patch: {patch_number}")
@@ -60,129 +88,386 @@ class SysexSearchApp:
 
         self.search_entry = tk.Entry(root, width=50)
         self.search_entry.pack(pady=5)
+        self.search_entry.bind("<KeyRelease>", self.on_search_key)
+        self.search_entry.bind("<Return>", lambda event: self.start_search())
 
         self.search_button = tk.Button(root, text="Suchen", command=self.start_search)
         self.search_button.pack(pady=10)
 
-        self.result_tree = ttk.Treeview(root, columns=('file', 'patch_nr', 'patch_name', 'instrument'), show='headings')
-        self.result_tree.heading('file', text='Datei')
-        self.result_tree.heading('patch_nr', text='Patch Nr.')
-        self.result_tree.heading('patch_name', text='Patch Name')
-        self.result_tree.heading('instrument', text='Instrument')
-        self.result_tree.column('file', width=400)
-        self.result_tree.column('patch_nr', width=80, anchor='center')
-        self.result_tree.column('patch_name', width=400)
-        self.result_tree.column('instrument', width=120)
-        self.result_tree.pack(pady=10, fill=tk.BOTH, expand=True)
+        self.dedupe_var = tk.BooleanVar(value=True)
+        self.dedupe_check = tk.Checkbutton(root, text="Duplikate zusammenfassen", variable=self.dedupe_var)
+        self.dedupe_check.pack()
+
+        self.mode_var = tk.StringVar(value='fuzzy')
+        mode_frame = tk.Frame(root)
+        mode_frame.pack()
+        for text, mode in (("Unscharf", 'fuzzy'), ("Teilwort", 'substring'), ("Wortanfang", 'prefix')):
+            tk.Radiobutton(mode_frame, text=text, variable=self.mode_var, value=mode).pack(side=tk.LEFT)
+
+        self.favourites_var = tk.BooleanVar(value=False)
+        self.favourites_check = tk.Checkbutton(root, text="Nur Favoriten", variable=self.favourites_var)
+        self.favourites_check.pack()
+
+        self.bank_voices = []
+        self.bank_button = tk.Button(root, text="Bank speichern (0)", command=self.save_collected_bank,
+                                     state=tk.DISABLED)
+        self.bank_button.pack(pady=5)
 
-        self.result_tree.bind("<Double-1>", self.on_file_double_click)
-        self.result_tree.bind("<Button-3>", self.on_right_click)
+        self.status_label = tk.Label(root, text="", fg="gray")
+        self.status_label.pack()
+
+        self.result_view = VirtualTreeview(
+            root,
+            ('file', 'patch_nr', 'patch_name', 'instrument', 'count'),
+            ('Datei', 'Patch Nr.', 'Patch Name', 'Instrument', 'Dateien'),
+            (400, 80, 400, 120, 60),
+            {'patch_nr': 'center', 'count': 'center'},
+        )
+        self.result_view.pack(pady=10, fill=tk.BOTH, expand=True)
+
+        self.result_view.bind_rows("<Double-1>", self.on_file_double_click)
+        self.result_view.bind_rows("<Button-3>", self.on_right_click)
 
         self.context_menu = Menu(self.root, tearoff=0)
         self.context_menu.add_command(label="Öffnen", command=self.context_open_file)
         self.context_menu.add_command(label="Mit Dexed öffnen", command=self.context_open_with_dexed)
         self.context_menu.add_command(label="An DX7 senden", command=self.send_to_dx7)
+        self.context_menu.add_command(label="Nur diese Voice senden", command=self.send_voice_to_dx7)
+        self.context_menu.add_command(label="Ähnliche Klänge finden", command=self.context_find_similar)
+        self.context_menu.add_command(label="Favorit an/aus", command=self.context_toggle_favourite)
+        self.context_menu.add_command(label="In Bank sammeln", command=self.context_collect_voice)
         self.directory, self.dexed_path = load_config()
         debug_print(f"Verzeichnis: {self.directory}, Dexed-Pfad: {self.dexed_path}")
+        self.scan_workers = load_scan_workers()
+        self.index = PatchIndex(self.directory)
+        pack_file = load_library_pack()
+        if not (pack_file and self.index.load_pack(pack_file)):
+            self.index.load()
+        self.index_lock = threading.Lock()
+        self.catalogue = Catalogue()
+        self.watcher = IndexWatcher(
+            self.index, self.index_lock, workers=self.scan_workers,
+            on_change=lambda parsed, removed: self.root.after(0, self._index_changed, parsed, removed),
+        )
+        self.watcher.start()
+        self.result_count = 0
+        self.result_rows = {}
+
+        self.pending_search = None
+        self.search_id = 0
+        self.search_cancel = threading.Event()
+        self.result_queue = queue.Queue()
+        self.pump_scheduled = False
+        self.searching = False
+
+    def on_search_key(self, event):
+        if event.keysym == 'Return':
+            return
+        if self.pending_search is not None:
+            self.root.after_cancel(self.pending_search)
+        self.pending_search = self.root.after(SEARCH_DELAY_MS, self._start_live_search)
+
+    def _start_live_search(self):
+        self.pending_search = None
+        search_term = self.search_entry.get().strip()
+        if not search_term and not self.favourites_var.get():
+            self.search_cancel.set()
+            self._clear_results()
+            self._search_done()
+            self.searching = False
+            return
+        self._launch_search(search_term, refresh=not self.index.entries, explicit=False)
 
     def start_search(self):
+        if self.pending_search is not None:
+            self.root.after_cancel(self.pending_search)
+            self.pending_search = None
         search_term = self.search_entry.get().strip()
         debug_print(f"Suchbegriff: {search_term}")
-        if not search_term:
+        if not search_term and not self.favourites_var.get():
             messagebox.showwarning("Eingabefehler", "Bitte einen Suchbegriff eingeben.")
             return
-
-        self.search_button.config(text="Suche läuft...", state=tk.DISABLED)
-        for i in self.result_tree.get_children():
-            self.result_tree.delete(i)
-
-        thread = threading.Thread(target=self._run_search, args=(search_term,), daemon=True)
+        self._launch_search(search_term, refresh=not self.watcher.is_alive(), explicit=True)
+
+    def _clear_results(self):
+        self.search_id += 1
+        self.result_view.clear()
+        self.result_count = 0
+        self.result_rows = {}
+        self.status_label.config(text="")
+
+    def _launch_search(self, search_text, refresh, explicit):
+        self.search_cancel.set()
+        self.search_cancel = threading.Event()
+        self._clear_results()
+        self.search_button.config(text="Suche läuft...")
+        self.searching = True
+
+        search_term, filters = parse_query(search_text)
+        if self.favourites_var.get():
+            filters.setdefault('tag', FAVOURITE_TAG)
+        thread = threading.Thread(
+            target=self._run_search,
+            args=(self.search_id, self.search_cancel, search_term, filters, self.dedupe_var.get(),
+                  self.mode_var.get(), refresh, explicit),
+            daemon=True,
+        )
         thread.start()
+        self._schedule_pump()
 
-    def _run_search(self, search_term):
+    def _run_search(self, search_id, cancel, search_term, filters, dedupe, mode, refresh, explicit):
         try:
-            sysex_files = find_sysex_files(self.directory)
-            if not sysex_files:
-                self.root.after(0, lambda: messagebox.showwarning("Fehler", "Keine SysEx-Dateien gefunden."))
-                return
-
-            results = search_patch_names(sysex_files, search_term)
-            self.root.after(0, self._populate_results, results)
+            with self.index_lock:
+                if cancel.is_set():
+                    return
+                batches = search_patch_names(self.index, search_term, self.scan_workers, dedupe, mode, refresh,
+                                             self.catalogue, filters)
+                try:
+                    for batch, updates in batches:
+                        if cancel.is_set():
+                            debug_print(f"Suche abgebrochen: {search_term}")
+                            return
+                        self.result_queue.put((search_id, 'rows', batch, updates))
+                finally:
+                    batches.close()
+                if refresh:
+                    self.index.save()
+                    if self.index.last_refresh[0] and not filters:
+                        ranking = [(patch[0], patch[1]) for patch in self.index.search(search_term, mode)]
+                        self.result_queue.put((search_id, 'order', ranking, None))
+                has_files = bool(self.index.entries)
+            self.result_queue.put((search_id, 'done', has_files, explicit))
         except Exception as e:
             debug_print(f"Fehler bei der Suche: {e}")
             self.root.after(0, lambda e=e: messagebox.showerror("Fehler", f"Fehler bei der Suche: {e}"))
-        finally:
-            self.root.after(0, self._search_done)
-
-    def _populate_results(self, results):
-        if results:
-            for file_path, patch_nr, patch_name, instrument_type in results:
-                relative_path = os.path.relpath(file_path, self.directory)
-                debug_print(
-                    f"Gefundener Patch: {relative_path}, Nr. {patch_nr}:"
-                    f" {patch_name}, Instrument: {instrument_type}"
-                )
-                self.result_tree.insert('', 'end', values=(relative_path, patch_nr, patch_name, instrument_type))
+            self.result_queue.put((search_id, 'done', True, False))
+
+    def _schedule_pump(self):
+        if not self.pump_scheduled:
+            self.pump_scheduled = True
+            self.root.after(FRAME_MS, self._pump_results)
+
+    def _pump_results(self):
+        self.pump_scheduled = False
+        deadline = time.perf_counter() + FRAME_BUDGET
+        rows = []
+        while time.perf_counter() < deadline:
+            try:
+                search_id, kind, payload, extra = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            if search_id != self.search_id:
+                continue
+            if kind == 'rows':
+                self._populate_results(rows, payload, extra)
+                continue
+            self.result_view.extend(rows)
+            rows = []
+            if kind == 'order':
+                self._order_results(payload)
+            else:
+                self._finish_search(payload, extra)
+        if rows:
+            self.result_view.extend(rows)
+            self.status_label.config(text=f"{self.result_count} Treffer ...")
+        elif self.result_count:
+            self.result_view.refresh()
+        if self.searching or not self.result_queue.empty():
+            self._schedule_pump()
+
+    def _populate_results(self, rows, results, updates):
+        for (file_path, patch_nr, patch_name, instrument_type), key in results:
+            relative_path = os.path.relpath(file_path, self.directory)
+            row = [relative_path, patch_nr, patch_name, instrument_type, 1, file_path]
+            rows.append(row)
+            if key is not None:
+                self.result_rows[key] = row
+        for key, count in updates.items():
+            self.result_rows[key][4] = count
+        self.result_count += len(results)
+
+    def _order_results(self, ranking):
+        self.result_view.model.order_by(ranking, lambda row: (row[5], row[1]))
+        self.result_view.refresh()
+
+    def _finish_search(self, has_files, explicit):
+        self.searching = False
+        self._search_done()
+        debug_print(f"Suche beendet: {self.result_count} Treffer")
+        if not has_files:
+            self.status_label.config(text="Keine SysEx-Dateien gefunden")
+            if explicit:
+                messagebox.showwarning("Fehler", "Keine SysEx-Dateien gefunden.")
+        elif not self.result_count:
+            self.status_label.config(text="Keine Patches gefunden")
+            if explicit:
+                messagebox.showinfo("Keine Übereinstimmung", "Keine Patches für den Suchbegriff gefunden.")
         else:
-            messagebox.showinfo("Keine Übereinstimmung", "Keine Patches für den Suchbegriff gefunden.")
+            self.status_label.config(text=f"{self.result_count} Treffer")
+
+    def _index_changed(self, parsed, removed):
+        debug_print(f"Bibliothek geändert: {parsed} neu eingelesen, {removed} entfernt")
+        if not self.searching:
+            self.status_label.config(text=f"Bibliothek aktualisiert: {parsed} neu, {removed} entfernt")
 
     def _search_done(self):
-        self.search_button.config(text="Suchen", state=tk.NORMAL)
+        self.search_button.config(text="Suchen")
 
     def get_selected_item(self):
-        selection = self.result_tree.selection()
-        if not selection:
-            return None
-        return selection[0]
+        return self.result_view.selected_row()
 
     def on_file_double_click(self, event):
-        item = self.get_selected_item()
-        if not item:
+        row = self.get_selected_item()
+        if not row:
             return
-        file_path = self.result_tree.item(item, "values")[0]
-        full_path = os.path.join(self.directory, file_path)
+        full_path = row[5]
         debug_print(f"Doppelklick auf Datei: {full_path}")
         open_file_in_explorer(full_path)
 
     def on_right_click(self, event):
-        item = self.result_tree.identify_row(event.y)
-        if item:
-            self.result_tree.selection_set(item)
-            debug_print(f"Rechtsklick auf Item: {item}")
+        index = self.result_view.row_at(event.y)
+        if index is not None:
+            self.result_view.select(index)
+            debug_print(f"Rechtsklick auf Zeile: {index}")
             self.context_menu.tk_popup(event.x_root, event.y_root)
 
     def context_open_file(self):
-        item = self.get_selected_item()
-        if not item:
+        row = self.get_selected_item()
+        if not row:
             return
-        file_path = self.result_tree.item(item, "values")[0]
-        full_path = os.path.join(self.directory, file_path)
+        full_path = row[5]
         debug_print(f"Kontextmenü: Öffne Datei {full_path}")
         open_file_in_explorer(full_path)
 
     def context_open_with_dexed(self):
-        item = self.get_selected_item()
-        if not item:
+        row = self.get_selected_item()
+        if not row:
             return
-        values = self.result_tree.item(item, "values")
-        file_path = values[0]
-        patch_number = int(values[1])
-        full_path = os.path.join(self.directory, file_path)
+        full_path, patch_number = row[5], row[1]
         debug_print(f"Kontextmenü: Öffne mit Dexed {full_path}, Patch: {patch_number}")
         open_with_dexed(full_path, self.dexed_path, patch_number)
 
     def send_to_dx7(self):
-        item = self.get_selected_item()
-        if not item:
+        row = self.get_selected_item()
+        if not row:
+            return
+        self.send_sysex(row[5])
+
+    def send_voice_to_dx7(self):
+        row = self.get_selected_item()
+        if not row:
             return
-        file_path = self.result_tree.item(item, "values")[0]
-        full_path = os.path.join(self.directory, file_path)
-        self.send_sysex(full_path)
+        try:
+            if self._send_checked(send.send_voice, row[5], row[1]):
+                messagebox.showinfo("Erfolg", f"Voice {row[1]} ({row[2]}) gesendet")
+        except Exception as e:
+            messagebox.showerror("Fehler", f"Fehler beim Senden der Voice: {e}")
+
+    def context_find_similar(self):
+        row = self.get_selected_item()
+        if not row:
+            return
+        full_path, patch_number = row[5], row[1]
+        debug_print(f"Kontextmenü: Ähnliche Klänge zu {full_path}, Patch: {patch_number}")
+        thread = threading.Thread(target=self._run_similar, args=(full_path, patch_number), daemon=True)
+        thread.start()
+
+    def context_toggle_favourite(self):
+        row = self.get_selected_item()
+        if not row:
+            return
+        with self.index_lock:
+            try:
+                voice_hash = self.index.voice_hash(row[5], row[1])
+            except KeyError:
+                self.status_label.config(text=f"{row[2]} ist nicht mehr im Index")
+                return
+            favourite = self.catalogue.toggle_tag(voice_hash, FAVOURITE_TAG)
+        self.status_label.config(text=f"{row[2]} {'ist jetzt' if favourite else 'ist kein'} Favorit")
+        debug_print(f"Favorit {'gesetzt' if favourite else 'entfernt'}: {row[5]}, Patch: {row[1]}")
+
+    def context_collect_voice(self):
+        row = self.get_selected_item()
+        if not row:
+            return
+        voice = (row[5], row[1])
+        if voice not in self.bank_voices:
+            self.bank_voices.append(voice)
+        self._update_bank_button()
+        self.status_label.config(text=f"{row[2]} gesammelt ({len(self.bank_voices)} Stimmen)")
+        debug_print(f"In Bank gesammelt: {row[5]}, Patch: {row[1]}")
+
+    def _update_bank_button(self):
+        self.bank_button.config(text=f"Bank speichern ({len(self.bank_voices)})",
+                                state=tk.NORMAL if self.bank_voices else tk.DISABLED)
+
+    def save_collected_bank(self):
+        if not self.bank_voices:
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="Bank speichern", initialdir=self.directory, defaultextension='.syx',
+            filetypes=[("SysEx-Dateien", "*.syx")],
+        )
+        if not file_path:
+            return
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        try:
+            with self.index_lock:
+                # Das Überschreiben hat der Speichern-Dialog schon bestätigt
+                written = write_banks(self.index, {name: self.bank_voices}, os.path.dirname(file_path),
+                                      overwrite=True)
+        except Exception as e:
+            messagebox.showerror("Fehler", f"Fehler beim Schreiben der Bank: {e}")
+            return
+        files = ', '.join(os.path.basename(path) for path in written)
+        self.status_label.config(text=f"{len(self.bank_voices)} Stimmen gespeichert: {files}")
+        self.bank_voices = []
+        self._update_bank_button()
+
+    def _run_similar(self, file_path, patch_number):
+        try:
+            with self.index_lock:
+                results = self.index.similar(file_path, patch_number, SIMILAR_RESULTS)
+            self.root.after(0, self._show_similar, file_path, patch_number, results)
+        except Exception as e:
+            debug_print(f"Fehler bei der Ähnlichkeitssuche: {e}")
+            self.root.after(0, lambda e=e: messagebox.showerror("Fehler", f"Fehler bei der Ähnlichkeitssuche: {e}"))
+
+    def _show_similar(self, file_path, patch_number, results):
+        window = tk.Toplevel(self.root)
+        window.title(f"Ähnliche Klänge: {os.path.basename(file_path)} #{patch_number}")
+        window.geometry("900x350")
+        tree = ttk.Treeview(
+            window, columns=('file', 'patch_nr', 'patch_name', 'instrument', 'distance'), show='headings'
+        )
+        tree.heading('file', text='Datei')
+        tree.heading('patch_nr', text='Patch Nr.')
+        tree.heading('patch_name', text='Patch Name')
+        tree.heading('instrument', text='Instrument')
+        tree.heading('distance', text='Abstand')
+        tree.column('file', width=350)
+        tree.column('patch_nr', width=80, anchor='center')
+        tree.column('patch_name', width=200)
+        tree.column('instrument', width=120)
+        tree.column('distance', width=80, anchor='e')
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        for result_file, result_nr, result_name, instrument_type, distance in results:
+            relative_path = os.path.relpath(result_file, self.directory)
+            tree.insert('', 'end', values=(relative_path, result_nr, result_name, instrument_type, f"{distance:.2f}"))
+
+    def _send_checked(self, send_function, *args):
+        try:
+            send_function(*args)
+        except InvalidSysexError as e:
+            if not messagebox.askyesno("Fehlerhafte Daten", f"{e}\n\nTrotzdem senden?"):
+                return False
+            send_function(*args, force=True)
+        return True
 
     def send_sysex(self, file_path):
         try:
-            send.send_sysex(file_path)
-            messagebox.showinfo("Erfolg", f"Gesendet: {file_path}")
+            if self._send_checked(send.send_sysex, file_path):
+                messagebox.showinfo("Erfolg", f"Gesendet: {file_path}")
         except Exception as e:
             messagebox.showerror("Fehler", f"Fehler beim Senden der Datei: {e}")
 
@@ -0,0 +1,76 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+
+from dx7utils.bankwriter import write_banks
+from dx7utils.catalogue import Catalogue, file_folder, parse_query
+from dx7utils.common import load_config_simple, load_scan_workers
+from dx7utils.index import load_index
+
+
+def group_patches(index, catalogue, term, filters, group_by, name, mode):
+    if group_by == 'tag':
+        return {tag: catalogue.search(index, term, mode, **{**filters, 'tag': tag}) for tag in catalogue.all_tags()}
+    groups = {}
+    for patch in catalogue.search(index, term, mode, **filters):
+        if group_by == 'ordner':
+            key = file_folder(patch[0], index.directory) or name
+        elif group_by == 'instrument':
+            key = patch[3]
+        else:
+            key = name
+        groups.setdefault(key, []).append(patch)
+    return groups
+
+
+def distinct_voices(index, patches):
+    seen = set()
+    voices = []
+    for file_path, voice_number, _, _ in patches:
+        key = index.voice_hash(file_path, voice_number, include_name=False)
+        if key in seen:
+            continue
+        seen.add(key)
+        voices.append((file_path, voice_number))
+    return voices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stellt neue 32-Stimmen-Bänke aus Treffern der Bibliothek zusammen.")
+    parser.add_argument('target', help="Zielverzeichnis für die .syx-Dateien")
+    parser.add_argument('query', nargs='*', help="Suchbegriff mit Filtern wie instrument:, ordner:, tag: "
+                                                 "(leer: alle Stimmen)")
+    parser.add_argument('-g', '--group-by', choices=('tag', 'ordner', 'instrument'),
+                        help="Eine Bankfolge je Tag, Ordner oder Instrument")
+    parser.add_argument('-n', '--name', default='bank', help="Dateiname der Bank ohne Gruppierung")
+    parser.add_argument('-m', '--mode', choices=('fuzzy', 'substring', 'prefix'), default='fuzzy',
+                        help="Suchmodus für den Suchbegriff")
+    parser.add_argument('--all', action='store_true', help="Identische Klänge nicht zusammenfassen")
+    parser.add_argument('-f', '--force', action='store_true',
+                        help="Vorhandene Dateien überschreiben statt eine Nummer anzuhängen")
+    args = parser.parse_args()
+
+    directory = load_config_simple()
+    index = load_index(directory, workers=load_scan_workers())
+    term, filters = parse_query(' '.join(args.query))
+
+    with Catalogue() as catalogue:
+        groups = group_patches(index, catalogue, term, filters, args.group_by, args.name, args.mode)
+    groups = {
+        key: [patch[:2] for patch in patches] if args.all else distinct_voices(index, patches)
+        for key, patches in groups.items() if patches
+    }
+    if not groups:
+        print("Keine passenden Stimmen gefunden.")
+        sys.exit(1)
+
+    written = write_banks(index, groups, args.target, overwrite=args.force)
+    print(f"{len(written)} Bänke mit {sum(len(voices) for voices in groups.values())} Stimmen "
+          f"nach {args.target} geschrieben.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import signal
+import socketserver
+import threading
+
+from dx7utils.catalogue import Catalogue
+from dx7utils.common import debug_print, load_config_simple, load_library_pack, load_scan_workers
+from dx7utils.daemon import DEFAULT_SOCKET_FILE, connect, encode_message
+from dx7utils.index import PatchIndex
+from dx7utils.watcher import IndexWatcher
+from src.patchsearchercmd import iter_results
+from src.sendsysex import load_midi_output_port, send_payload, sysex_payload, voice_payload
+
+
+class DaemonState:
+    def __init__(self, directory, workers=None):
+        self.index = PatchIndex(directory)
+        pack_file = load_library_pack()
+        if not (pack_file and self.index.load_pack(pack_file)):
+            self.index.load()
+        self.index_lock = threading.Lock()
+        self.catalogue = Catalogue()
+        self.watcher = IndexWatcher(self.index, self.index_lock, workers=workers)
+        self.port = None
+        self.port_lock = threading.Lock()
+
+    def output_port(self):
+        if self.port is None:
+            import mido
+
+            self.port = mido.open_output(load_midi_output_port())
+        return self.port
+
+    def close(self):
+        self.watcher.stop()
+        if self.port is not None:
+            self.port.close()
+        self.catalogue.close()
+
+
+def handle_ping(state, request):
+    yield {'pid': os.getpid(), 'files': len(state.index.entries)}
+
+
+def handle_search(state, request):
+    with state.index_lock:
+        results = list(iter_results(state.index, request.get('queries', []), request.get('mode', 'fuzzy'),
+                                    request.get('limit'), state.catalogue))
+    for query, patch in results:
+        yield [query, *patch]
+
+
+def handle_patch_names(state, request):
+    with state.index_lock:
+        files = [(file_path, *state.index.patch_names(file_path)) for file_path in state.index.files()]
+    for file_path, names, instrument in files:
+        yield [file_path, instrument, names]
+
+
+def handle_send(state, request):
+    file_path, force = request['path'], request.get('force', False)
+    voice_number = request.get('voice')
+    if voice_number is None:
+        sysex_data = sysex_payload(file_path, force)
+    else:
+        sysex_data = voice_payload(file_path, voice_number, force)
+    with state.port_lock:
+        try:
+            send_payload(state.output_port(), sysex_data)
+        except OSError:
+            state.port = None
+            raise
+    debug_print(f"SysEx-Daten gesendet: {file_path}")
+    yield {'sent': len(sysex_data)}
+
+
+COMMANDS = {
+    'ping': handle_ping,
+    'search': handle_search,
+    'patch_names': handle_patch_names,
+    'send': handle_send,
+}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            handler = COMMANDS.get(request.get('command'))
+            if handler is None:
+                raise ValueError(f"Unbekannter Befehl: {request.get('command')}")
+            for result in handler(self.server.state, request):
+                self.wfile.write(encode_message({'result': result}))
+            self.wfile.write(encode_message({'done': True}))
+        except ConnectionError:
+            debug_print("Client hat die Verbindung vorzeitig geschlossen")
+        except Exception as e:
+            debug_print(f"Fehler bei Anfrage: {e}")
+            self.wfile.write(encode_message({'error': str(e)}))
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_file, state):
+        self.state = state
+        super().__init__(socket_file, RequestHandler)
+        os.chmod(socket_file, 0o600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hält Index, Katalog und MIDI-Port für die Kommandozeilenwerkzeuge "
+                                                 "im Speicher.")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_FILE, help="Pfad des Unix-Sockets")
+    args = parser.parse_args()
+
+    if not hasattr(socketserver, 'UnixStreamServer'):
+        print("Unix-Sockets werden auf diesem System nicht unterstützt.")
+        sys.exit(1)
+
+    existing = connect(args.socket)
+    if existing is not None:
+        existing.close()
+        print(f"Der DX7-Dienst läuft bereits ({args.socket}).")
+        sys.exit(1)
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+    directory = os.path.dirname(args.socket)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    state = DaemonState(load_config_simple(), load_scan_workers())
+    server = DaemonServer(args.socket, state)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    state.watcher.start()
+    print(f"DX7-Dienst bereit: {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args.socket)
+        state.close()
+        print("DX7-Dienst beendet.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+
+from dx7utils.common import load_config_simple, load_library_pack, load_scan_workers
+from dx7utils.index import load_index
+from dx7utils.pack import DEFAULT_PACK_FILE, extract_pack, write_pack
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packt die SysEx-Bibliothek in eine einzelne Datei oder entpackt sie.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help="Bibliothek in eine Pack-Datei schreiben")
+    export_parser.add_argument('pack', nargs='?', help=f"Pack-Datei (Standard: {DEFAULT_PACK_FILE})")
+    import_parser = subparsers.add_parser('import', help="Pack-Datei in .syx-Dateien entpacken")
+    import_parser.add_argument('pack', help="Pack-Datei")
+    import_parser.add_argument('target', help="Zielverzeichnis")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        pack_file = args.pack or load_library_pack() or DEFAULT_PACK_FILE
+        directory = load_config_simple()
+        index = load_index(directory, workers=load_scan_workers())
+        banks, voices = write_pack(index, pack_file)
+        print(f"{banks} Bänke mit {voices} Stimmen nach {pack_file} geschrieben.")
+    else:
+        if not os.path.isfile(args.pack):
+            print(f"Datei nicht gefunden: {args.pack}")
+            sys.exit(1)
+        banks = extract_pack(args.pack, args.target)
+        print(f"{banks} Bänke nach {args.target} entpackt.")
+
+
+if __name__ == "__main__":
+    main()
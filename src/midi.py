@@ -3,24 +3,32 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import time
-
 import mido
 
 from dx7utils.common import debug_print
 from dx7utils.midi_core import (
+    FaderJournal,
+    MidiRelay,
     display_fader_value,
-    fader_values,
+    format_message,
     load_from_json,
-    save_to_json,
-    send_midi_cc,
 )
 
 load_from_json()
 
-def main():
-    global current_program
+def print_event(event, *args):
+    if event == 'receive':
+        debug_print(f"Empfangene MIDI-Nachricht: {format_message(args[0])}")
+    elif event == 'forward':
+        debug_print(f"Gesendete Nachricht: {format_message(args[0])}")
+    elif event == 'program':
+        debug_print(f"Programm gewechselt zu: {args[0]}")
+    elif event in ('cc', 'fader'):
+        display_fader_value(*args)
+    elif event == 'error':
+        print(f"Fehler bei der Verarbeitung der MIDI-Nachricht: {args[0]}")
 
+def main():
     print("Verfügbare MIDI-Ausgangsports:")
     output_ports = mido.get_output_names()
     debug_print(f"Verfügbare MIDI-Ausgangsports: {output_ports}")
@@ -50,56 +58,22 @@ def main():
     midi_input_name = midi_ports[port_index]
     debug_print(f"Gewählter MIDI-Eingangsport: {midi_input_name}")
 
+    relay = MidiRelay(midi_input_name, virtual_output, on_event=print_event)
+    journal = FaderJournal().start()
     try:
-        with mido.open_input(midi_input_name) as inport:
-            print("Warte auf MIDI-Nachrichten...")
-            debug_print("MIDI-Eingang geöffnet und wartet auf Nachrichten")
-
-            try:
-                while True:
-                    for msg in inport.iter_pending():
-                        debug_print(f"Empfangene MIDI-Nachricht: {msg}")
-
-                        if msg.type in ['pitchwheel', 'note_on']:
-                            virtual_output.send(msg)
-                            debug_print(f"Gesendete Nachricht: {msg}")
-
-                        if msg.type == 'program_change' and 0 <= msg.program <= 31:
-                            current_program = msg.program
-                            debug_print(f"Programm gewechselt zu: {current_program}")
-
-                        if msg.type == 'control_change' and msg.control != 6 and current_program is not None:
-                            fader_values[f'program_{current_program}']['cc_value'] = msg.value
-                            cc_value = fader_values[f'program_{current_program}']['cc_value']
-                            debug_print(f"Aktueller CC-Wert für Programm {current_program}: {cc_value}")
-
-                            fader_value = fader_values[f'program_{current_program}']['fader_value']
-                            display_fader_value(current_program, fader_value, cc_value)
-
-                            send_midi_cc(virtual_output, current_program, cc_value)
-
-                        if msg.type == 'control_change' and msg.control == 6 and current_program is not None:
-                            current_value = fader_values[f'program_{current_program}']['fader_value']
-                            debug_print(f"Aktueller Fader-Wert für Programm {current_program}: {current_value}")
-
-                            if msg.value != current_value:
-                                fader_values[f'program_{current_program}']['fader_value'] = msg.value
-                                cc = fader_values[f'program_{current_program}']['cc_value']
-                                display_fader_value(current_program, msg.value, cc)
-
-                                debug_print(f"Neuer Fader-Wert für Programm {current_program}: {msg.value}")
-                                debug_print(f"Fader-Werte aktualisiert: {fader_values}")
-
-                                send_midi_cc(virtual_output, current_program, msg.value)
-
-                    time.sleep(0.01)
-            except KeyboardInterrupt:
-                print("\nProgramm wurde durch den Benutzer beendet.")
-                debug_print("Programm durch KeyboardInterrupt beendet")
+        relay.start()
+        print("Warte auf MIDI-Nachrichten...")
+        debug_print("MIDI-Eingang geöffnet und wartet auf Nachrichten")
+        try:
+            relay.wait()
+        except KeyboardInterrupt:
+            print("\nProgramm wurde durch den Benutzer beendet.")
+            debug_print("Programm durch KeyboardInterrupt beendet")
     except OSError as e:
         print(f"Fehler beim Öffnen des MIDI-Eingangsports: {e}")
     finally:
-        save_to_json()
+        relay.stop()
+        journal.close()
         try:
             virtual_output.close()
         except Exception:
@@ -3,40 +3,195 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from dx7utils.common import find_sysex_files, load_config_simple
-from dx7utils.sysex import extract_patch_names
+import argparse
+import contextlib
+import csv
+import itertools
+import json
 
+from dx7utils.catalogue import Catalogue, parse_query
+from dx7utils.common import load_config_simple, load_library_pack, load_scan_workers
+from dx7utils.daemon import DEFAULT_SOCKET_FILE, query_daemon
+from dx7utils.index import PatchIndex
 
-def search_patch_names(files, search_term):
+OUTPUT_FIELDS = ('query', 'file', 'voice', 'name', 'instrument')
+QUERY_CHUNK_SIZE = 64
+
+
+def search_patch_names(index, search_term, mode='fuzzy'):
     results = {}
-    for file in files:
-        patch_names, instrument_type = extract_patch_names(file)
-        matching_patches = [name for name in patch_names if search_term.lower() in name.lower()]
-        if matching_patches:
-            results[file] = matching_patches
+    for file, _, name, _ in index.search(search_term, mode):
+        results.setdefault(file, []).append(name)
     return results
 
 
-def main():
-    directory = load_config_simple()
-    sysex_files = find_sysex_files(directory)
+def iter_queries(queries, stdin):
+    for query in queries:
+        if query == '-':
+            yield from (line.rstrip('\r\n') for line in stdin)
+        else:
+            yield query
 
-    if not sysex_files:
-        print("Keine SysEx-Dateien gefunden.")
-        return
 
-    search_term = input("Gib den Suchbegriff für den Yamaha DX7 Patch-Namen ein: ")
+def iter_daemon_results(queries, mode='fuzzy', limit=None, socket_file=DEFAULT_SOCKET_FILE,
+                        chunk_size=QUERY_CHUNK_SIZE):
+    # Suchbegriffe blockweise an den Dienst schicken, damit stdin nicht erst ganz gelesen werden muss
+    queries = iter(queries)
+    while chunk := list(itertools.islice(queries, chunk_size)):
+        responses = query_daemon('search', socket_file, queries=chunk, mode=mode, limit=limit)
+        if responses is None:
+            raise ConnectionError("DX7-Dienst nicht erreichbar.")
+        for response in responses:
+            yield response[0], tuple(response[1:])
 
-    results = search_patch_names(sysex_files, search_term)
 
-    if results:
-        print(f"Gefundene Patches für '{search_term}':")
-        for file, patches in results.items():
-            print(f"Datei: {file}")
+def iter_results(index, queries, mode='fuzzy', limit=None, catalogue=None):
+    own_catalogue = catalogue is None
+    try:
+        for query in queries:
+            query = query.strip()
+            if not query:
+                continue
+            search_term, filters = parse_query(query)
+            if filters:
+                if catalogue is None:
+                    catalogue = Catalogue()
+                patches = catalogue.search(index, search_term, mode, limit=limit, **filters)
+            else:
+                patches = index.search(search_term, mode)[:limit]
             for patch in patches:
-                print(f"  Patch-Name: {patch}")
+                yield query, patch
+    finally:
+        if own_catalogue and catalogue is not None:
+            catalogue.close()
+
+
+def write_ndjson(results, out):
+    current_query = None
+    for query, (file, voice, name, instrument) in results:
+        if query != current_query:
+            out.flush()
+            current_query = query
+        out.write(json.dumps(
+            {'query': query, 'file': file, 'voice': voice, 'name': name, 'instrument': instrument},
+            ensure_ascii=False,
+        ) + '\n')
+    out.flush()
+
+
+def write_csv(results, out):
+    writer = csv.writer(out)
+    writer.writerow(OUTPUT_FIELDS)
+    current_query = None
+    for query, patch in results:
+        if query != current_query:
+            out.flush()
+            current_query = query
+        writer.writerow((query, *patch))
+    out.flush()
+
+
+def write_text(results, out):
+    current_query = current_file = None
+    for query, (file, _, name, _) in results:
+        if query != current_query:
+            out.write(f"Gefundene Patches für '{query}':\n")
+            current_query, current_file = query, None
+        if file != current_file:
+            out.write(f"Datei: {file}\n")
+            current_file = file
+        out.write(f"  Patch-Name: {name}\n")
+    out.flush()
+
+
+WRITERS = {'ndjson': write_ndjson, 'csv': write_csv, 'text': write_text}
+
+
+def load_search_index(refresh=False):
+    directory = load_config_simple()
+    index = PatchIndex(directory)
+    pack_file = load_library_pack()
+    if not (pack_file and index.load_pack(pack_file)):
+        index.load()
+    if refresh or not index.entries:
+        index.refresh(load_scan_workers())
+        index.save()
+    return index
+
+
+def interactive():
+    directory = load_config_simple()
+    index = PatchIndex(directory)
+    index.load()
+
+    search_text = input("Gib den Suchbegriff für den Yamaha DX7 Patch-Namen ein: ")
+    search_term, filters = parse_query(search_text)
+
+    if filters:
+        index.refresh(load_scan_workers())
+        with Catalogue() as catalogue:
+            patches = catalogue.search(index, search_term, 'fuzzy', **filters)
     else:
-        print(f"Keine Patches gefunden, die '{search_term}' entsprechen.")
+        patches = index.iter_search(search_term, load_scan_workers(), mode='fuzzy')
+
+    current_file = None
+    for file, _, patch, _ in patches:
+        if current_file is None:
+            print(f"Gefundene Patches für '{search_text}':")
+        if file != current_file:
+            print(f"Datei: {file}")
+            current_file = file
+        print(f"  Patch-Name: {patch}")
+    index.save()
+
+    if not index.entries:
+        print("Keine SysEx-Dateien gefunden.")
+    elif current_file is None:
+        print(f"Keine Patches gefunden, die '{search_text}' entsprechen.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sucht DX7-Patch-Namen im Index und gibt die Treffer zeilenweise aus.")
+    parser.add_argument('queries', nargs='*', help="Suchbegriffe mit optionalen Filtern; '-' liest Suchbegriffe "
+                                                   "zeilenweise von stdin")
+    parser.add_argument('-f', '--format', choices=tuple(WRITERS), default='ndjson', help="Ausgabeformat")
+    parser.add_argument('-m', '--mode', choices=('fuzzy', 'substring', 'prefix'), default='fuzzy',
+                        help="Suchmodus")
+    parser.add_argument('-n', '--limit', type=int, help="Höchstens so viele Treffer je Suchbegriff")
+    parser.add_argument('--refresh', action='store_true', help="Bibliothek vor der Suche neu einlesen")
+    args = parser.parse_args()
+
+    queries = args.queries
+    if not queries:
+        if sys.stdin.isatty():
+            interactive()
+            return
+        queries = ['-']
+
+    out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        queries = iter_queries(queries, sys.stdin)
+        results = None
+        if not args.refresh:
+            # der erste Suchbegriff prüft allein, ob der Dienst läuft
+            first = list(itertools.islice(queries, 1))
+            responses = query_daemon('search', queries=first, mode=args.mode, limit=args.limit)
+            if responses is not None:
+                results = itertools.chain(
+                    ((response[0], tuple(response[1:])) for response in responses),
+                    iter_daemon_results(queries, args.mode, args.limit),
+                )
+            else:
+                queries = itertools.chain(first, queries)
+        if results is None:
+            index = load_search_index(args.refresh)
+            results = iter_results(index, queries, args.mode, args.limit)
+        try:
+            WRITERS[args.format](results, out)
+        except BrokenPipeError:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), out.fileno())
+            sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+
+from dx7utils.common import load_config_simple, load_scan_workers
+from dx7utils.index import load_index
+
+
+def find_voice(index, query, voice_number=None):
+    if os.path.isfile(query):
+        file_path = os.path.abspath(query)
+        for indexed in index.entries:
+            if os.path.abspath(indexed) == file_path:
+                return indexed, 1 if voice_number is None else voice_number
+        return None
+    results = index.search(query)
+    exact = [patch for patch in results if patch[2].lower() == query.lower()]
+    if exact or results:
+        file_path, number, _, _ = (exact or results)[0]
+        return file_path, number
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Findet ähnlich klingende DX7-Patches in der Bibliothek.")
+    parser.add_argument('query', nargs='?', help="Patch-Name oder Pfad einer .syx-Datei")
+    parser.add_argument('-v', '--voice', type=int, help="Stimmennummer (1-32) bei Angabe einer Datei")
+    parser.add_argument('-k', type=int, default=10, help="Anzahl der Ergebnisse")
+    parser.add_argument('--all', action='store_true', help="Identische Klänge nicht zusammenfassen")
+    args = parser.parse_args()
+
+    query = args.query or input("Patch-Name oder Datei für die Ähnlichkeitssuche: ")
+
+    directory = load_config_simple()
+    index = load_index(directory, workers=load_scan_workers(), collect_params=True)
+
+    voice = find_voice(index, query, args.voice)
+    if voice is None:
+        print(f"Kein Patch gefunden, der '{query}' entspricht.")
+        return
+
+    file_path, voice_number = voice
+    names = index.patch_names(file_path)[0]
+    if not 1 <= voice_number <= len(names):
+        print(f"Voice {voice_number} ist in {file_path} nicht vorhanden ({len(names)} Voices).")
+        return
+    name = names[voice_number - 1]
+    print(f"Ähnliche Patches zu {name} ({file_path}, Voice {voice_number}):")
+    for file, number, patch, instrument, distance in index.similar(file_path, voice_number, args.k, not args.all):
+        print(f"  {distance:7.2f}  {patch:<10}  Voice {number:3d}  {file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,28 +5,39 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import json
 
-from dx7utils.common import find_sysex_files
-from dx7utils.sysex import extract_patch_names
+from dx7utils.daemon import query_daemon
+from dx7utils.index import load_index
 
 
-def main():
+def iter_patch_names():
+    responses = query_daemon('patch_names')
+    if responses is not None:
+        yield from responses
+        return
+
     with open('data/config.json', 'r') as config_file:
         config = json.load(config_file)
 
     directory = config['directory']
-    sysex_files = find_sysex_files(directory)
+    index = load_index(directory)
 
-    for syx_file_path in sysex_files:
+    for syx_file_path in index.files():
         try:
-            patch_names, instrument = extract_patch_names(syx_file_path)
-            print(f"Datei: {syx_file_path}")
-            print(f"Instrument: {instrument}")
-            print("Patch-Namen:")
-            for i, name in enumerate(patch_names, 1):
-                print(f"  - Voice {i:3d}: {name}")
-            print()
+            patch_names, instrument = index.patch_names(syx_file_path)
         except Exception as e:
             print(f"Fehler beim Verarbeiten von {syx_file_path}: {str(e)}")
+            continue
+        yield syx_file_path, instrument, patch_names
+
+
+def main():
+    for syx_file_path, instrument, patch_names in iter_patch_names():
+        print(f"Datei: {syx_file_path}")
+        print(f"Instrument: {instrument}")
+        print("Patch-Namen:")
+        for i, name in enumerate(patch_names, 1):
+            print(f"  - Voice {i:3d}: {name}")
+        print()
 
 if __name__ == "__main__":
     main()
@@ -5,9 +5,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import json
 
-import mido
-
+from dx7utils.archive import read_sysex_bytes, split_member_path
 from dx7utils.common import debug_print
+from dx7utils.daemon import query_daemon
 
 
 def load_midi_output_port():
@@ -24,6 +24,8 @@ def load_midi_output_port():
         raise KeyError("MIDI-Ausgangsport in data/config.json fehlt oder ist leer.")
     debug_print(f"MIDI-Ausgangsport-Präfix aus der Konfiguration: {midi_port_prefix}")
 
+    import mido
+
     available_ports = mido.get_output_names()
     debug_print(f"Verfügbare MIDI-Ausgangsports: {available_ports}")
 
@@ -35,38 +37,95 @@ def load_midi_output_port():
     raise ValueError(f"Kein MIDI-Ausgangsport gefunden, der mit '{midi_port_prefix}' beginnt.")
 
 
-def send_sysex(file_path):
-    midi_output_port = load_midi_output_port()
+def sysex_payload(file_path, force=False):
+    from dx7utils.validate import InvalidSysexError, check_data
 
-    file_path = os.path.normpath(file_path)
+    if split_member_path(file_path)[1] is None:
+        file_path = os.path.normpath(file_path)
     debug_print(f"Versuche, die Datei zu öffnen: {file_path}")
 
-    with mido.open_output(midi_output_port) as port:
-        with open(file_path, 'rb') as f:
-            sysex_data = f.read()
+    sysex_data = read_sysex_bytes(file_path)
+
+    if not sysex_data.startswith(b'\xF0') or not sysex_data.endswith(b'\xF7'):
+        raise ValueError("Die Datei enthält keine gültigen SysEx-Daten.")
+
+    issues = check_data(sysex_data)
+    if issues and not force:
+        raise InvalidSysexError(f"Die Datei ist fehlerhaft ({issues[0]}).")
+    return sysex_data
+
+
+def voice_payload(file_path, voice_number, force=False):
+    from dx7utils.matrix import bank_records, unpack_voices, vced_messages
+    from dx7utils.sysex import VoiceBank
+    from dx7utils.validate import InvalidSysexError, parameter_issues
+
+    with VoiceBank.from_file(file_path) as bank:
+        records = bank_records(bank)
+    if not 1 <= voice_number <= len(records):
+        raise ValueError(f"Voice {voice_number} ist in {file_path} nicht vorhanden.")
+    params = unpack_voices(records[voice_number - 1])
+
+    issues = parameter_issues(params)
+    if issues and not force:
+        raise InvalidSysexError(f"Die Voice ist fehlerhaft ({issues[0]}).")
+    return vced_messages(params)[0].tobytes()
+
+
+def send_payload(port, sysex_data):
+    import mido
+
+    port.send(mido.Message('sysex', data=sysex_data[1:-1]))
 
-        if not sysex_data.startswith(b'\xF0') or not sysex_data.endswith(b'\xF7'):
-            raise ValueError("Die Datei enthält keine gültigen SysEx-Daten.")
 
-        sysex_msg = mido.Message('sysex', data=sysex_data[1:-1])
-        port.send(sysex_msg)
+def send_sysex(file_path, force=False):
+    import mido
+
+    midi_output_port = load_midi_output_port()
+    sysex_data = sysex_payload(file_path, force)
+
+    with mido.open_output(midi_output_port) as port:
+        send_payload(port, sysex_data)
 
         debug_print(f"SysEx-Daten gesendet: {file_path}")
 
 
+def send_voice(file_path, voice_number, force=False):
+    import mido
+
+    midi_output_port = load_midi_output_port()
+    sysex_data = voice_payload(file_path, voice_number, force)
+
+    with mido.open_output(midi_output_port) as port:
+        send_payload(port, sysex_data)
+
+        debug_print(f"Voice {voice_number} in den Edit-Puffer gesendet: {file_path}")
+
+
+def send_via_daemon(file_path, force=False):
+    responses = query_daemon('send', path=os.path.abspath(file_path), force=force)
+    if responses is None:
+        return False
+    for _ in responses:
+        pass
+    return True
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Verwendung: python sendsysex.py <sysex_file>")
+        print("Verwendung: python sendsysex.py <sysex_file> [--force]")
         sys.exit(1)
 
     sysex_file = sys.argv[1]
 
-    if not os.path.isfile(sysex_file):
+    if not os.path.isfile(split_member_path(sysex_file)[0]):
         print(f"Datei nicht gefunden: {sysex_file}")
         sys.exit(1)
 
     try:
-        send_sysex(sysex_file)
+        force = '--force' in sys.argv[2:]
+        if not send_via_daemon(sysex_file, force):
+            send_sysex(sysex_file, force)
     except Exception as e:
         print(f"Fehler: {e}")
         sys.exit(1)
@@ -4,21 +4,26 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import json
+import queue
 import threading
-import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
 import mido
 
-from dx7utils.common import debug_print, find_sysex_files
+from dx7utils.catalogue import Catalogue, parse_query
+from dx7utils.common import debug_print
+from dx7utils.index import PatchIndex
 from dx7utils.midi_core import (
-    fader_values,
+    FaderJournal,
+    MidiRelay,
+    format_message,
     load_from_json,
-    save_to_json,
-    send_midi_cc,
 )
-from dx7utils.sysex import extract_patch_names
+from dx7utils.virtuallist import VirtualTreeview
+
+LOAD_BATCH_SIZE = 1000
+LOAD_POLL_MS = 50
 
 
 # ──────────────────────────────────────────────
@@ -127,25 +132,36 @@ class ReadSysexUI:
         top = ttk.Frame(root)
         top.pack(fill=tk.X, padx=10, pady=10)
         ttk.Button(top, text="Aktualisieren", command=self.refresh).pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        filter_entry = ttk.Entry(top, textvariable=self.filter_var, width=30)
+        filter_entry.pack(side=tk.LEFT, padx=(10, 0))
+        filter_entry.bind("<Return>", lambda event: self.refresh())
+        ttk.Button(top, text="Filtern", command=self.refresh).pack(side=tk.LEFT, padx=(5, 0))
         self.info_label = ttk.Label(top, text="")
         self.info_label.pack(side=tk.LEFT, padx=10)
 
-        columns = ("file", "patch_nr", "patch_name", "instrument")
-        self.tree = ttk.Treeview(root, columns=columns, show="headings")
-        self.tree.heading("file", text="Datei")
-        self.tree.heading("patch_nr", text="Nr.")
-        self.tree.heading("patch_name", text="Patch-Name")
-        self.tree.heading("instrument", text="Instrument")
-        self.tree.column("file", width=400)
-        self.tree.column("patch_nr", width=50, anchor="center")
-        self.tree.column("patch_name", width=300)
-        self.tree.column("instrument", width=120)
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        self.progress = ttk.Progressbar(top, mode="indeterminate", length=150)
+        self.progress.pack(side=tk.RIGHT)
+
+        self.list_view = VirtualTreeview(
+            root,
+            ("file", "patch_nr", "patch_name", "instrument"),
+            ("Datei", "Nr.", "Patch-Name", "Instrument"),
+            (400, 50, 300, 120),
+            {"patch_nr": "center"},
+        )
+        self.list_view.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        self.load_queue = queue.Queue()
+        self.load_id = 0
+        # ein Index für alle Ladevorgänge; der Lock verhindert, dass zwei Threads gleichzeitig speichern
+        self.index = None
+        self.index_lock = threading.Lock()
+        self.catalogue = Catalogue()
         self.refresh()
 
     def refresh(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        self.load_id += 1
+        self.list_view.clear()
         try:
             with open("data/config.json") as f:
                 config = json.load(f)
@@ -156,18 +172,66 @@ class ReadSysexUI:
         if not directory:
             self.info_label.config(text="Kein Verzeichnis konfiguriert")
             return
-        files = find_sysex_files(directory)
-        count = 0
-        for file_path in files:
+        self.info_label.config(text="Lade Patches ...")
+        self.progress.start(10)
+        thread = threading.Thread(
+            target=self._load_patches, args=(self.load_id, directory, self.filter_var.get().strip()), daemon=True
+        )
+        thread.start()
+        self.root.after(LOAD_POLL_MS, self._pump_patches, self.load_id)
+
+    def _load_patches(self, load_id, directory, filter_text):
+        files = set()
+        batch = []
+        try:
+            with self.index_lock:
+                if load_id != self.load_id:
+                    return
+                if self.index is None or self.index.directory != directory:
+                    self.index = PatchIndex(directory)
+                    self.index.load()
+                index = self.index
+                if filter_text:
+                    index.refresh()
+                    search_term, filters = parse_query(filter_text)
+                    patches = self.catalogue.search(index, search_term, **filters)
+                else:
+                    patches = index.iter_refresh()
+                for file_path, i, name, instrument in patches:
+                    if load_id != self.load_id:
+                        return
+                    files.add(file_path)
+                    batch.append((os.path.relpath(file_path, directory), i, name, instrument, file_path))
+                    if len(batch) >= LOAD_BATCH_SIZE:
+                        self.load_queue.put((load_id, batch, len(files)))
+                        batch = []
+                index.save()
+        except Exception as e:
+            debug_print(f"Fehler beim Laden der Patches: {e}")
+        self.load_queue.put((load_id, batch, len(files)))
+        self.load_queue.put((load_id, None, len(files)))
+
+    def _pump_patches(self, load_id):
+        rows = []
+        while True:
             try:
-                patch_names, instrument = extract_patch_names(file_path)
-                rel = os.path.relpath(file_path, directory)
-                for i, name in enumerate(patch_names, 1):
-                    self.tree.insert("", "end", values=(rel, i, name, instrument))
-                count += 1
-            except Exception:
-                pass
-        self.info_label.config(text=f"{count} Dateien, {len(self.tree.get_children())} Patches")
+                batch_id, batch, count = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+            if batch_id != load_id:
+                continue
+            if batch is None:
+                self.list_view.extend(rows)
+                self.progress.stop()
+                self.info_label.config(text=f"{count} Dateien, {len(self.list_view.model)} Patches")
+                return
+            rows.extend(batch)
+        if load_id != self.load_id:
+            return
+        if rows:
+            self.list_view.extend(rows)
+            self.info_label.config(text=f"Lade Patches ... {len(self.list_view.model)}")
+        self.root.after(LOAD_POLL_MS, self._pump_patches, load_id)
 
 
 # ──────────────────────────────────────────────
@@ -200,9 +264,8 @@ class _MidiRelayUI:
         root.grid_rowconfigure(4, weight=1)
         root.grid_columnconfigure(1, weight=1)
 
-        self.running = False
-        self.thread = None
-        self.current_program = None
+        self.relay = None
+        self.journal = None
         self.refresh_ports()
 
     def refresh_ports(self):
@@ -219,8 +282,8 @@ class _MidiRelayUI:
         self.log_text.config(state=tk.DISABLED)
 
     def toggle(self):
-        if self.running:
-            self.running = False
+        if self.relay is not None:
+            self.stop_relay()
             self.start_btn.config(text="Starten")
             self.status_label.config(text="")
         else:
@@ -228,42 +291,41 @@ class _MidiRelayUI:
             out_port = self.out_var.get()
             if not in_port or not out_port:
                 return
-            self.running = True
+            try:
+                self.start_relay(in_port, out_port)
+            except Exception as e:
+                self.log(f"Fehler: {e}")
+                return
             self.start_btn.config(text="Stoppen")
             self.status_label.config(text=f"{'Debug' if self.debug_mode else 'Verbunden'}: {in_port} -> {out_port}")
-            self.thread = threading.Thread(
-                target=self.run_relay, args=(in_port, out_port), daemon=True
-            )
-            self.thread.start()
 
-    def run_relay(self, in_name, out_name):
+    def start_relay(self, in_name, out_name):
+        outport = mido.open_output(out_name)
         try:
-            with mido.open_input(in_name) as inport, mido.open_output(out_name) as outport:
-                while self.running:
-                    for msg in inport.iter_pending():
-                        prefix = "[Rx] " if self.debug_mode else ""
-                        self.log(f"{prefix}{msg}")
-                        if msg.type in ("pitchwheel", "note_on"):
-                            outport.send(msg)
-                            if self.debug_mode:
-                                self.log(f"[Tx] {msg}")
-                        if msg.type == "program_change" and 0 <= msg.program <= 31:
-                            self.current_program = msg.program
-                            self.log(f"{'[PRG]' if self.debug_mode else ''} Programm {self.current_program}")
-                        if msg.type == "control_change" and self.current_program is not None:
-                            key = f"program_{self.current_program}"
-                            if msg.control != 6:
-                                fader_values[key]["cc_value"] = msg.value
-                                send_midi_cc(outport, self.current_program, msg.value)
-                            elif msg.value != fader_values[key]["fader_value"]:
-                                fader_values[key]["fader_value"] = msg.value
-                                send_midi_cc(outport, self.current_program, msg.value)
-                                self.log(f"Fader {self.current_program} -> {msg.value}")
-                    time.sleep(0.01)
-        except Exception as e:
-            self.log(f"Fehler: {e}")
-        finally:
-            save_to_json()
+            self.relay = MidiRelay(in_name, outport, on_event=self.relay_event).start()
+        except Exception:
+            outport.close()
+            raise
+        self.journal = FaderJournal().start()
+
+    def stop_relay(self):
+        relay, self.relay = self.relay, None
+        relay.stop()
+        relay.output.close()
+        self.journal.close()
+
+    def relay_event(self, event, *args):
+        if event == "receive":
+            self.log(f"{'[Rx] ' if self.debug_mode else ''}{format_message(args[0])}")
+        elif event == "forward":
+            if self.debug_mode:
+                self.log(f"[Tx] {format_message(args[0])}")
+        elif event == "program":
+            self.log(f"{'[PRG]' if self.debug_mode else ''} Programm {args[0]}")
+        elif event == "fader":
+            self.log(f"Fader {args[0]} -> {args[1]}")
+        elif event == "error":
+            self.log(f"Fehler: {args[0]}")
 
 
 # ──────────────────────────────────────────────
@@ -288,9 +350,8 @@ class MidiBackupUI:
         self.log_text = tk.Text(root, height=15, state=tk.DISABLED)
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        self.running = False
-        self.thread = None
-        self.current_program = None
+        self.relay = None
+        self.journal = None
         self.refresh_ports()
 
     def refresh_ports(self):
@@ -309,39 +370,34 @@ class MidiBackupUI:
         self.log_text.config(state=tk.DISABLED)
 
     def toggle(self):
-        if self.running:
-            self.running = False
+        if self.relay is not None:
+            relay, self.relay = self.relay, None
+            relay.stop()
+            self.journal.close()
             self.start_btn.config(text="Starten")
-            self.status_label.config(text="")
+            self.status_label.config(text="Beendet")
         else:
             port_name = self.port_var.get()
             if not port_name:
                 return
-            self.running = True
+            try:
+                self.relay = MidiRelay(port_name, on_event=self.monitor_event).start()
+            except Exception as e:
+                self.log(f"Fehler: {e}")
+                return
+            self.journal = FaderJournal().start()
             self.start_btn.config(text="Stoppen")
             self.status_label.config(text=f"Überwache: {port_name}")
-            self.thread = threading.Thread(target=self.monitor, args=(port_name,), daemon=True)
-            self.thread.start()
 
-    def monitor(self, port_name):
-        try:
-            with mido.open_input(port_name) as inport:
-                while self.running:
-                    for msg in inport.iter_pending():
-                        self.log(f"Empfangen: {msg}")
-                        if msg.type == "program_change" and 0 <= msg.program <= 31:
-                            self.current_program = msg.program
-                            self.log(f"Programm: {self.current_program}")
-                        if msg.type == "control_change" and msg.control == 6 and self.current_program is not None:
-                            key = f"program_{self.current_program}"
-                            fader_values[key]["fader_value"] = msg.value
-                            self.log(f"Fader {self.current_program}: value={msg.value}")
-                    time.sleep(0.01)
-        except Exception as e:
-            self.log(f"Fehler: {e}")
-        finally:
-            save_to_json()
-            self.root.after(0, lambda: self.status_label.config(text="Beendet"))
+    def monitor_event(self, event, *args):
+        if event == "receive":
+            self.log(f"Empfangen: {format_message(args[0])}")
+        elif event == "program":
+            self.log(f"Programm: {args[0]}")
+        elif event == "fader":
+            self.log(f"Fader {args[0]}: value={args[1]}")
+        elif event == "error":
+            self.log(f"Fehler: {args[0]}")
 
 
 # ──────────────────────────────────────────────
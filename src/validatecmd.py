@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+
+from dx7utils.common import load_config_simple, load_scan_workers
+from dx7utils.index import load_index
+from dx7utils.validate import (
+    DEFAULT_QUARANTINE_DIRECTORY,
+    DEFAULT_REPORT_FILE,
+    quarantine,
+    validate_library,
+    write_report,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prüft Prüfsummen und Parameterbereiche aller Bänke der Bibliothek.")
+    parser.add_argument('-r', '--report', default=DEFAULT_REPORT_FILE, help="Datei für den Prüfbericht")
+    parser.add_argument('-q', '--quarantine', nargs='?', const=DEFAULT_QUARANTINE_DIRECTORY,
+                        help=f"Fehlerhafte Dateien verschieben (Standard: {DEFAULT_QUARANTINE_DIRECTORY})")
+    args = parser.parse_args()
+
+    directory = load_config_simple()
+    workers = load_scan_workers()
+    index = load_index(directory, workers=workers, collect_params=True)
+
+    report = validate_library(index)
+    write_report(report, args.report, len(index.entries))
+    for file_path, issues in report.items():
+        print(f"{file_path}: {issues[0]}" + (f" (+{len(issues) - 1} weitere)" if len(issues) > 1 else ""))
+    print(f"{len(report)} von {len(index.entries)} Dateien fehlerhaft, Bericht: {args.report}")
+
+    if args.quarantine and report:
+        moved = quarantine(report, directory, args.quarantine)
+        index.update_paths(moved, workers)
+        index.save()
+        print(f"{len(moved)} Dateien nach {args.quarantine} verschoben.")
+
+    if report:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
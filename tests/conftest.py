@@ -0,0 +1,84 @@
+import io
+import os
+import sys
+import tarfile
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.index import load_index
+
+# Gemeinsame Testbibliothek: relativer Pfad -> Patch-Namen
+DEFAULT_LIBRARY = {
+    'a.syx': ['BRASS 1', 'EPIANO1'],
+    'sub/b.syx': ['STRINGS'],
+}
+
+
+def make_voice(name='INIT VOICE'):
+    voice = bytearray(128)
+    for op in range(6):
+        base = op * 17
+        voice[base:base + 8] = bytes([99, 98, 97, 96, 95, 94, 93, 0])
+        voice[base + 11] = (2 << 2) | 1
+        voice[base + 12] = (7 << 3) | 3
+        voice[base + 13] = (5 << 2) | 2
+        voice[base + 14] = 90 - op
+        voice[base + 15] = (1 << 1) | 0
+        voice[base + 16] = 0
+    voice[110] = 31
+    voice[111] = (1 << 3) | 7
+    voice[116] = (3 << 4) | (4 << 1) | 1
+    voice[117] = 24
+    voice[118:128] = name.ljust(10).encode('ascii')
+    return bytes(voice)
+
+
+def make_bank(names):
+    data = bytearray(b'\xF0\x43\x00\x09\x20\x00')
+    for i in range(32):
+        voice = bytearray(128)
+        name = names[i] if i < len(names) else 'INIT VOICE'
+        voice[118:128] = name.ljust(10).encode('ascii')
+        data += voice
+    data += b'\x00\xF7'
+    return bytes(data)
+
+
+def write_bank(path, names):
+    with open(path, 'wb') as f:
+        f.write(make_bank(names))
+
+
+def write_voices(path, voices):
+    voices = list(voices) + [make_voice()] * (32 - len(voices))
+    with open(path, 'wb') as f:
+        f.write(b'\xF0\x43\x00\x09\x20\x00' + b''.join(voices) + b'\x00\xF7')
+
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def write_tar(path, members):
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def write_library(directory, banks=None):
+    for relative, names in (DEFAULT_LIBRARY if banks is None else banks).items():
+        path = os.path.join(directory, *relative.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_bank(path, names)
+
+
+def build_library(tmpdir, banks=None):
+    library = os.path.join(tmpdir, 'lib')
+    os.makedirs(library, exist_ok=True)
+    write_library(library, banks)
+    return library, load_index(library, os.path.join(tmpdir, 'index.json'))
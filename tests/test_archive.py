@@ -0,0 +1,108 @@
+import os
+import sys
+import tarfile
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils import archive as archive_module
+from dx7utils.archive import materialize, member_path, read_member, read_sysex_bytes, split_member_path
+from dx7utils.index import PatchIndex, load_index
+from tests.conftest import make_bank, write_tar, write_zip
+
+
+class TestMemberPath:
+    def test_split(self):
+        path = member_path('/lib/set.zip', 'banks/rom1.syx')
+        assert split_member_path(path) == ('/lib/set.zip', 'banks/rom1.syx')
+
+    def test_plain_path(self):
+        assert split_member_path('/lib/wow!.syx') == ('/lib/wow!.syx', None)
+
+
+class TestArchiveIndex:
+    def test_indexes_zip_members(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = os.path.join(tmpdir, 'set.zip')
+            write_zip(archive, {'a/rom1.syx': make_bank(['BRASS 1']), 'readme.txt': b'hi'})
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            assert index.files() == [member_path(archive, 'a/rom1.syx')]
+            assert index.search('brass')[0][:3] == (member_path(archive, 'a/rom1.syx'), 1, 'BRASS1')
+
+    def test_indexes_tar_members(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = os.path.join(tmpdir, 'set.tar.gz')
+            write_tar(archive, {'x.syx': make_bank(['PIANO']), 'y.syx': make_bank(['STRINGS'])})
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            assert len(index.files()) == 2
+            assert index.patch_names(member_path(archive, 'y.syx'))[0][0] == 'STRINGS'
+
+    def test_unchanged_archive_is_not_reparsed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_zip(os.path.join(tmpdir, 'set.zip'), {'rom1.syx': make_bank(['BRASS 1'])})
+            index_file = os.path.join(tmpdir, 'index.json')
+            load_index(tmpdir, index_file)
+            index = PatchIndex(tmpdir, index_file)
+            index.load()
+            assert index.refresh() == (0, 0)
+            assert len(index.files()) == 1
+
+    def test_removed_archive_drops_members(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = os.path.join(tmpdir, 'set.zip')
+            write_zip(archive, {'rom1.syx': make_bank(['BRASS 1'])})
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            os.remove(archive)
+            assert index.refresh() == (0, 1)
+            assert index.archives == {}
+
+    def test_read_member_bytes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = os.path.join(tmpdir, 'set.tgz')
+            write_tar(archive, {'rom1.syx': make_bank(['BRASS 1'])})
+            assert read_sysex_bytes(member_path(archive, 'rom1.syx')) == make_bank(['BRASS 1'])
+
+    def test_tar_members_are_read_in_one_pass(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = os.path.join(tmpdir, 'set.tgz')
+            write_tar(archive, {'rom1.syx': make_bank(['BRASS 1']), 'rom2.syx': make_bank(['CLAV'])})
+            opened = []
+            tar_open = tarfile.open
+            monkeypatch.setattr(tarfile, 'open', lambda *args, **kw: opened.append(args) or tar_open(*args, **kw))
+            assert read_member(archive, 'rom2.syx') == make_bank(['CLAV'])
+            assert read_member(archive, 'rom1.syx') == make_bank(['BRASS 1'])
+            assert len(opened) == 1
+
+    def test_tar_cache_is_bounded(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = os.path.join(tmpdir, 'set.tgz')
+            banks = {f'rom{i}.syx': make_bank([f'BANK {i}']) for i in range(4)}
+            write_tar(archive, banks)
+            monkeypatch.setattr(archive_module, 'TAR_CACHE_BYTES', 2 * len(banks['rom0.syx']))
+            monkeypatch.setattr(archive_module, '_tar_cache', {})
+            for name in ('rom3.syx', 'rom0.syx', 'rom2.syx'):
+                assert read_member(archive, name) == banks[name]
+            assert sorted(archive_module._tar_cache['members']) == ['rom0.syx', 'rom1.syx']
+            with pytest.raises(FileNotFoundError):
+                read_member(archive, 'missing.syx')
+
+
+class TestMaterialize:
+    def test_reuses_one_copy_per_member(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            monkeypatch.setattr(archive_module, 'MATERIALIZE_DIRECTORY', os.path.join(tmpdir, 'cache'))
+            archive = os.path.join(tmpdir, 'set.zip')
+            write_zip(archive, {'banks/rom1.syx': make_bank(['BRASS 1'])})
+            path = member_path(archive, 'banks/rom1.syx')
+            target = materialize(path)
+            assert materialize(path) == target
+            assert len(os.listdir(os.path.join(tmpdir, 'cache'))) == 1
+
+            write_zip(archive, {'banks/rom1.syx': make_bank(['CLAV'])})
+            os.utime(archive, ns=(1, 1))
+            assert materialize(path) == target
+            with open(target, 'rb') as f:
+                assert f.read() == make_bank(['CLAV'])
+            assert materialize(os.path.join(tmpdir, 'plain.syx')) == os.path.join(tmpdir, 'plain.syx')
@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.bankwriter import BANK_FILE_SIZE, INIT_VOICE, bank_dump, write_banks
+from dx7utils.index import load_index
+from dx7utils.sysex import VoiceBank, extract_patch_names, unpack_voice
+from dx7utils.validate import check_data
+from tests.conftest import write_bank
+
+
+class TestBankDump:
+    def test_init_voice(self):
+        params = unpack_voice(INIT_VOICE)
+        assert params[145:155] == b'INIT VOICE'
+        assert params[5 * 21 + 16] == 99
+        assert params[144] == 24
+
+    def test_pads_with_init_voice(self):
+        records = np.frombuffer(INIT_VOICE, dtype=np.uint8).copy()
+        records[118:128] = np.frombuffer(b'FIRST     ', dtype=np.uint8)
+        data = bank_dump(records)
+        assert len(data) == BANK_FILE_SIZE
+        assert check_data(data) == []
+        with VoiceBank.from_buffer(data) as bank:
+            assert bank.names()[:2] == [b'FIRST     ', b'INIT VOICE']
+
+
+class TestWriteBanks:
+    def test_groups_are_split_into_banks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library = os.path.join(tmpdir, 'lib')
+            os.makedirs(library)
+            write_bank(os.path.join(library, 'a.syx'), ['BRASS 1', 'EPIANO1'])
+            write_bank(os.path.join(library, 'b.syx'), ['STRINGS'])
+            index = load_index(library, os.path.join(tmpdir, 'index.json'))
+            a, b = (os.path.join(library, name) for name in ('a.syx', 'b.syx'))
+            groups = {
+                'brass/keys': [(b, 1), (a, 2), (a, 1)],
+                'many': [(a, 1)] * 40,
+            }
+            target = os.path.join(tmpdir, 'out')
+            written = write_banks(index, groups, target)
+            assert [os.path.basename(path) for path in written] == ['brass_keys.syx', 'many.syx', 'many_2.syx']
+            assert all(os.path.getsize(path) == BANK_FILE_SIZE for path in written)
+            names, _ = extract_patch_names(written[0])
+            assert names[:4] == ['STRINGS', 'EPIANO1', 'BRASS1', 'INITVOICE']
+            assert extract_patch_names(written[2])[0][:9] == ['BRASS1'] * 8 + ['INITVOICE']
+
+    def test_colliding_names_get_suffix(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library = os.path.join(tmpdir, 'lib')
+            os.makedirs(library)
+            write_bank(os.path.join(library, 'a.syx'), ['BRASS 1', 'EPIANO1', 'STRINGS'])
+            index = load_index(library, os.path.join(tmpdir, 'index.json'))
+            a = os.path.join(library, 'a.syx')
+            groups = {'brass/keys': [(a, 1)], 'brass:keys': [(a, 2)], 'Brass_Keys': [(a, 3)]}
+            written = write_banks(index, groups, os.path.join(tmpdir, 'out'))
+            assert [os.path.basename(path) for path in written] == [
+                'brass_keys.syx', 'brass_keys_2.syx', 'Brass_Keys_3.syx'
+            ]
+            assert [extract_patch_names(path)[0][0] for path in written] == ['BRASS1', 'EPIANO1', 'STRINGS']
+
+    def test_existing_files_are_kept(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library = os.path.join(tmpdir, 'lib')
+            os.makedirs(library)
+            write_bank(os.path.join(library, 'a.syx'), ['BRASS 1', 'EPIANO1'])
+            index = load_index(library, os.path.join(tmpdir, 'index.json'))
+            a = os.path.join(library, 'a.syx')
+            target = os.path.join(tmpdir, 'out')
+            os.makedirs(target)
+            existing = os.path.join(target, 'keys.syx')
+            with open(existing, 'wb') as f:
+                f.write(b'mine')
+            written = write_banks(index, {'keys': [(a, 1)]}, target)
+            assert [os.path.basename(path) for path in written] == ['keys_2.syx']
+            with open(existing, 'rb') as f:
+                assert f.read() == b'mine'
+            assert write_banks(index, {'keys': [(a, 2)]}, target, overwrite=True) == [existing]
+            assert extract_patch_names(existing)[0][0] == 'EPIANO1'
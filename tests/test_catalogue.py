@@ -0,0 +1,102 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.catalogue import FAVOURITE_TAG, Catalogue, parse_query
+from dx7utils.index import load_index
+from tests.conftest import build_library, write_bank
+
+CATALOGUE_LIBRARY = {
+    'factory/rom1/a.syx': ['BRASS 1', 'EPIANO1'],
+    'user/b.syx': ['BRASS 2', 'MY BRASS'],
+}
+
+
+def build_catalogue(tmpdir):
+    library, index = build_library(tmpdir, CATALOGUE_LIBRARY)
+    catalogue = Catalogue(os.path.join(tmpdir, 'catalogue.sqlite'))
+    catalogue.sync(index)
+    return library, index, catalogue
+
+
+class TestParseQuery:
+    def test_filters(self):
+        assert parse_query('brass instrument:"Yamaha DX7" ordner:factory') == (
+            'brass', {'instrument': 'Yamaha DX7', 'folder': 'factory'}
+        )
+
+    def test_plain_colon_is_kept(self):
+        assert parse_query('a:b') == ('a:b', {})
+
+
+class TestCatalogue:
+    def test_name_query_ranks_prefix_first(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index, catalogue = build_catalogue(tmpdir)
+            with catalogue:
+                names = [patch[2] for patch in catalogue.query('brass')]
+                assert names == ['BRASS1', 'BRASS2', 'MYBRASS']
+
+    def test_folder_filter_includes_subfolders(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index, catalogue = build_catalogue(tmpdir)
+            with catalogue:
+                results = catalogue.query('brass', folder='factory')
+                assert [patch[2] for patch in results] == ['BRASS1']
+                assert results[0][0] == os.path.join(library, 'factory', 'rom1', 'a.syx')
+
+    def test_instrument_filter(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index, catalogue = build_catalogue(tmpdir)
+            with catalogue:
+                assert catalogue.query('brass', instrument='dx7')
+                assert catalogue.query('brass', instrument='TX816') == []
+                assert catalogue.instruments() == ["Yamaha DX7"]
+
+    def test_favourites_survive_resync(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index, catalogue = build_catalogue(tmpdir)
+            with catalogue:
+                path = os.path.join(library, 'user', 'b.syx')
+                assert catalogue.toggle_tag(index.voice_hash(path, 2))
+                write_bank(os.path.join(library, 'user', 'b.syx'), ['BRASS 2', 'MY BRASS', 'NEW'])
+                os.utime(path, ns=(1, 1))
+                index.refresh()
+                assert catalogue.sync(index) == (1, 0)
+                assert [patch[2] for patch in catalogue.query(tag=FAVOURITE_TAG)] == ['MYBRASS']
+
+    def test_removed_files_leave_catalogue(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index, catalogue = build_catalogue(tmpdir)
+            with catalogue:
+                os.remove(os.path.join(library, 'user', 'b.syx'))
+                index.refresh()
+                assert catalogue.sync(index) == (0, 1)
+                assert [patch[2] for patch in catalogue.query('brass')] == ['BRASS1']
+
+    def test_new_index_object_is_synced(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index, catalogue = build_catalogue(tmpdir)
+            with catalogue:
+                write_bank(os.path.join(library, 'user', 'c.syx'), ['BRASS 3'])
+                fresh = load_index(library, os.path.join(tmpdir, 'index.json'))
+                fresh.generation = index.generation
+                assert fresh.token != index.token
+                assert catalogue.sync(fresh) == (1, 0)
+                assert 'BRASS3' in [patch[2] for patch in catalogue.query('brass')]
+
+    def test_ranked_keys(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index, catalogue = build_catalogue(tmpdir)
+            with catalogue:
+                results = catalogue.query(keys=['mybrass', 'brass1'], folder='user')
+                assert [patch[2] for patch in results] == ['MYBRASS']
+
+    def test_fuzzy_search_uses_name_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index, catalogue = build_catalogue(tmpdir)
+            with catalogue:
+                results = catalogue.search(index, 'brss', 'fuzzy', folder='user')
+                assert [patch[2] for patch in results] == ['BRASS2', 'MYBRASS']
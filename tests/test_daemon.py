@@ -0,0 +1,62 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.daemon import query_daemon
+from tests.conftest import write_bank
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="Unix-Sockets nicht verfügbar")
+class TestDaemon:
+    def test_queries_and_fallback(self):
+        from src.dx7daemon import DaemonServer, DaemonState
+        from src.patchsearchercmd import iter_daemon_results
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            orig_dir = os.getcwd()
+            try:
+                os.chdir(tmpdir)
+                os.makedirs('lib')
+                write_bank(os.path.join('lib', 'a.syx'), ['BRASS 1', 'EPIANO1'])
+                socket_file = os.path.join(tmpdir, 'dx7d.sock')
+                assert query_daemon('ping', socket_file) is None
+
+                state = DaemonState(os.path.join(tmpdir, 'lib'))
+                state.index.refresh()
+                server = DaemonServer(socket_file, state)
+                thread = threading.Thread(target=server.serve_forever, daemon=True)
+                thread.start()
+                try:
+                    assert list(query_daemon('ping', socket_file))[0]['files'] == 1
+                    results = list(query_daemon('search', socket_file, queries=['brass', 'epiano instrument:dx7']))
+                    assert [(result[0], result[3]) for result in results] == [
+                        ('brass', 'BRASS1'), ('epiano instrument:dx7', 'EPIANO1')
+                    ]
+                    path, instrument, names = list(query_daemon('patch_names', socket_file))[0]
+                    assert names[:2] == ['BRASS1', 'EPIANO1']
+
+                    consumed = []
+
+                    def queries():
+                        for query in ['brass', 'epiano', 'nothing']:
+                            consumed.append(query)
+                            yield query
+
+                    results = iter_daemon_results(queries(), 'substring', socket_file=socket_file, chunk_size=1)
+                    assert next(results)[1][2] == 'BRASS1'
+                    assert consumed == ['brass']
+                    assert [result[1][2] for result in results] == ['EPIANO1']
+                    with pytest.raises(RuntimeError):
+                        list(query_daemon('unknown', socket_file))
+                finally:
+                    server.shutdown()
+                    server.server_close()
+                    state.catalogue.close()
+            finally:
+                os.chdir(orig_dir)
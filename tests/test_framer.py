@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.framer import FORMAT_VCED, FORMAT_VMEM, checksum, iter_frames, iter_messages
+from dx7utils.sysex import VoiceBank, extract_bank_info, pack_voice, unpack_voice
+from tests.conftest import make_voice
+
+
+def vmem_dump(names, valid_checksum=True):
+    payload = b''.join(make_voice(name) for name in names)
+    check = checksum(payload) if valid_checksum else (checksum(payload) + 1) & 0x7F
+    return b'\xF0\x43\x00\x09\x20\x00' + payload + bytes([check]) + b'\xF7'
+
+
+def vced_dump(name):
+    payload = bytes(unpack_voice(make_voice(name)))
+    return b'\xF0\x43\x00\x00\x01\x1B' + payload + bytes([checksum(payload)]) + b'\xF7'
+
+
+def write_file(tmpdir, data):
+    path = os.path.join(tmpdir, 'dump.syx')
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+class TestIterMessages:
+    def test_boundaries(self):
+        data = b'junk\xF0\x01\x02\xF7xx\xF0\x03\xF7'
+        assert list(iter_messages(data)) == [(4, 8), (10, 13)]
+
+    def test_unterminated_message_is_cut_at_next_start(self):
+        data = b'\xF0\x01\x02\xF0\x03\xF7'
+        assert list(iter_messages(data)) == [(0, 3), (3, 6)]
+
+
+class TestIterFrames:
+    def test_vmem_header(self):
+        frames = list(iter_frames(vmem_dump([f'V{i}' for i in range(32)])))
+        assert len(frames) == 1
+        assert frames[0].format == FORMAT_VMEM
+        assert frames[0].byte_count == 4096
+        assert frames[0].checksum_ok
+
+    def test_bad_checksum(self):
+        frames = list(iter_frames(vmem_dump([f'V{i}' for i in range(32)], valid_checksum=False)))
+        assert not frames[0].checksum_ok
+
+    def test_vced_header(self):
+        frames = list(iter_frames(vced_dump('SOLO')))
+        assert frames[0].format == FORMAT_VCED
+        assert frames[0].length == 155
+
+    def test_skips_foreign_messages(self):
+        assert list(iter_frames(b'\xF0\x7E\x00\x06\x01\x00\x00\xF7')) == []
+
+
+class TestFramedVoiceBank:
+    def test_concatenated_banks_with_junk(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data = vmem_dump([f'A{i}' for i in range(32)]) + b'\x00' * 17 + vmem_dump([f'B{i}' for i in range(32)])
+            with VoiceBank.from_file(write_file(tmpdir, data + b'trailing')) as bank:
+                assert len(bank) == 64
+                assert bank.names()[32] == b'B0        '
+                assert bytes(bank.voice(33)) == make_voice('B1')
+                assert bank.checksum_errors == 0
+
+    def test_single_voice_dump(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = write_file(tmpdir, vced_dump('SOLO'))
+            info = extract_bank_info(path)
+            assert info['instrument'] == "Yamaha TX7"
+            assert info['names'] == ['SOLO']
+
+    def test_checksum_errors_reported(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = write_file(tmpdir, vmem_dump(['X'] * 32, valid_checksum=False))
+            assert extract_bank_info(path)['checksum_errors'] == 1
+
+
+class TestPackVoice:
+    def test_roundtrip(self):
+        voice = make_voice('E.PIANO 1')
+        assert bytes(pack_voice(unpack_voice(voice))) == voice
@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.index import PatchIndex, load_index
+from tests.conftest import write_bank
+
+
+class TestPatchIndex:
+    def test_builds_and_saves_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_bank(os.path.join(tmpdir, 'a.syx'), ['BRASS 1', 'EPIANO1'])
+            index_file = os.path.join(tmpdir, 'data', 'index.json')
+            index = load_index(tmpdir, index_file)
+            assert os.path.isfile(index_file)
+            names, instrument = index.patch_names(os.path.join(tmpdir, 'a.syx'))
+            assert names[:2] == ['BRASS1', 'EPIANO1']
+            assert instrument == "Yamaha DX7"
+
+    def test_unchanged_files_are_not_reparsed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_bank(os.path.join(tmpdir, 'a.syx'), ['BRASS 1'])
+            index_file = os.path.join(tmpdir, 'index.json')
+            load_index(tmpdir, index_file)
+
+            index = PatchIndex(tmpdir, index_file)
+            index.load()
+            assert index.refresh() == (0, 0)
+
+    def test_detects_changed_and_removed_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path_a = os.path.join(tmpdir, 'a.syx')
+            path_b = os.path.join(tmpdir, 'b.syx')
+            write_bank(path_a, ['BRASS 1'])
+            write_bank(path_b, ['STRINGS'])
+            index_file = os.path.join(tmpdir, 'index.json')
+            load_index(tmpdir, index_file)
+
+            write_bank(path_a, ['CLAV 1'])
+            os.utime(path_a, ns=(0, 1))
+            os.remove(path_b)
+            index = load_index(tmpdir, index_file)
+            assert index.files() == [path_a]
+            assert index.patch_names(path_a)[0][0] == 'CLAV1'
+
+    def test_other_directory_rebuilds(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_bank(os.path.join(tmpdir, 'a.syx'), ['BRASS 1'])
+            index_file = os.path.join(tmpdir, 'index.json')
+            load_index(tmpdir, index_file)
+
+            index = PatchIndex(os.path.join(tmpdir, 'other'), index_file)
+            index.load()
+            assert index.entries == {}
+
+    def test_hashes_are_kept_out_of_the_json(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'a.syx')
+            write_bank(path, ['BRASS 1'])
+            index_file = os.path.join(tmpdir, 'index.json')
+            first = load_index(tmpdir, index_file)
+            with open(index_file) as f:
+                assert 'hashes' not in json.load(f)['files'][path]
+
+            index = PatchIndex(tmpdir, index_file)
+            index.load()
+            assert index.voice_hash(path, 1) == first.voice_hash(path, 1)
+            assert len(index.voice_hash(path, 1, include_name=False)) == 16
+
+            os.remove(index.hashes_file)
+            index = PatchIndex(tmpdir, index_file)
+            index.load()
+            assert index.refresh() == (1, 0)
+            assert index.voice_hash(path, 1) == first.voice_hash(path, 1)
+
+    def test_search(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'a.syx')
+            write_bank(path, ['BRASS 2', 'brass 1', 'EPIANO1'])
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            results = index.search('BRASS')
+            assert results == [
+                (path, 2, 'brass1', 'Yamaha DX7'),
+                (path, 1, 'BRASS2', 'Yamaha DX7'),
+            ]
+
+
+class TestDuplicates:
+    def test_collapse_duplicates_across_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path_a = os.path.join(tmpdir, 'a.syx')
+            path_b = os.path.join(tmpdir, 'b.syx')
+            write_bank(path_a, ['EPIANO1', 'BRASS 1'])
+            write_bank(path_b, ['EPIANO1', 'BRASS 9'])
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+
+            assert index.voice_hash(path_a, 1) == index.voice_hash(path_b, 1)
+            assert index.voice_hash(path_a, 2) != index.voice_hash(path_b, 2)
+            assert index.voice_hash(path_a, 2, include_name=False) == index.voice_hash(path_b, 2, include_name=False)
+
+            rows = index.collapse_duplicates(index.search('EPIANO'))
+            assert rows == [(path_a, 1, 'EPIANO1', 'Yamaha DX7', 2)]
+            rows = index.collapse_duplicates(index.search('BRASS'))
+            assert len(rows) == 2
+            rows = index.collapse_duplicates(index.search('BRASS'), include_name=False)
+            assert rows == [(path_a, 2, 'BRASS1', 'Yamaha DX7', 2)]
+
+            hashes = index.voice_hash(path_a, 1)
+            assert list(index.iter_collapsed(index.search('EPIANO'))) == [
+                ((path_a, 1, 'EPIANO1', 'Yamaha DX7'), hashes, 1), (None, hashes, 2),
+            ]
@@ -0,0 +1,118 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils import matrix as matrix_module
+from dx7utils.framer import FORMAT_VCED, iter_frames
+from dx7utils.index import PatchIndex, load_index
+from dx7utils.matrix import PARAMETER_MAXIMA, PARAMETER_OFFSETS, VoiceMatrix, pack_voices, unpack_voices, vced_messages
+from dx7utils.sysex import pack_voice, unpack_voice
+from tests.conftest import make_voice, write_voices
+
+
+def with_algorithm(voice, algorithm):
+    voice = bytearray(voice)
+    voice[110] = algorithm
+    return bytes(voice)
+
+
+class TestUnpackVoices:
+    def test_matches_scalar_unpack(self):
+        rng = np.random.default_rng(7)
+        records = rng.integers(0, 128, size=(50, 128), dtype=np.uint8)
+        params = unpack_voices(records)
+        assert params.shape == (50, 155)
+        for record, row in zip(records, params):
+            assert bytes(row) == bytes(unpack_voice(bytes(record)))
+
+    def test_pack_matches_scalar_pack(self):
+        rng = np.random.default_rng(11)
+        params = rng.integers(0, PARAMETER_MAXIMA.astype(np.int64) + 1, size=(50, 155)).astype(np.uint8)
+        records = pack_voices(params)
+        assert records.shape == (50, 128)
+        for row, record in zip(params, records):
+            assert bytes(record) == bytes(pack_voice(bytes(row)))
+        assert np.array_equal(unpack_voices(records), params)
+
+    def test_vced_messages(self):
+        params = unpack_voices(np.frombuffer(make_voice('BRASS 1') * 3, dtype=np.uint8))
+        messages = vced_messages(params, channel=2)
+        assert messages.shape == (3, 163)
+        frames = list(iter_frames(messages.tobytes()))
+        assert [(frame.format, frame.byte_count, frame.checksum_ok) for frame in frames] == [
+            (FORMAT_VCED, 155, True)
+        ] * 3
+        assert messages[0, 2] == 2
+
+    def test_parameter_offsets(self):
+        assert PARAMETER_OFFSETS['op6_eg_rate_1'] == 0
+        assert PARAMETER_OFFSETS['op1_output_level'] == 5 * 21 + 16
+        assert PARAMETER_OFFSETS['algorithm'] == 134
+        assert PARAMETER_OFFSETS['transpose'] == 144
+
+
+class TestVoiceMatrix:
+    def test_built_saved_and_reused(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path_a = os.path.join(tmpdir, 'a.syx')
+            path_b = os.path.join(tmpdir, 'b.syx')
+            write_voices(path_a, [with_algorithm(make_voice('BRASS 1'), 4)])
+            write_voices(path_b, [make_voice('EPIANO 1')])
+            index_file = os.path.join(tmpdir, 'data', 'index.json')
+            index = load_index(tmpdir, index_file)
+
+            matrix = index.voice_matrix()
+            assert matrix.params.shape == (64, 155)
+            assert os.path.isfile(index.matrix_file)
+            assert matrix.locate(32) == (path_b, 1)
+            assert matrix.names([0, 32]) == ['BRASS 1   ', 'EPIANO 1  ']
+            assert list(matrix.select(algorithm=4)) == [0]
+            assert matrix.histogram('algorithm')[4] == 1
+
+            loaded = VoiceMatrix.load(index.matrix_file)
+            assert loaded.files == matrix.files
+            assert np.array_equal(loaded.params, matrix.params)
+
+            index = PatchIndex(tmpdir, index_file)
+            index.load()
+            index.refresh()
+            assert index.voice_matrix().files == [path_a, path_b]
+
+    def test_refresh_fills_matrix_without_rereading(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'a.syx')
+            write_voices(path, [with_algorithm(make_voice('BRASS 1'), 4)])
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'), collect_params=True)
+            assert 'params' not in index.entries[path]
+
+            def fail(*args):
+                raise AssertionError("Datei erneut gelesen")
+
+            monkeypatch.setattr(matrix_module, 'load_voice_records', fail)
+            matrix = index.voice_matrix()
+            assert list(matrix.select(algorithm=4)) == [0]
+            assert index.fresh_params == {}
+
+    def test_name_only_refresh_keeps_no_params(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'a.syx')
+            write_voices(path, [make_voice('BRASS 1')])
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            assert index.fresh_params == {}
+            assert len(index.voice_matrix()) == 32
+            write_voices(path, [make_voice('BRASS 2')])
+            os.utime(path, ns=(1, 1))
+            index.refresh()
+            assert list(index.fresh_params) == [path]
+
+    def test_search_with_parameter_criteria(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'a.syx')
+            write_voices(path, [with_algorithm(make_voice('BRASS 1'), 4), make_voice('BRASS 2')])
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            assert [r[1] for r in index.search('brass')] == [1, 2]
+            assert [r[1] for r in index.search('brass', algorithm=4)] == [1]
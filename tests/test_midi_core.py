@@ -0,0 +1,361 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import mido
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils import midi_core
+from dx7utils.midi_core import (
+    FaderJournal,
+    FaderState,
+    MidiRelay,
+    RawOutput,
+    format_message,
+    journal_file_name,
+    load_from_json,
+    retired_journal_name,
+    save_to_json,
+)
+
+
+class FakeInput:
+    def __init__(self, name, callback):
+        self.name = name
+        self.callback = callback
+        self.closed = False
+
+    def feed(self, msg):
+        if not self.closed:
+            self.callback(msg)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRtMidiIn:
+    def __init__(self):
+        self.callback = None
+
+    def cancel_callback(self):
+        self.callback = None
+
+    def set_callback(self, callback):
+        self.callback = callback
+
+
+class FakeRtInput(FakeInput):
+    def __init__(self, name, callback):
+        super().__init__(name, callback)
+        self._rt = FakeRtMidiIn()
+        self._callback_lock = threading.RLock()
+
+
+class FakeRtMidiOut:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, data):
+        self.sent.append(bytes(data))
+
+
+class FakeRtOutput:
+    def __init__(self):
+        self._rt = FakeRtMidiOut()
+        self._send_lock = threading.RLock()
+
+
+class FakeOutput:
+    def __init__(self):
+        self.sent = []
+        self.threads = []
+
+    def send(self, msg):
+        self.threads.append(threading.get_ident())
+        self.sent.append(msg)
+
+
+@pytest.fixture
+def ports(monkeypatch):
+    opened = []
+
+    def open_input(name, callback=None):
+        port = FakeInput(name, callback)
+        opened.append(port)
+        return port
+
+    monkeypatch.setattr(mido, 'open_input', open_input)
+    monkeypatch.setattr(midi_core, 'fader_state', FaderState())
+    return opened
+
+
+class TestMidiRelay:
+    def test_relay_rules(self, ports):
+        output = FakeOutput()
+        events = []
+        relay = MidiRelay('DX7', output, on_event=lambda *args: events.append(args)).start()
+        inport = ports[0]
+        inport.feed(mido.Message('control_change', control=6, value=10))
+        inport.feed(mido.Message('note_on', note=60))
+        inport.feed(mido.Message('program_change', program=3))
+        inport.feed(mido.Message('control_change', control=6, value=80))
+        inport.feed(mido.Message('control_change', control=6, value=80))
+        inport.feed(mido.Message('control_change', control=1, value=20))
+        inport.feed(mido.Message('program_change', program=40))
+
+        assert [(msg.type, getattr(msg, 'control', None), getattr(msg, 'value', None)) for msg in output.sent] == [
+            ('note_on', None, None), ('control_change', 3, 80), ('control_change', 3, 20),
+        ]
+        assert midi_core.fader_state.to_dict()['program_3'] == {'fader_value': 80, 'cc_value': 20}
+        assert ('fader', 3, 80, 0) in events and ('cc', 3, 80, 20) in events
+        assert relay.current_program == 3
+
+    def test_monitor_records_fader_only(self, ports):
+        events = []
+        with MidiRelay('DX7', on_event=lambda *args: events.append(args)):
+            inport = ports[0]
+            inport.feed(mido.Message('program_change', program=5))
+            inport.feed(mido.Message('control_change', control=6, value=7))
+            inport.feed(mido.Message('control_change', control=6, value=7))
+            inport.feed(mido.Message('control_change', control=2, value=99))
+        assert inport.closed
+        assert midi_core.fader_state.to_dict()['program_5'] == {'fader_value': 7, 'cc_value': 0}
+        assert [event for event in events if event[0] == 'fader'] == [('fader', 5, 7, 0)] * 2
+
+    def test_stop_releases_wait(self, ports):
+        relay = MidiRelay('DX7').start()
+        waiter = threading.Thread(target=relay.wait)
+        waiter.start()
+        relay.stop()
+        waiter.join(timeout=2)
+        assert not waiter.is_alive()
+        assert ports[0].closed
+
+    def test_errors_are_reported(self, ports):
+        class BrokenOutput:
+            def send(self, msg):
+                raise OSError("Port weg")
+
+        events = []
+        MidiRelay('DX7', BrokenOutput(), on_event=lambda *args: events.append(args)).start()
+        ports[0].feed(mido.Message('note_on', note=60))
+        assert events[-1][0] == 'error'
+
+    def test_no_added_latency(self, ports):
+        output = FakeOutput()
+        MidiRelay('DX7', output).start()
+        delivered = []
+
+        def backend():
+            # Weitergeleitet wird im Callback selbst: nach jedem feed() ist die Nachricht schon gesendet
+            for value in range(200):
+                ports[0].feed(mido.Message('note_on', note=value % 128))
+                delivered.append(len(output.sent))
+
+        thread = threading.Thread(target=backend)
+        thread.start()
+        thread.join()
+        assert delivered == list(range(1, 201))
+        assert set(output.threads) == {thread.ident}
+
+    def test_rule_tables(self, ports):
+        relay = MidiRelay('DX7', FakeOutput())
+        assert relay.status_rules[0x93] == relay._forward
+        assert relay.status_rules[0xEF] == relay._forward
+        assert relay.status_rules[0xB5] == relay._control_change
+        assert relay.status_rules[0x80] is None and relay.status_rules[0xF0] is None
+        assert relay.control_rules[6] == relay._fader
+        assert relay.control_rules[7] == relay._capture_cc
+        monitor = MidiRelay('DX7')
+        assert monitor.status_rules[0x90] is None and monitor.control_rules[7] is None
+
+    def test_rtmidi_raw_input(self, ports, monkeypatch):
+        monkeypatch.setattr(mido, 'open_input', lambda name, callback=None: ports.append(FakeRtInput(name, callback))
+                            or ports[-1])
+        output = FakeOutput()
+        events = []
+        MidiRelay('DX7', output, on_event=lambda *args: events.append(args)).start()
+        raw = ports[0]._rt.callback
+        raw(([0xC1, 4], 0.0))
+        raw(([0xB1, 6, 50], 0.001))
+        raw(([0x91, 60, 100], 0.001))
+        assert midi_core.fader_state.fader[4] == 50
+        assert [msg.type for msg in output.sent] == ['control_change', 'note_on']
+        assert format_message(events[0][1]) == 'program_change channel=1 program=4 time=0'
+        assert format_message([0xF4]) == 'F4'
+
+    def test_rtmidi_raw_output(self, ports, monkeypatch):
+        output = FakeRtOutput()
+        relay = MidiRelay('DX7', output).start()
+        monkeypatch.setattr(mido, 'Message', None)
+        relay.handle_bytes([0xC0, 7])
+        relay.handle_bytes([0xB0, 6, 64])
+        relay.handle_bytes([0xB0, 6, 65])
+        relay.handle_bytes([0xB0, 11, 3])
+        relay.handle_bytes([0xE0, 0, 64])
+        assert output._rt.sent == [b'\xb0\x07\x40', b'\xb0\x07\x41', b'\xb0\x07\x03', b'\xe0\x00\x40']
+
+    def test_rtmidi_internals_missing(self, ports, monkeypatch):
+        class PartialRtInput(FakeInput):
+            def __init__(self, name, callback):
+                super().__init__(name, callback)
+                self._rt = FakeRtMidiIn()
+
+        class PartialRtOutput(FakeOutput):
+            _rt = FakeRtMidiOut()
+
+        monkeypatch.setattr(mido, 'open_input', lambda name, callback=None: ports.append(PartialRtInput(name, callback))
+                            or ports[-1])
+        output = PartialRtOutput()
+        MidiRelay('DX7', output).start()
+        assert ports[0]._rt.callback is None
+        ports[0].feed(mido.Message('note_on', note=60))
+        assert [msg.type for msg in output.sent] == ['note_on'] and output._rt.sent == []
+
+    def test_mido_fallback_output(self):
+        output = FakeOutput()
+        sender = RawOutput(output)
+        sender.send_cc(5, 100)
+        sender.send_bytes([0x90, 60, 1])
+        assert [msg.bytes() for msg in output.sent] == [[0xB0, 5, 100], [0x90, 60, 1]]
+
+
+class TestFaderState:
+    def test_snapshots_are_versioned_and_immutable(self):
+        state = FaderState()
+        first = state.snapshot()
+        assert state.set_fader(3, 90) == 0
+        assert state.set_fader(3, 90) == 90
+        state.set_cc(3, 12)
+        second = state.snapshot()
+        assert first.fader[3] == 0 and second.fader[3] == 90 and second.cc[3] == 12
+        assert second.version == first.version + 2
+        with pytest.raises(TypeError):
+            second.fader[3] = 1
+
+    def test_json_round_trip_and_legacy_values(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_name = os.path.join(tmpdir, 'data', 'fader_values.json')
+            state = FaderState()
+            state.set_fader(31, 127)
+            state.set_cc(0, 5)
+            save_to_json(file_name, state)
+            with open(file_name) as f:
+                data = json.load(f)
+            assert len(data) == 32
+            assert data['program_31'] == {'fader_value': 127, 'cc_value': 0}
+
+            data['program_2'] = 40
+            data['program_99'] = 1
+            with open(file_name, 'w') as f:
+                json.dump(data, f)
+            loaded = FaderState()
+            load_from_json(file_name, loaded)
+            assert loaded.to_dict() == {**state.to_dict(), 'program_2': {'fader_value': 40, 'cc_value': 0}}
+
+
+class TestFaderJournal:
+    def test_replay_after_crash(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_name = os.path.join(tmpdir, 'data', 'fader_values.json')
+            state = FaderState()
+            journal = FaderJournal(state, file_name, flush_interval=0.01).start()
+            for value in range(100):
+                state.set_fader(2, value)
+            state.set_cc(9, 33)
+            deadline = time.time() + 2
+            while journal.written.version != state.version:
+                assert time.time() < deadline
+                time.sleep(0.01)
+            assert not os.path.exists(file_name)
+
+            restored = FaderState()
+            load_from_json(file_name, restored)
+            assert restored.fader[2] == 99 and restored.cc[9] == 33
+
+            journal.close()
+            assert not os.path.exists(journal.journal_file)
+            with open(file_name) as f:
+                assert json.load(f)['program_2'] == {'fader_value': 99, 'cc_value': 0}
+
+    def test_compaction_and_torn_record(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_name = os.path.join(tmpdir, 'fader_values.json')
+            state = FaderState()
+            journal = FaderJournal(state, file_name, compact_size=9)
+            for value in (1, 2, 3):
+                state.set_fader(0, value)
+                journal.flush()
+            assert not os.path.exists(journal.journal_file)
+            state.set_cc(1, 7)
+            journal.flush()
+            with open(journal.journal_file, 'ab') as f:
+                f.write(bytes((0, 1)))
+
+            restored = FaderState()
+            load_from_json(file_name, restored)
+            assert (restored.fader[0], restored.cc[1], restored.fader[1]) == (3, 7, 0)
+
+    def test_save_discards_stale_journal(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_name = os.path.join(tmpdir, 'fader_values.json')
+            state = FaderState()
+            journal = FaderJournal(state, file_name)
+            state.set_fader(4, 10)
+            journal.flush()
+            state.set_fader(4, 20)
+            save_to_json(file_name, state)
+            restored = FaderState()
+            load_from_json(file_name, restored)
+            assert restored.fader[4] == 20
+
+    def test_crash_during_compaction_never_replays_old_records(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_name = os.path.join(tmpdir, 'fader_values.json')
+            state = FaderState()
+            state.set_fader(1, 10)
+            save_to_json(file_name, state)
+            stale = bytes((0, 1, 20))
+
+            # Absturz nach dem Beiseitelegen des Journals, vor dem Ersetzen der JSON-Datei
+            state.set_fader(1, 30)
+            with open(file_name + '.tmp', 'w') as f:
+                json.dump(state.to_dict(), f)
+            with open(retired_journal_name(file_name), 'wb') as f:
+                f.write(stale)
+            restored = FaderState()
+            load_from_json(file_name, restored)
+            assert restored.fader[1] == 30
+            assert not os.path.exists(retired_journal_name(file_name))
+
+            # Absturz nach dem Ersetzen, vor dem Löschen des alten Journals
+            with open(retired_journal_name(file_name), 'wb') as f:
+                f.write(stale)
+            restored = FaderState()
+            load_from_json(file_name, restored)
+            assert restored.fader[1] == 30
+            assert not os.path.exists(journal_file_name(file_name))
+
+    def test_each_journal_is_woken(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state = FaderState()
+            journals = [FaderJournal(state, os.path.join(tmpdir, f'{name}.json'), flush_interval=0.01).start()
+                        for name in ('relay', 'backup')]
+            try:
+                assert journals[0].changed is not journals[1].changed
+                for value in range(1, 20):
+                    state.set_fader(0, value)
+                    time.sleep(0.002)
+                deadline = time.time() + 2
+                while any(journal.written.version != state.version for journal in journals):
+                    assert time.time() < deadline
+                    time.sleep(0.01)
+            finally:
+                for journal in journals:
+                    journal.close()
+            assert state.listeners == ()
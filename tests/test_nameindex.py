@@ -0,0 +1,129 @@
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils import nameindex
+from dx7utils.index import load_index
+from dx7utils.nameindex import build_name_index, load_name_index, normalize_name, substring_distance
+from tests.conftest import write_bank
+
+
+def make_names(names):
+    return build_name_index({'bank.syx': {'names': names}})
+
+
+class TestNormalizeName:
+    def test_lowercase_alphanumeric(self):
+        assert normalize_name('Brass 1!') == 'brass1'
+
+
+class TestSubstringDistance:
+    def test_insertion(self):
+        assert substring_distance('brss', 'brass1', 2) == 1
+
+    def test_exact_substring(self):
+        assert substring_distance('piano', 'epiano1', 2) == 0
+
+    def test_limit(self):
+        assert substring_distance('zzzz', 'brass1', 1) == 2
+
+
+class TestNameIndex:
+    def test_prefix(self):
+        names = make_names(['BRASS1', 'BRASS2', 'EBRASS', 'STRINGS'])
+        assert [key for key, _ in names.query('bra', 'prefix')] == ['brass1', 'brass2']
+
+    def test_substring_ranking(self):
+        names = make_names(['EBRASS', 'BRASS2', 'BRASS', 'STRINGS'])
+        assert [key for key, _ in names.query('brass')] == ['brass', 'brass2', 'ebrass']
+
+    def test_fuzzy(self):
+        names = make_names(['BRASS1', 'STRINGS', 'EPIANO1'])
+        assert [key for key, _ in names.query('brss', 'fuzzy')] == ['brass1']
+        assert names.query('brss', 'substring') == []
+
+    def test_fuzzy_ranks_exact_first(self):
+        names = make_names(['BRAS', 'BRASS1', 'BRUSH'])
+        assert [key for key, _ in names.query('bras', 'fuzzy')] == ['bras', 'brass1', 'brush']
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            make_names(['BRASS1']).query('brass', 'regex')
+
+    def test_add_and_remove_file(self):
+        names = make_names(['BRASS1'])
+        names.add_file('other.syx', ['BRASS1', 'CLAV'])
+        assert list(names.matches('brass')) == [('bank.syx', 1, (1, 0, 0)), ('other.syx', 1, (1, 0, 0))]
+        names.remove_file('bank.syx', ['BRASS1'])
+        names.remove_file('other.syx', ['BRASS1', 'CLAV'])
+        assert len(names) == 0
+        assert names.query('') == []
+
+    def test_short_terms_are_capped(self, monkeypatch):
+        monkeypatch.setattr(nameindex, 'SHORT_TERM_LIMIT', 3)
+        names = make_names(['ABBA', 'AB', 'CAB', 'XAB', 'ZAB', 'BAR'])
+        assert [key for key, _ in names.query('ab')] == ['ab', 'abba', 'cab']
+        assert [key for key, _ in names.query('b')] == ['bar']
+
+    def test_fuzzy_candidates_are_bounded(self, monkeypatch):
+        rng = random.Random(3)
+        letters = 'abcdefghijklmnopqrstuvwxyz0123456789'
+        entries = {
+            f'{i}.syx': {'names': [''.join(rng.choice(letters) for _ in range(8)) for _ in range(32)]}
+            for i in range(100)
+        }
+        entries['brass.syx'] = {'names': ['BRASS1']}
+        names = build_name_index(entries)
+        calls = []
+        distance = nameindex.substring_distance
+        monkeypatch.setattr(nameindex, 'FUZZY_CANDIDATE_LIMIT', 20)
+        monkeypatch.setattr(nameindex, 'substring_distance', lambda *args: calls.append(args) or distance(*args))
+        assert ('brass1', (nameindex.FUZZY, 1, 0)) in names.query('brss', 'fuzzy')
+        assert len(calls) <= 20
+
+
+class TestNameIndexFile:
+    def test_saved_index_picks_up_changes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            names_file = os.path.join(tmpdir, 'name_index.npz')
+            entries = {
+                'a.syx': {'names': ['BRASS1'], 'size': 10, 'mtime': 1},
+                'b.syx': {'names': ['CLAV'], 'size': 10, 'mtime': 1},
+            }
+            build_name_index(entries).save(names_file)
+            entries['a.syx'] = {'names': ['EPIANO'], 'size': 10, 'mtime': 2}
+            del entries['b.syx']
+            entries['c.syx'] = {'names': ['BRASS2'], 'size': 10, 'mtime': 1}
+            names = load_name_index(names_file, entries)
+            assert list(names.matches('brass')) == [('c.syx', 1, (1, 0, 0))]
+            assert list(names.matches('epiano')) == [('a.syx', 1, (0, 0, 0))]
+            assert names.query('clav') == [] and len(names) == 2
+
+    def test_unreadable_file_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            names_file = os.path.join(tmpdir, 'name_index.npz')
+            with open(names_file, 'wb') as f:
+                f.write(b'kaputt')
+            assert load_name_index(names_file, {}) is None
+
+
+class TestIndexNameSearch:
+    def test_fuzzy_search_and_incremental_update(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path_a = os.path.join(tmpdir, 'a.syx')
+            write_bank(path_a, ['BRASS 1', 'EPIANO1'])
+            index_file = os.path.join(tmpdir, 'index.json')
+            index = load_index(tmpdir, index_file)
+            assert index.search('brss', 'fuzzy') == [(path_a, 1, 'BRASS1', 'Yamaha DX7')]
+
+            path_b = os.path.join(tmpdir, 'b.syx')
+            write_bank(path_b, ['BRASS 2'])
+            hits = list(index.iter_search('brss', mode='fuzzy'))
+            assert sorted(hit[0] for hit in hits) == [path_a, path_b]
+            assert list(index.name_index().matches('brass2')) == [(path_b, 1, (0, 0, 0))]
+            assert os.path.isfile(os.path.join(tmpdir, 'name_index.npz'))
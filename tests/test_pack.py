@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.index import PatchIndex, load_index
+from dx7utils.pack import LibraryPack, extract_pack, write_pack
+from dx7utils.sysex import VoiceBank
+from tests.conftest import build_library, make_bank, write_zip
+
+
+class TestLibraryPack:
+    def test_roundtrip_entries(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            pack_file = os.path.join(tmpdir, 'library.dx7pack')
+            assert write_pack(index, pack_file) == (2, 64)
+            with LibraryPack(pack_file) as pack:
+                assert pack.entries() == {
+                    path: {**entry, 'checksum_errors': 0} for path, entry in index.entries.items()
+                }
+
+    def test_voices_are_addressable(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            pack_file = os.path.join(tmpdir, 'library.dx7pack')
+            write_pack(index, pack_file)
+            path = os.path.join(library, 'sub', 'b.syx')
+            with LibraryPack(pack_file) as pack, VoiceBank.from_file(path) as bank:
+                assert bytes(pack.records(path)[0]) == bytes(bank.voice(0))
+                assert bytes(pack.voice(32)) == bytes(bank.voice(0))
+
+    def test_index_loads_pack_without_walk(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            pack_file = os.path.join(tmpdir, 'library.dx7pack')
+            write_pack(index, pack_file)
+            fresh = PatchIndex(library, os.path.join(tmpdir, 'other.json'))
+            assert fresh.load_pack(pack_file)
+            assert fresh.search('strings')[0][2] == 'STRINGS'
+            assert fresh.refresh() == (0, 0)
+            assert len(fresh.voice_matrix()) == 64
+
+    def test_rejects_foreign_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bogus.dx7pack')
+            with open(path, 'wb') as f:
+                f.write(b'\x00' * 256)
+            with pytest.raises(ValueError):
+                LibraryPack(path)
+
+    def test_truncated_pack_falls_back(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            pack_file = os.path.join(tmpdir, 'library.dx7pack')
+            write_pack(index, pack_file)
+            with open(pack_file, 'rb') as f:
+                data = f.read()
+            for size in (0, 40, len(data) - 10):
+                with open(pack_file, 'wb') as f:
+                    f.write(data[:size])
+                with pytest.raises(ValueError):
+                    LibraryPack(pack_file)
+                fresh = PatchIndex(library, os.path.join(tmpdir, 'other.json'))
+                assert not fresh.load_pack(pack_file)
+                assert fresh.pack is None
+
+    def test_extract_recreates_banks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            pack_file = os.path.join(tmpdir, 'library.dx7pack')
+            write_pack(index, pack_file)
+            target = os.path.join(tmpdir, 'out')
+            assert extract_pack(pack_file, target) == 2
+            with open(os.path.join(target, 'sub', 'b.syx'), 'rb') as f:
+                data = f.read()
+            assert len(data) == 4104
+            assert data[6:-2] == make_bank(['STRINGS'])[6:-2]
+
+    def test_extract_keeps_member_paths_inside_target(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library = os.path.join(tmpdir, 'lib')
+            os.makedirs(library)
+            write_zip(os.path.join(library, 'c.zip'), {'../../../escaped.syx': make_bank(['EVIL'])})
+            index = load_index(library, os.path.join(tmpdir, 'index.json'))
+            assert len(index.entries) == 1
+            pack_file = os.path.join(tmpdir, 'library.dx7pack')
+            write_pack(index, pack_file)
+            target = os.path.join(tmpdir, 'out', 'deep')
+            assert extract_pack(pack_file, target) == 1
+            assert os.listdir(target) == ['escaped.syx']
+            assert not os.path.exists(os.path.join(tmpdir, 'escaped.syx'))
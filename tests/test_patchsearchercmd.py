@@ -0,0 +1,45 @@
+import io
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.index import load_index
+from src.patchsearchercmd import iter_queries, iter_results, write_csv, write_ndjson
+from tests.conftest import write_bank
+
+
+class TestBatchSearch:
+    def test_queries_from_arguments_and_stdin(self):
+        stdin = io.StringIO("brass\n\nepiano\r\n")
+        assert list(iter_queries(['pad', '-', 'organ'], stdin)) == ['pad', 'brass', '', 'epiano', 'organ']
+
+    def test_ndjson_stream(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_bank(os.path.join(tmpdir, 'a.syx'), ['BRASS 1', 'EPIANO1', 'BRASS 2'])
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            out = io.StringIO()
+            write_ndjson(iter_results(index, ['brass', '', 'nothing', 'epiano'], 'substring', limit=1), out)
+            lines = [json.loads(line) for line in out.getvalue().splitlines()]
+            assert [(line['query'], line['name'], line['voice']) for line in lines] == [
+                ('brass', 'BRASS1', 1), ('epiano', 'EPIANO1', 2)
+            ]
+
+    def test_csv_with_filter(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, 'lib'))
+            write_bank(os.path.join(tmpdir, 'lib', 'a.syx'), ['BRASS 1'])
+            index = load_index(os.path.join(tmpdir, 'lib'), os.path.join(tmpdir, 'index.json'))
+            orig_dir = os.getcwd()
+            try:
+                os.chdir(tmpdir)
+                out = io.StringIO()
+                write_csv(iter_results(index, ['brass instrument:dx7', 'brass instrument:tx816']), out)
+            finally:
+                os.chdir(orig_dir)
+            assert out.getvalue().splitlines() == [
+                'query,file,voice,name,instrument',
+                f"brass instrument:dx7,{os.path.join(tmpdir, 'lib', 'a.syx')},1,BRASS1,Yamaha DX7",
+            ]
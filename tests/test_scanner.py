@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.common import iter_sysex_files
+from dx7utils.index import PatchIndex
+from dx7utils.scanner import parse_files, scan_library, scan_search
+from tests.conftest import write_library
+
+SCAN_LIBRARY = {
+    'a.syx': ['BRASS 1'],
+    'sub/b.syx': ['EPIANO1', 'BRASS 2'],
+    'sub/deeper/c.syx': ['STRINGS'],
+}
+
+
+def make_library(directory):
+    write_library(directory, SCAN_LIBRARY)
+    open(os.path.join(directory, 'sub', 'notes.txt'), 'w').close()
+
+
+class TestIterSysexFiles:
+    def test_walks_nested_directories(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            make_library(tmpdir)
+            files = sorted(os.path.relpath(f, tmpdir) for f in iter_sysex_files(tmpdir))
+            assert files == ['a.syx', os.path.join('sub', 'b.syx'), os.path.join('sub', 'deeper', 'c.syx')]
+
+    def test_missing_directory(self):
+        assert list(iter_sysex_files('/nonexistent/dx7/library')) == []
+
+
+class TestScanLibrary:
+    def test_yields_every_voice(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            make_library(tmpdir)
+            records = list(scan_library(tmpdir, workers=2))
+            assert len(records) == 3 * 32
+            assert (os.path.join(tmpdir, 'sub', 'b.syx'), 2, 'BRASS2', 'Yamaha DX7') in records
+
+    def test_search_with_processes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            make_library(tmpdir)
+            hits = sorted(scan_search(tmpdir, 'brass', workers=2, processes=True))
+            assert [(os.path.basename(f), nr, name) for f, nr, name, _ in hits] == [
+                ('a.syx', 1, 'BRASS1'),
+                ('b.syx', 2, 'BRASS2'),
+            ]
+
+    def test_parse_files_can_stop_early(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            make_library(tmpdir)
+            results = parse_files(iter_sysex_files(tmpdir), workers=1)
+            file_path, info = next(results)
+            results.close()
+            assert len(info['names']) == 32
+
+
+class TestIndexIterSearch:
+    def test_streams_and_updates_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library = os.path.join(tmpdir, 'lib')
+            os.makedirs(library)
+            make_library(library)
+            index = PatchIndex(library, os.path.join(tmpdir, 'index.json'))
+            hits = list(index.iter_search('brass', workers=2))
+            assert len(hits) == 2
+            assert len(index.entries) == 3
+            assert index.last_refresh == (3, 0)
+
+            assert len(list(index.iter_search('brass'))) == 2
+            assert index.last_refresh == (0, 0)
@@ -1,5 +1,6 @@
 import json
 import os
+import subprocess
 import sys
 import tempfile
 
@@ -7,7 +8,10 @@ import pytest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src.sendsysex import load_midi_output_port
+from dx7utils.sysex import vmem_dump
+from dx7utils.validate import InvalidSysexError
+from src.sendsysex import load_midi_output_port, sysex_payload
+from tests.conftest import make_voice
 
 
 class TestLoadMidiOutputPort:
@@ -47,3 +51,33 @@ class TestLoadMidiOutputPort:
                     load_midi_output_port()
             finally:
                 os.chdir(orig_dir)
+
+
+class TestClientImports:
+    def test_client_path_does_not_import_numpy(self):
+        root = os.path.join(os.path.dirname(__file__), '..')
+        code = "import sys; import sendsysex; print('numpy' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(root, 'src'),
+                                capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == 'False'
+
+
+class TestSysexPayload:
+    def test_parameter_change_is_sent(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'param.syx')
+            data = bytes([0xF0, 0x43, 0x10, 0x01, 0x06, 0x05, 0xF7])
+            with open(path, 'wb') as f:
+                f.write(data)
+            assert sysex_payload(path) == data
+
+    def test_bad_checksum_needs_force(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bank.syx')
+            data = bytearray(vmem_dump(make_voice() * 32))
+            data[-2] ^= 0x01
+            with open(path, 'wb') as f:
+                f.write(data)
+            with pytest.raises(InvalidSysexError):
+                sysex_payload(path)
+            assert sysex_payload(path, force=True) == bytes(data)
@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.index import load_index
+from dx7utils.matrix import PARAMETER_MAXIMA
+from dx7utils.similar import SimilarityIndex
+from tests.conftest import make_voice, write_voices
+
+
+def random_params(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return (rng.random((n, 155)) * (PARAMETER_MAXIMA.astype(np.float64) + 1)).astype(np.uint8)
+
+
+def with_level(voice, op_index, level):
+    voice = bytearray(voice)
+    voice[op_index * 17 + 14] = level
+    return bytes(voice)
+
+
+class TestSimilarityIndex:
+    def test_small_change_is_nearest(self):
+        params = random_params(500)
+        params[42] = params[7]
+        params[42, 16] = min(int(params[42, 16]) + 1, 99)
+        index = SimilarityIndex(params)
+        rows = [row for row, _ in index.nearest_to_row(7, k=3)]
+        assert rows[0] == 42
+        assert 7 not in rows
+
+    def test_algorithm_difference_counts(self):
+        params = random_params(3)
+        params[1] = params[0]
+        params[2] = params[0]
+        params[1, 134] = (params[0, 134] + 1) % 32
+        params[2, 0] = 0 if params[0, 0] > 50 else 99
+        index = SimilarityIndex(params)
+        assert [row for row, _ in index.nearest_to_row(0, k=2)] == [2, 1]
+
+    def test_query_by_params(self):
+        params = random_params(100)
+        index = SimilarityIndex(params)
+        row, distance = index.nearest_to_params(params[5], k=1)[0]
+        assert row == 5
+        assert distance == 0.0
+
+    def test_large_query_is_ranked(self):
+        params = random_params(200000)
+        params[123456] = params[0]
+        index = SimilarityIndex(params)
+        results = index.nearest_to_row(0, k=10)
+        distances = [distance for _, distance in results]
+        assert len(results) == 10 and results[0] == (123456, 0.0)
+        assert distances == sorted(distances) and 0 not in [row for row, _ in results]
+
+
+class TestIndexSimilar:
+    def test_similar_skips_identical_sounds(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            base = make_voice('EPIANO 1')
+            write_voices(os.path.join(tmpdir, 'a.syx'), [base, with_level(base, 0, 80), with_level(base, 0, 10)])
+            write_voices(os.path.join(tmpdir, 'b.syx'), [make_voice('EPIANO 2')])
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            results = index.similar(os.path.join(tmpdir, 'a.syx'), 1, k=5)
+            assert [(os.path.basename(r[0]), r[1]) for r in results] == [('a.syx', 2), ('a.syx', 3)]
+            assert results[0][4] < results[1][4]
+
+    def test_cli_rejects_voice_out_of_range(self, monkeypatch, capsys):
+        import src.patchsimilarcmd as cmd
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, 'a.syx')
+            write_voices(file_path, [make_voice('EPIANO 1'), make_voice('EPIANO 2')])
+            index = load_index(tmpdir, os.path.join(tmpdir, 'index.json'))
+            monkeypatch.setattr(cmd, 'load_config_simple', lambda: tmpdir)
+            monkeypatch.setattr(cmd, 'load_index', lambda directory, **kwargs: index)
+            for voice in ('40', '0'):
+                monkeypatch.setattr(sys, 'argv', ['patchsimilarcmd', file_path, '--voice', voice])
+                cmd.main()
+                assert f'Voice {voice} ist in' in capsys.readouterr().out
@@ -2,9 +2,12 @@ import os
 import sys
 import tempfile
 
+import pytest
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from dx7utils.sysex import extract_patch_names, format_name
+from dx7utils.sysex import Voice, VoiceBank, extract_patch_names, format_name, unpack_voice
+from tests.conftest import make_voice
 
 
 class TestFormatName:
@@ -41,3 +44,80 @@ class TestExtractPatchNames:
             names, instrument = extract_patch_names(path)
             assert len(names) == 32
             assert instrument == "Unknown"
+
+
+class TestUnpackVoice:
+    def test_operator_fields(self):
+        params = unpack_voice(make_voice())
+        assert len(params) == 155
+        assert list(params[0:8]) == [99, 98, 97, 96, 95, 94, 93, 0]
+        assert params[11] == 1
+        assert params[12] == 2
+        assert params[13] == 3
+        assert params[14] == 2
+        assert params[15] == 5
+        assert params[16] == 90
+        assert params[17] == 0
+        assert params[18] == 1
+        assert params[20] == 7
+        assert params[5 * 21 + 16] == 85
+
+    def test_global_fields(self):
+        params = unpack_voice(make_voice('E.PIANO 1'))
+        assert params[134] == 31
+        assert params[135] == 7
+        assert params[136] == 1
+        assert params[141] == 1
+        assert params[142] == 4
+        assert params[143] == 3
+        assert params[144] == 24
+        assert bytes(params[145:155]) == b'E.PIANO 1 '
+
+
+class TestVoiceBank:
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bank.syx')
+            voices = [make_voice(f'VOICE {i}') for i in range(32)]
+            with open(path, 'wb') as f:
+                f.write(b'\xF0\x43\x00\x09\x20\x00' + b''.join(voices) + b'\x00\xF7')
+            with VoiceBank.from_file(path) as bank:
+                assert bank.instrument_type == "Yamaha DX7"
+                assert len(bank) == 32
+                assert bank.names()[3] == b'VOICE 3   '
+                assert bytes(bank.voice(5)) == voices[5]
+                assert bytes(bank.params(5)) == bytes(unpack_voice(voices[5]))
+
+    def test_empty_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'empty.syx')
+            open(path, 'wb').close()
+            with VoiceBank.from_file(path) as bank:
+                assert bank.names() == [b''] * 32
+
+
+class TestVoice:
+    def test_decodes_on_access(self):
+        data = make_voice('BRASS 1') + make_voice('EPIANO 2')
+        voice = Voice(memoryview(data), 128)
+        assert voice.name == 'EPIANO 2'
+        assert voice._params is None
+        assert voice.algorithm == 31
+        assert voice.op6_output_level == 90
+        assert voice.op1_output_level == 85
+        assert voice.operator(1)['output_level'] == 85
+        assert voice.envelope(6) == ((99, 98, 97, 96), (95, 94, 93, 0))
+        assert voice.lfo()['key_sync'] == 1
+        assert bytes(voice.params) == bytes(unpack_voice(data[128:]))
+
+    def test_slots_and_unknown_attribute(self):
+        voice = Voice(make_voice())
+        assert not hasattr(voice, '__dict__')
+        with pytest.raises(AttributeError):
+            voice.loudness
+
+    def test_bank_voices(self):
+        voices = [make_voice(f'VOICE {i}') for i in range(32)]
+        with VoiceBank(b'\xF0\x43\x00\x09\x20\x00' + b''.join(voices) + b'\x00\xF7') as bank:
+            names = [voice.name for voice in bank.voices()]
+        assert names[0] == 'VOICE 0' and len(names) == 32
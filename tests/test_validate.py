@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.index import load_index
+from dx7utils.sysex import vmem_dump
+from dx7utils.validate import check_data, frame_issues, quarantine, validate_library, write_report
+from tests.conftest import make_voice
+
+
+def good_bank(name='INIT VOICE'):
+    return vmem_dump(make_voice(name) * 32)
+
+
+def write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class TestCheckData:
+    def test_valid_bank(self):
+        assert check_data(good_bank()) == []
+
+    def test_checksum_mismatch(self):
+        data = bytearray(good_bank())
+        data[-2] ^= 0x01
+        issues = frame_issues(bytes(data))
+        assert len(issues) == 1
+        assert 'Prüfsumme' in issues[0]
+
+    def test_truncated_block(self):
+        issues = frame_issues(good_bank()[:2000] + b'\xF7')
+        assert 'abgeschnitten' in issues[0]
+
+    def test_header_only_block(self):
+        issues = check_data(bytes([0xF0, 0x43, 0x00, 0x09, 0x20, 0x00]))
+        assert issues == ['Block 1 bei Byte 0: abgeschnitten (0 von 4096 Bytes)']
+
+    def test_non_voice_sysex_is_accepted(self):
+        assert check_data(bytes([0xF0, 0x43, 0x10, 0x01, 0x06, 0x05, 0xF7])) == []
+        assert check_data(bytes([0xF0, 0x7E, 0x7F, 0x06, 0x01, 0xF7])) == []
+
+    def test_parameter_out_of_range(self):
+        records = bytearray(make_voice() * 32)
+        records[3 * 128 + 14] = 120
+        issues = check_data(vmem_dump(records))
+        assert issues == ["Voice 4: op6_output_level=120 (max. 99)"]
+
+
+class TestValidateLibrary:
+    def test_report_and_quarantine(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library = os.path.join(tmpdir, 'lib')
+            os.makedirs(os.path.join(library, 'sub'))
+            write_file(os.path.join(library, 'good.syx'), good_bank())
+            bad = bytearray(good_bank('BROKEN'))
+            bad[6 + 128 + 14] = 100
+            write_file(os.path.join(library, 'sub', 'bad.syx'), bytes(bad))
+            headerless = bytearray(make_voice('DX7II') * 32)
+            headerless[14] = 120
+            write_file(os.path.join(library, 'dx7ii.syx'), bytes(headerless))
+            index = load_index(library, os.path.join(tmpdir, 'index.json'))
+
+            report = validate_library(index)
+            bad_path = os.path.join(library, 'sub', 'bad.syx')
+            assert list(report) == [bad_path]
+            assert report[bad_path][0].startswith('Block 1')
+            assert report[bad_path][1] == "Voice 2: op6_output_level=100 (max. 99)"
+
+            report_file = os.path.join(tmpdir, 'report.txt')
+            write_report(report, report_file, len(index.entries))
+            with open(report_file, encoding='utf-8') as f:
+                assert f.readline().startswith('DX7-Bibliotheksprüfung: 1 von 3')
+
+            target = os.path.join(tmpdir, 'quarantine')
+            assert quarantine(report, library, target) == [bad_path]
+            assert os.path.isfile(os.path.join(target, 'sub', 'bad.syx'))
+            assert not os.path.exists(bad_path)
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils.virtuallist import VirtualListModel
+
+
+def make_model():
+    return VirtualListModel([
+        ['b.syx', 2, 'Strings', 'DX7'],
+        ['a.syx', 10, 'brass 1', 'DX7'],
+        ['c.syx', 1, 'Piano', 'TX816'],
+    ])
+
+
+class TestVirtualListModel:
+    def test_slice_only_returns_window(self):
+        model = VirtualListModel([[i] for i in range(1000)])
+        assert model.slice(500, 3) == [[500], [501], [502]]
+        assert model.slice(999, 10) == [[999]]
+
+    def test_sort_numbers_numerically(self):
+        model = make_model()
+        model.sort(1)
+        assert [row[1] for row in model.rows] == [1, 2, 10]
+
+    def test_sort_strings_case_insensitive(self):
+        model = make_model()
+        model.sort(2)
+        assert [row[2] for row in model.rows] == ['brass 1', 'Piano', 'Strings']
+
+    def test_repeated_sort_toggles_direction(self):
+        model = make_model()
+        model.sort(0)
+        model.sort(0)
+        assert [row[0] for row in model.rows] == ['c.syx', 'b.syx', 'a.syx']
+        model.sort(1)
+        assert [row[1] for row in model.rows] == [1, 2, 10]
+
+    def test_order_by_keys_puts_unranked_last(self):
+        model = make_model()
+        model.order_by([('c.syx', 1), ('a.syx', 10)], lambda row: (row[0], row[1]))
+        assert [row[0] for row in model.rows] == ['c.syx', 'a.syx', 'b.syx']
+
+    def test_clear_resets_sort_state(self):
+        model = make_model()
+        model.sort(0)
+        model.clear()
+        assert len(model) == 0
+        assert model.sort_column is None
@@ -0,0 +1,154 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dx7utils import watcher as watcher_module
+from dx7utils.index import PatchIndex
+from dx7utils.watcher import IndexWatcher, InotifyBackend, PollingBackend
+from tests.conftest import build_library, write_bank
+
+
+class TestPollingWatcher:
+    def test_added_file_is_indexed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            backend = PollingBackend(library)
+            watcher = IndexWatcher(index, backend=backend, initial_refresh=False)
+            path = os.path.join(library, 'new.syx')
+            write_bank(path, ['CLAV 1'])
+            changed = backend.poll()
+            assert changed == {path}
+            assert watcher.apply(changed) == (1, 0)
+            assert index.search('clav')[0][0] == path
+
+    def test_rename_and_delete(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            backend = PollingBackend(library)
+            watcher = IndexWatcher(index, backend=backend, initial_refresh=False)
+            os.rename(os.path.join(library, 'a.syx'), os.path.join(library, 'c.syx'))
+            shutil.rmtree(os.path.join(library, 'sub'))
+            assert watcher.apply(backend.poll()) == (1, 2)
+            assert index.files() == [os.path.join(library, 'c.syx')]
+
+    def test_modified_file_is_reparsed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            backend = PollingBackend(library)
+            watcher = IndexWatcher(index, backend=backend, initial_refresh=False)
+            path = os.path.join(library, 'a.syx')
+            write_bank(path, ['TUBA'])
+            os.utime(path, ns=(1, 1))
+            watcher.apply(backend.poll())
+            assert index.patch_names(path)[0][0] == 'TUBA'
+
+    def test_background_thread_applies_changes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            changed = threading.Event()
+            watcher = IndexWatcher(index, backend=PollingBackend(library), interval=0.05,
+                                   on_change=lambda parsed, removed: changed.set(), initial_refresh=False)
+            watcher.start()
+            try:
+                write_bank(os.path.join(library, 'sub', 'new.syx'), ['ORGAN'])
+                assert changed.wait(5)
+            finally:
+                watcher.stop()
+            assert index.search('organ')
+
+    def test_unchanged_directories_are_not_listed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            for directory in (library, os.path.join(library, 'sub')):
+                os.utime(directory, ns=(1, 1))
+            backend = PollingBackend(library)
+            path = os.path.join(library, 'sub', 'b.syx')
+            write_bank(path, ['TUBA'])
+            os.utime(path, ns=(2, 2))
+            assert backend.poll() == set()
+            assert backend.poll(full=True) == {path}
+            os.remove(path)
+            assert backend.poll() == {path}
+
+    def test_initial_refresh_releases_lock_between_batches(self, monkeypatch):
+        class CountingLock:
+            def __init__(self):
+                self.acquired = 0
+
+            def __enter__(self):
+                self.acquired += 1
+
+            def __exit__(self, *args):
+                pass
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, _ = build_library(tmpdir)
+            write_bank(os.path.join(library, 'c.syx'), ['ORGAN'])
+            index = PatchIndex(library, os.path.join(tmpdir, 'other.json'))
+            monkeypatch.setattr(watcher_module, 'REFRESH_BATCH_SIZE', 1)
+            lock = CountingLock()
+            assert IndexWatcher(index, lock, backend=PollingBackend(library)).refresh() == (3, 0)
+            assert lock.acquired == 5
+            assert len(index.files()) == 3
+
+    def test_watcher_restarts_after_error(self, monkeypatch):
+        class FlakyBackend(PollingBackend):
+            def wait(self, timeout):
+                if not failed.is_set():
+                    failed.set()
+                    raise OSError("kaputt")
+                return super().wait(timeout)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            failed = threading.Event()
+            changed = threading.Event()
+            monkeypatch.setattr(watcher_module, 'RESTART_DELAY', 0.01)
+            monkeypatch.setattr(watcher_module, 'create_backend', lambda directory: PollingBackend(directory))
+            watcher = IndexWatcher(index, backend=FlakyBackend(library), interval=0.05,
+                                   on_change=lambda parsed, removed: changed.set(), initial_refresh=False)
+            watcher.start()
+            try:
+                assert failed.wait(5)
+                write_bank(os.path.join(library, 'new.syx'), ['ORGAN'])
+                assert changed.wait(5)
+                assert watcher.is_alive()
+            finally:
+                watcher.stop()
+            assert index.search('organ')
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify nur unter Linux")
+class TestInotifyBackend:
+    def test_reports_new_file_and_directory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backend = InotifyBackend(tmpdir)
+            try:
+                directory = os.path.join(tmpdir, 'bank')
+                os.mkdir(directory)
+                assert directory in backend.wait(1.0)
+                path = os.path.join(directory, 'x.syx')
+                write_bank(path, ['BRASS 1'])
+                assert path in backend.wait(1.0)
+            finally:
+                backend.close()
+
+    def test_stop_wakes_blocked_thread(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            library, index = build_library(tmpdir)
+            backend = InotifyBackend(library)
+            watcher = IndexWatcher(index, backend=backend, interval=30, initial_refresh=False)
+            watcher.start()
+            time.sleep(0.1)
+            started = time.monotonic()
+            watcher.stop()
+            assert time.monotonic() - started < 5
+            assert not watcher.is_alive()
+            assert backend.fd == -1